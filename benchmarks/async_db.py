@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Measure how the async data-access layer scales with concurrent visits.
+
+Awaits src.async_db.record_visit directly, without HTTP, for new visitors
+spread over --tags tags, at each concurrency level. "writer" runs the writes
+on the per-shard writer threads, "pool" on the shared database thread pool.
+Each run is a subprocess with a fresh temporary database file; SHARD_COUNT
+and SQLITE_PROFILE are taken from the environment.
+
+Usage: python benchmarks/async_db.py [--visits 5000] [--concurrency 1,8,32,128] [--modes pool,writer]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+
+async def run_mode(mode: str, visits: int, concurrency: int, tags: int) -> dict:
+    from src import async_db
+    from src.models import initialize_database, close_database
+
+    initialize_database()
+    if mode == "writer":
+        async_db.visit_writer.start()
+    queue = asyncio.Queue()
+    for i in range(visits):
+        queue.put_nowait(f"bench-{i % tags}")
+
+    async def worker():
+        while True:
+            try:
+                tag = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await async_db.record_visit(None, tag)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    async_db.visit_writer.stop()
+    close_database()
+    return {
+        "visits": visits,
+        "seconds": round(elapsed, 3),
+        "visits_per_s": round(visits / elapsed, 1),
+        "batches": async_db.visit_batches.batches,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--visits", type=int, default=5000)
+    parser.add_argument("--concurrency", default="1,8,32,128", help="Comma-separated concurrency levels")
+    parser.add_argument("--tags", type=int, default=200)
+    parser.add_argument("--modes", default="pool,writer")
+    parser.add_argument("--child", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, str(ROOT_DIR))
+        result = asyncio.run(run_mode(args.child, args.visits, int(args.concurrency), args.tags))
+        print(json.dumps(result))
+        return 0
+
+    print(f"async_db.record_visit: {args.visits} new visitors over {args.tags} tags")
+    for mode in args.modes.split(","):
+        for concurrency in args.concurrency.split(","):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                env = dict(os.environ)
+                env.pop("TESTING", None)
+                env.update({"DATABASE_PATH": os.path.join(tmp_dir, "visitors.db"), "LOG_LEVEL": "WARNING"})
+                output = subprocess.run(
+                    [sys.executable, __file__, "--child", mode,
+                     "--visits", str(args.visits),
+                     "--concurrency", concurrency,
+                     "--tags", str(args.tags)],
+                    env=env, cwd=ROOT_DIR, check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"  {mode:<7} concurrency {concurrency:>4}  {result['visits_per_s']:>10} visits/s  "
+                f"({result['batches']} batches, {result['seconds']}s)"
+            )
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Measure the per-request CPU cost of parsing /badge parameters.
+
+Compares building a BadgeParams model and the shields.io URL from scratch on
+every request with the memoized path: the cached BadgeVariant for the
+label/color/style/logo combination plus splicing in the count. Parameter
+combinations are drawn from a small set, as in real traffic; tags and counts
+change on every call.
+
+Usage: python benchmarks/badge_params.py [--iterations 200000] [--variants 8]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+
+STYLES = ("flat", "flat-square", "plastic", "for-the-badge")
+
+def per_call_us(func, calls) -> float:
+    start = time.perf_counter()
+    for args in calls:
+        func(*args)
+    return (time.perf_counter() - start) / len(calls) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--variants", type=int, default=8, help="Distinct label/color/style/logo combinations")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT_DIR))
+    os.environ.setdefault("TESTING", "true")
+    from src.schemas import BadgeParams
+    from src.utils import build_shields_url
+    from src.badge_renderer import can_render_locally
+    from src.badge_params import badge_variant, parse_tag
+
+    combinations = [
+        (f"views {i}", ("4ade80", "blue", "ff69b4")[i % 3], STYLES[i % len(STYLES)], "github" if i % 2 else "")
+        for i in range(args.variants)
+    ]
+    calls = [
+        (f"user/project-{i % 5000}", i) + combinations[i % len(combinations)]
+        for i in range(args.iterations)
+    ]
+
+    def baseline(tag, count, label, color, style, logo):
+        params = BadgeParams(tag=tag, label=label, color=color, style=style, logo=logo)
+        render_locally = can_render_locally(params.logo)
+        variant = f"{render_locally}\0{params.label}\0{params.color}\0{params.style}\0{params.logo}"
+        return variant, build_shields_url(params.label, count, params.color, params.style, params.logo)
+
+    def memoized(tag, count, label, color, style, logo):
+        parse_tag(tag)
+        variant = badge_variant(label, color, style, logo)
+        return variant.etag_variant, variant.shields_url(count)
+
+    for args_ in calls[:10]:
+        assert baseline(*args_) == memoized(*args_)
+
+    before = per_call_us(baseline, calls)
+    after = per_call_us(memoized, calls)
+    info = badge_variant.cache_info()
+    print(f"Badge parameter parsing, {args.iterations} calls over {args.variants} combinations")
+    print(f"  per request   {before:>8.2f} us  (BadgeParams + build_shields_url)")
+    print(f"  memoized      {after:>8.2f} us  (cache hits {info.hits}, misses {info.misses})")
+    print(f"  saved         {before - after:>8.2f} us per request ({(1 - after / before) * 100:.0f}%)")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
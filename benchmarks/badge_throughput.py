@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Measure /badge throughput for each SQLite storage profile.
+
+Every request comes from a new visitor, so each one commits a write. Each
+profile and concurrency level runs in its own subprocess against a fresh
+temporary database file, with the app's startup and shutdown hooks.
+
+Usage: python benchmarks/badge_throughput.py [--requests 2000] [--concurrency 1,16,64]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+
+async def run_profile(requests: int, concurrency: int, tags: int) -> dict:
+    import httpx
+    from src.main import app, lifespan
+
+    transport = httpx.ASGITransport(app=app)
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(f"bench-{i % tags}")
+
+    async def worker(client):
+        while True:
+            try:
+                tag = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            response = await client.get("/badge", params={"tag": tag})
+            assert response.status_code in (200, 302), response.status_code
+
+    async with lifespan(app):
+        start = time.perf_counter()
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {"requests": requests, "seconds": round(elapsed, 3), "req_per_s": round(requests / elapsed, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", default="16", help="Comma-separated concurrency levels")
+    parser.add_argument("--tags", type=int, default=50)
+    parser.add_argument("--profiles", default="default,tuned")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, str(ROOT_DIR))
+        result = asyncio.run(run_profile(args.requests, int(args.concurrency), args.tags))
+        print(json.dumps(result))
+        return 0
+
+    print(f"/badge throughput: {args.requests} new-visitor requests")
+    for profile in args.profiles.split(","):
+        for concurrency in args.concurrency.split(","):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                env = dict(os.environ)
+                env.pop("TESTING", None)
+                env.update({
+                    "SQLITE_PROFILE": profile,
+                    "DATABASE_PATH": os.path.join(tmp_dir, "visitors.db"),
+                    "LOG_LEVEL": "WARNING",
+                })
+                output = subprocess.run(
+                    [sys.executable, __file__, "--child",
+                     "--requests", str(args.requests),
+                     "--concurrency", concurrency,
+                     "--tags", str(args.tags)],
+                    env=env, cwd=ROOT_DIR, check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+            print(f"  {profile:<10} concurrency {concurrency:>4}  {result['req_per_s']:>10} req/s  ({result['seconds']}s)")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Load-test the badge hot path and the stats endpoints.
+
+Drives the ASGI app in-process (httpx.ASGITransport) and/or through a local
+uvicorn server, each against a fresh temporary database. The workload is
+seeded, so the same arguments always send the same requests:
+
+  * tags follow a Zipf distribution, so a few hot tags get most of the hits
+  * --new-visitors is the share of /badge hits without a visitor cookie;
+    the rest replay a cookie handed out earlier for the same tag, which
+    should be deduplicated (tags nobody has visited yet count as new)
+  * --mix sets the share of /badge, /api/stats/{tag} and /api/stats
+
+Reports req/s and p50/p99 latency per endpoint, plus SQLite lock contention
+read from /metrics: time spent in write transactions (including waiting for
+the write lock), visits that failed and 503s from a full DB queue.
+
+Usage:
+  python benchmarks/load_test.py [--mode inprocess,uvicorn] [--requests 5000]
+      [--concurrency 32] [--tags 1000] [--zipf 1.1] [--new-visitors 0.3]
+      [--mix 80,15,5] [--save results.json] [--baseline results.json]
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+ENDPOINTS = ("badge", "tag_stats", "system_stats")
+
+def build_workload(args) -> list:
+    """Seeded list of (endpoint, tag, is_new_visitor)"""
+    rng = random.Random(args.seed)
+    tag_weights = [1 / (rank ** args.zipf) for rank in range(1, args.tags + 1)]
+    tag_cum = list(_accumulate(tag_weights))
+    mix = [float(part) for part in args.mix.split(",")]
+    mix_cum = list(_accumulate(mix))
+
+    workload = []
+    for _ in range(args.requests):
+        endpoint = ENDPOINTS[bisect.bisect_left(mix_cum, rng.random() * mix_cum[-1])]
+        tag = f"load-{bisect.bisect_left(tag_cum, rng.random() * tag_cum[-1])}"
+        workload.append((endpoint, tag, rng.random() < args.new_visitors))
+    return workload
+
+def _accumulate(values):
+    total = 0.0
+    for value in values:
+        total += value
+        yield total
+
+def parse_metrics(text: str) -> dict:
+    """Flatten the Prometheus exposition into {series: value}"""
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, _, value = line.rpartition(" ")
+            samples[series] = float(value)
+    return samples
+
+def contention_report(before: dict, after: dict) -> dict:
+    def delta(series):
+        return after.get(series, 0.0) - before.get(series, 0.0)
+
+    txn_count = delta('badgetrack_db_transaction_seconds_count{operation="visit"}')
+    txn_sum = delta('badgetrack_db_transaction_seconds_sum{operation="visit"}')
+    slow = txn_count - delta('badgetrack_db_transaction_seconds_bucket{operation="visit",le="0.01"}')
+    rejected = sum(
+        delta(series) for series in after
+        if series.startswith("badgetrack_http_requests_total") and 'status="503"' in series
+    )
+    return {
+        "write_transactions": int(txn_count),
+        "avg_transaction_ms": round(txn_sum / txn_count * 1000, 3) if txn_count else 0.0,
+        "transactions_over_10ms": int(slow),
+        "failed_visits": int(delta('badgetrack_visits_total{result="error"}')),
+        "counted_visits": int(delta('badgetrack_visits_total{result="counted"}')),
+        "deduplicated_visits": int(delta('badgetrack_visits_total{result="deduplicated"}')),
+        "rejected_503": int(rejected),
+    }
+
+async def drive(client_factory, workload: list, concurrency: int) -> dict:
+    """Send the workload with `concurrency` workers, each with its own client"""
+    queue = asyncio.Queue()
+    for item in workload:
+        queue.put_nowait(item)
+    cookies_by_tag = {}
+    latencies = {endpoint: [] for endpoint in ENDPOINTS}
+    errors = {endpoint: 0 for endpoint in ENDPOINTS}
+    rng = random.Random(0)
+
+    async def worker():
+        async with client_factory() as client:
+            while True:
+                try:
+                    endpoint, tag, is_new = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                headers = {}
+                if endpoint == "badge":
+                    url, params = "/badge", {"tag": tag}
+                    if not is_new and tag in cookies_by_tag:
+                        # A returning visitor views a badge they have already been counted for
+                        headers["Cookie"] = f"visitor_id={rng.choice(cookies_by_tag[tag])}"
+                elif endpoint == "tag_stats":
+                    url, params = f"/api/stats/{tag}", None
+                else:
+                    url, params = "/api/stats", None
+
+                started = time.perf_counter()
+                response = await client.get(url, params=params, headers=headers)
+                latencies[endpoint].append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors[endpoint] += 1
+                visitor_id = response.cookies.get("visitor_id")
+                if visitor_id:
+                    cookies_by_tag.setdefault(tag, []).append(visitor_id)
+                # Cookies are sent explicitly; never let the jar turn a new visitor into a returning one
+                client.cookies.clear()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    report = {"seconds": round(elapsed, 3), "req_per_s": round(len(workload) / elapsed, 1), "endpoints": {}}
+    for endpoint in ENDPOINTS:
+        samples = sorted(latencies[endpoint])
+        if not samples:
+            continue
+        report["endpoints"][endpoint] = {
+            "requests": len(samples),
+            "errors": errors[endpoint],
+            "req_per_s": round(len(samples) / elapsed, 1),
+            "p50_ms": round(samples[len(samples) // 2] * 1000, 2),
+            "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 2),
+        }
+    return report
+
+async def run_inprocess(args) -> dict:
+    import httpx
+    from src.main import app, lifespan
+
+    transport = httpx.ASGITransport(app=app)
+    def client_factory():
+        return httpx.AsyncClient(transport=transport, base_url="http://bench")
+
+    async with lifespan(app):
+        async with client_factory() as client:
+            before = parse_metrics((await client.get("/metrics")).text)
+        report = await drive(client_factory, build_workload(args), args.concurrency)
+        async with client_factory() as client:
+            after = parse_metrics((await client.get("/metrics")).text)
+    report["contention"] = contention_report(before, after)
+    return report
+
+async def run_uvicorn(args, env: dict) -> dict:
+    import httpx
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        env=env, cwd=ROOT_DIR,
+    )
+    try:
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            for _ in range(100):
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not start")
+            before = parse_metrics((await client.get("/metrics")).text)
+
+        limits = httpx.Limits(max_keepalive_connections=1)
+        report = await drive(lambda: httpx.AsyncClient(base_url=base_url, limits=limits), build_workload(args), args.concurrency)
+
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            after = parse_metrics((await client.get("/metrics")).text)
+        report["contention"] = contention_report(before, after)
+        return report
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+def child_env(tmp_dir: str, profile: str) -> dict:
+    env = dict(os.environ)
+    env.pop("TESTING", None)
+    env.update({
+        "SQLITE_PROFILE": profile,
+        "DATABASE_PATH": os.path.join(tmp_dir, "visitors.db"),
+        "LOG_LEVEL": "WARNING",
+        "METRICS_ENABLED": "true",
+    })
+    return env
+
+def print_report(mode: str, report: dict):
+    contention = report["contention"]
+    print(f"\n[{mode}] {report['req_per_s']} req/s overall ({report['seconds']}s)")
+    print(f"  {'endpoint':<14}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in report["endpoints"].items():
+        print(
+            f"  {endpoint:<14}{stats['requests']:>10}{stats['errors']:>8}{stats['req_per_s']:>10}"
+            f"{stats['p50_ms']:>10}{stats['p99_ms']:>10}"
+        )
+    print(
+        f"  writes: {contention['write_transactions']} transactions, avg {contention['avg_transaction_ms']} ms, "
+        f"{contention['transactions_over_10ms']} over 10 ms; {contention['counted_visits']} counted, "
+        f"{contention['deduplicated_visits']} deduplicated, {contention['failed_visits']} failed, "
+        f"{contention['rejected_503']} rejected with 503"
+    )
+
+def check_baseline(results: dict, baseline_path: str, tolerance: float) -> int:
+    """Return 1 if any mode's overall req/s dropped more than tolerance below the baseline"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    status = 0
+    for mode, report in results.items():
+        if mode not in baseline:
+            continue
+        expected = baseline[mode]["req_per_s"]
+        change = (report["req_per_s"] - expected) / expected
+        verdict = "REGRESSION" if change < -tolerance else "ok"
+        print(f"{mode}: {report['req_per_s']} req/s vs baseline {expected} ({change:+.1%}) {verdict}")
+        if change < -tolerance:
+            status = 1
+    return status
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", default="inprocess,uvicorn", help="Comma-separated: inprocess, uvicorn")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--tags", type=int, default=1000, help="Tag cardinality")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent for tag popularity")
+    parser.add_argument("--new-visitors", type=float, default=0.3, help="Share of /badge hits without a cookie")
+    parser.add_argument("--mix", default="80,15,5", help="Weights for /badge, /api/stats/{tag}, /api/stats")
+    parser.add_argument("--profile", default="tuned", help="SQLITE_PROFILE for the server")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--save", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="Compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed req/s drop against the baseline")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        sys.path.insert(0, str(ROOT_DIR))
+        if args.child == "inprocess":
+            report = asyncio.run(run_inprocess(args))
+        else:
+            report = asyncio.run(run_uvicorn(args, dict(os.environ)))
+        print(json.dumps(report))
+        return 0
+
+    print(
+        f"{args.requests} requests, concurrency {args.concurrency}, {args.tags} tags (zipf {args.zipf}), "
+        f"{args.new_visitors:.0%} new visitors, mix {args.mix}, profile {args.profile}"
+    )
+    child_args = [
+        "--requests", str(args.requests), "--concurrency", str(args.concurrency), "--tags", str(args.tags),
+        "--zipf", str(args.zipf), "--new-visitors", str(args.new_visitors), "--mix", args.mix, "--seed", str(args.seed),
+    ]
+    results = {}
+    for mode in args.mode.split(","):
+        # Each mode gets a fresh process and database so runs do not warm each other's caches
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", mode] + child_args,
+                env=child_env(tmp_dir, args.profile), cwd=ROOT_DIR, check=True, capture_output=True, text=True,
+            ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+        print_report(mode, results[mode])
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+    if args.baseline:
+        print()
+        return check_baseline(results, args.baseline, args.tolerance)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
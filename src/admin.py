@@ -0,0 +1,421 @@
+"""Export, import and back up BadgeTrack's SQLite data.
+
+  python -m src.admin export [--format ndjson|csv] [--cookies] [--output FILE]
+  python -m src.admin import FILE [--format ndjson|csv] [--mode merge|replace]
+  python -m src.admin backup DEST [--pages N] [--sleep SECONDS]
+  python -m src.admin migrate-dedup [--drop-cookies] [--vacuum]
+
+Export and backup only read, so they are safe against a running server.
+Import writes through the normal connection pool in short transactions; the
+server's in-memory caches and aggregates only see imported counts after a
+restart.
+"""
+from typing import Dict, IO, Iterable, Iterator, List, Optional
+from peewee import EXCLUDED, fn
+from .models import (
+    db, Badge, Cookie, VisitorKey, initialize_database, close_database, connection_scope, each_shard, shard_for_tag, use_shard,
+)
+from .metrics import db_transaction_duration
+from .storage import STORAGE_BACKEND
+from .dedup import DEDUP_BACKEND, visitor_key
+import argparse
+import csv
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+# Unset: everything in one step in WAL mode, else 1024 pages per step
+BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "0")) or None
+BACKUP_STEP_SLEEP_SECONDS = float(os.getenv("BACKUP_STEP_SLEEP_SECONDS", "0.05"))
+# A stepped copy that another connection's writes restart more often than this is given up
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "3"))
+STEPPED_BACKUP_PAGES = 1024
+
+FORMATS = ("ndjson", "csv")
+IMPORT_MODES = ("merge", "replace")
+# One CSV layout for both record types; columns that do not apply are left empty
+CSV_FIELDS = ("type", "tag", "visits", "created", "cookie_id", "last_visit")
+_INT_FIELDS = ("visits", "created", "last_visit")
+
+def iter_badges(chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[dict]:
+    """Every badge on every shard, read in id order one chunk per short read"""
+    for _ in each_shard():
+        last_id = 0
+        while True:
+            with connection_scope():
+                rows = list(
+                    Badge.select(Badge.id, Badge.tag, Badge.visits, Badge.created)
+                    .where(Badge.id > last_id).order_by(Badge.id).limit(chunk_size).tuples()
+                )
+            for badge_id, tag_str, visits, created in rows:
+                yield {"type": "badge", "tag": tag_str, "visits": visits, "created": created}
+            if len(rows) < chunk_size:
+                break
+            last_id = rows[-1][0]
+
+def iter_cookies(chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[dict]:
+    """Every dedup row, keyed by its badge's tag since badge ids differ between databases"""
+    for _ in each_shard():
+        last_id = 0
+        while True:
+            with connection_scope():
+                rows = list(
+                    Cookie.select(Cookie.id, Badge.tag, Cookie.cookie_id, Cookie.last_visit)
+                    .join(Badge).where(Cookie.id > last_id).order_by(Cookie.id).limit(chunk_size).tuples()
+                )
+            for _, tag_str, cookie_id, last_visit in rows:
+                yield {"type": "cookie", "tag": tag_str, "cookie_id": cookie_id, "last_visit": last_visit}
+            if len(rows) < chunk_size:
+                break
+            last_id = rows[-1][0]
+
+def export_records(out: IO[str], fmt: str = "ndjson", cookies: bool = False,
+                   chunk_size: int = EXPORT_CHUNK_SIZE) -> Dict[str, int]:
+    """Write all badges, then optionally all cookies; returns the number of records of each type.
+
+    Hashed visitor keys cannot be turned back into visitor ids, so cookies
+    are refused with DEDUP_BACKEND=hashed rather than exporting stale rows.
+    """
+    if cookies and DEDUP_BACKEND == "hashed":
+        raise ValueError("Cookies cannot be exported with DEDUP_BACKEND=hashed: visitor keys do not keep the visitor id")
+    counts = {"badge": 0, "cookie": 0}
+    records: Iterable[dict] = iter_badges(chunk_size)
+    if cookies:
+        records = itertools.chain(records, iter_cookies(chunk_size))
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            counts[record["type"]] += 1
+    else:
+        for record in records:
+            out.write(json.dumps(record, separators=(",", ":")) + "\n")
+            counts[record["type"]] += 1
+    return counts
+
+def read_records(source: IO[str], fmt: str = "ndjson") -> Iterator[dict]:
+    if fmt == "csv":
+        for row in csv.DictReader(source):
+            yield {key: int(value) if key in _INT_FIELDS else value for key, value in row.items() if value != ""}
+        return
+    for line_number, line in enumerate(source, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Line {line_number} is not valid JSON: {e}") from e
+
+class Importer:
+    """Batched upserts of exported records.
+
+    merge adds imported visits to existing ones and keeps the earlier creation
+    and later last-visit times, which suits combining instances that served
+    different traffic. replace overwrites each imported row and leaves rows
+    that are not in the file alone. Cookies need their badge to exist, so
+    pending badges are written before any cookie batch; cookies of unknown
+    tags are skipped. With DEDUP_BACKEND=hashed cookies become visitor keys.
+    """
+
+    def __init__(self, mode: str = "merge", batch_size: int = IMPORT_BATCH_SIZE):
+        if mode not in IMPORT_MODES:
+            raise ValueError(f"Unknown import mode '{mode}'")
+        self.mode = mode
+        self.batch_size = batch_size
+        self._badges: List[dict] = []
+        self._cookies: List[dict] = []
+        self.counts = {"badge": 0, "cookie": 0, "skipped": 0}
+
+    def add(self, record: dict):
+        kind = record.get("type")
+        if kind == "badge":
+            self._badges.append(record)
+            if len(self._badges) >= self.batch_size:
+                self._flush_badges()
+        elif kind == "cookie":
+            self._flush_badges()
+            self._cookies.append(record)
+            if len(self._cookies) >= self.batch_size:
+                self._flush_cookies()
+        else:
+            raise ValueError(f"Unknown record type '{kind}'")
+
+    def finish(self) -> Dict[str, int]:
+        self._flush_badges()
+        self._flush_cookies()
+        return self.counts
+
+    def _flush_badges(self):
+        if not self._badges:
+            return
+        now = int(time.time())
+        rows = [
+            {"tag": record["tag"], "visits": int(record.get("visits", 0)), "created": int(record.get("created", now))}
+            for record in self._badges
+        ]
+        if self.mode == "merge":
+            update = {Badge.visits: Badge.visits + EXCLUDED.visits, Badge.created: fn.MIN(Badge.created, EXCLUDED.created)}
+        else:
+            update = {Badge.visits: EXCLUDED.visits, Badge.created: EXCLUDED.created}
+        for shard, shard_rows in _by_shard(rows).items():
+            with use_shard(shard), connection_scope():
+                with db_transaction_duration.time("import"), db.atomic("IMMEDIATE"):
+                    Badge.insert_many(shard_rows).on_conflict(conflict_target=[Badge.tag], update=update).execute()
+        self.counts["badge"] += len(rows)
+        self._badges = []
+
+    def _flush_cookies(self):
+        if not self._cookies:
+            return
+        rows = [
+            {"tag": record["tag"], "cookie_id": record["cookie_id"], "last_visit": int(record["last_visit"])}
+            for record in self._cookies
+        ]
+        hashed = DEDUP_BACKEND == "hashed"
+        model, conflict_target = (VisitorKey, [VisitorKey.key]) if hashed else (Cookie, [Cookie.cookie_id, Cookie.badge])
+        if self.mode == "merge":
+            update = {model.last_visit: fn.MAX(model.last_visit, EXCLUDED.last_visit)}
+        else:
+            update = {model.last_visit: EXCLUDED.last_visit}
+        for shard, shard_rows in _by_shard(rows).items():
+            with use_shard(shard), connection_scope():
+                with db_transaction_duration.time("import"), db.atomic("IMMEDIATE"):
+                    tags = list({row["tag"] for row in shard_rows})
+                    badge_ids = dict(Badge.select(Badge.tag, Badge.id).where(Badge.tag.in_(tags)).tuples())
+                    if hashed:
+                        cookies = [
+                            {"key": visitor_key(row["tag"], row["cookie_id"]), "last_visit": row["last_visit"]}
+                            for row in shard_rows if row["tag"] in badge_ids
+                        ]
+                    else:
+                        cookies = [
+                            {"cookie_id": row["cookie_id"], "badge": badge_ids[row["tag"]], "last_visit": row["last_visit"]}
+                            for row in shard_rows if row["tag"] in badge_ids
+                        ]
+                    if cookies:
+                        model.insert_many(cookies).on_conflict(conflict_target=conflict_target, update=update).execute()
+            self.counts["cookie"] += len(cookies)
+            self.counts["skipped"] += len(shard_rows) - len(cookies)
+        self._cookies = []
+
+def _by_shard(rows: List[dict]) -> Dict[int, List[dict]]:
+    shards: Dict[int, List[dict]] = {}
+    for row in rows:
+        shards.setdefault(shard_for_tag(row["tag"]), []).append(row)
+    return shards
+
+def import_records(records: Iterable[dict], mode: str = "merge", batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, int]:
+    importer = Importer(mode, batch_size)
+    for record in records:
+        importer.add(record)
+    return importer.finish()
+
+def backup_paths(destination: str) -> List[str]:
+    """One backup file per shard, named like the shard files themselves"""
+    count = len(db.shards)
+    if count == 1:
+        return [destination]
+    root, ext = os.path.splitext(destination)
+    return [f"{root}.shard{index}{ext or '.db'}" for index in range(count)]
+
+class BackupRestartedError(RuntimeError):
+    """Raised when writes keep restarting a stepped backup"""
+
+def _restart_watch(max_restarts: int):
+    """Progress callback for Connection.backup that fails once the copy restarted too often"""
+    state = {"remaining": None, "restarts": 0}
+
+    def progress(status: int, remaining: int, total: int):
+        # A write from another connection sends the copy back to the first page
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > max_restarts:
+                raise BackupRestartedError(
+                    f"Backup restarted {state['restarts']} times by concurrent writes; "
+                    f"use --pages -1, or enable WAL (SQLITE_PROFILE=tuned) so one step does not block writers"
+                )
+        state["remaining"] = remaining
+
+    return progress
+
+def backup_database(destination: str, pages: Optional[int] = BACKUP_PAGES_PER_STEP,
+                    sleep: float = BACKUP_STEP_SLEEP_SECONDS, max_restarts: int = BACKUP_MAX_RESTARTS) -> List[str]:
+    """Online copy of every shard through SQLite's backup API.
+
+    With pages=-1 everything is copied in one step under a single read lock,
+    which in WAL mode does not block writers; that is the default for WAL
+    databases. Otherwise the copy runs `pages` pages at a time and sleeps in
+    between, so writers only wait for one step, but a write from another
+    connection restarts the copy from the first page. More than max_restarts
+    restarts raise BackupRestartedError instead of copying forever.
+    Each shard is written to a temporary file and renamed into place.
+    """
+    paths = backup_paths(destination)
+    for shard, path in zip(each_shard(), paths):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        target = sqlite3.connect(tmp_path)
+        try:
+            with connection_scope():
+                step = pages
+                if step is None:
+                    wal = db.execute_sql("PRAGMA journal_mode").fetchone()[0].lower() == "wal"
+                    step = -1 if wal else STEPPED_BACKUP_PAGES
+                started = time.perf_counter()
+                db.connection().backup(target, pages=step, sleep=sleep, progress=_restart_watch(max_restarts))
+            logger.info(f"Backed up shard {shard} to {path} in {time.perf_counter() - started:.2f}s")
+        finally:
+            target.close()
+        os.replace(tmp_path, path)
+    return paths
+
+def migrate_cookies_to_keys(batch_size: int = IMPORT_BATCH_SIZE, drop_cookies: bool = False,
+                           vacuum: bool = False) -> Dict[str, int]:
+    """Copy Cookie rows into the hashed dedup table used by DEDUP_BACKEND=hashed.
+
+    Copies run in id order, one transaction per batch, and keep the later
+    last_visit if a key already exists, so running this again after more
+    visits were counted only adds what is new. drop_cookies then empties the
+    Cookie table the same way, one id-ordered batch per transaction, so a
+    live server's writes only wait for one batch; vacuum rewrites the files
+    to give the space back, which blocks writers while it runs.
+    """
+    counts = {"migrated": 0, "dropped": 0}
+    update = {VisitorKey.last_visit: fn.MAX(VisitorKey.last_visit, EXCLUDED.last_visit)}
+    for shard in each_shard():
+        last_id = 0
+        while True:
+            with connection_scope():
+                with db_transaction_duration.time("migrate"), db.atomic("IMMEDIATE"):
+                    rows = list(
+                        Cookie.select(Cookie.id, Badge.tag, Cookie.cookie_id, Cookie.last_visit)
+                        .join(Badge).where(Cookie.id > last_id).order_by(Cookie.id).limit(batch_size).tuples()
+                    )
+                    if rows:
+                        keys = [
+                            {"key": visitor_key(tag_str, cookie_id), "last_visit": last_visit}
+                            for _, tag_str, cookie_id, last_visit in rows
+                        ]
+                        VisitorKey.insert_many(keys).on_conflict(conflict_target=[VisitorKey.key], update=update).execute()
+            counts["migrated"] += len(rows)
+            if len(rows) < batch_size:
+                break
+            last_id = rows[-1][0]
+        logger.info(f"Shard {shard}: {counts['migrated']} dedup rows migrated so far")
+    if drop_cookies:
+        for _ in each_shard():
+            while True:
+                with connection_scope():
+                    with db_transaction_duration.time("migrate"), db.atomic("IMMEDIATE"):
+                        ids = [row[0] for row in Cookie.select(Cookie.id).order_by(Cookie.id).limit(batch_size).tuples()]
+                        if ids:
+                            counts["dropped"] += Cookie.delete().where(Cookie.id <= ids[-1]).execute()
+                if len(ids) < batch_size:
+                    break
+    if vacuum:
+        for _ in each_shard():
+            with connection_scope():
+                db.execute_sql("VACUUM")
+    return counts
+
+def _open_output(path: Optional[str]) -> IO[str]:
+    if not path or path == "-":
+        return sys.stdout
+    return open(path, "w", encoding="utf-8", newline="")
+
+def _open_input(path: str) -> IO[str]:
+    if path == "-":
+        return sys.stdin
+    return open(path, "r", encoding="utf-8", newline="")
+
+def _guess_format(path: Optional[str], fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    return "csv" if path and path.lower().endswith(".csv") else "ndjson"
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.admin", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Stream badges (and cookies) as NDJSON or CSV")
+    export_parser.add_argument("--output", "-o", help="File to write, stdout by default")
+    export_parser.add_argument("--format", choices=FORMATS, help="Defaults to csv for a .csv output, else ndjson")
+    export_parser.add_argument("--cookies", action="store_true", help="Include per-visitor dedup rows")
+    export_parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    import_parser = commands.add_parser("import", help="Load an export, merging into or replacing existing rows")
+    import_parser.add_argument("input", help="File to read, - for stdin")
+    import_parser.add_argument("--format", choices=FORMATS, help="Defaults to csv for a .csv input, else ndjson")
+    import_parser.add_argument("--mode", choices=IMPORT_MODES, default="merge")
+    import_parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    backup_parser = commands.add_parser("backup", help="Online copy of the database files")
+    backup_parser.add_argument("destination")
+    backup_parser.add_argument(
+        "--pages", type=int, default=BACKUP_PAGES_PER_STEP,
+        help="Pages per step, -1 for all at once (default: all at once in WAL mode, else 1024)",
+    )
+    backup_parser.add_argument("--sleep", type=float, default=BACKUP_STEP_SLEEP_SECONDS, help="Pause between steps")
+
+    migrate_parser = commands.add_parser("migrate-dedup", help="Copy cookie dedup rows into the hashed table")
+    migrate_parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    migrate_parser.add_argument("--drop-cookies", action="store_true", help="Empty the cookie table afterwards")
+    migrate_parser.add_argument("--vacuum", action="store_true", help="Rewrite the database files to reclaim space")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), stream=sys.stderr)
+    if STORAGE_BACKEND != "sqlite":
+        logger.error(f"Admin commands work on SQLite storage; STORAGE_BACKEND={STORAGE_BACKEND} keeps its data elsewhere")
+        return 1
+    initialize_database()
+    try:
+        if args.command == "export":
+            if args.cookies and DEDUP_BACKEND == "hashed":
+                logger.error("export --cookies is not available with DEDUP_BACKEND=hashed: visitor keys do not keep the visitor id")
+                return 1
+            out = _open_output(args.output)
+            try:
+                counts = export_records(out, _guess_format(args.output, args.format), args.cookies, args.chunk_size)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            logger.info(f"Exported {counts['badge']} badges and {counts['cookie']} cookies")
+        elif args.command == "import":
+            source = _open_input(args.input)
+            try:
+                fmt = _guess_format(args.input, args.format)
+                counts = import_records(read_records(source, fmt), args.mode, args.batch_size)
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+            logger.info(
+                f"Imported {counts['badge']} badges and {counts['cookie']} cookies ({args.mode}), "
+                f"skipped {counts['skipped']} cookies of unknown badges"
+            )
+        elif args.command == "backup":
+            paths = backup_database(args.destination, args.pages, args.sleep)
+            logger.info(f"Backup written to {', '.join(paths)}")
+        else:
+            counts = migrate_cookies_to_keys(args.batch_size, args.drop_cookies, args.vacuum)
+            logger.info(
+                f"Migrated {counts['migrated']} dedup rows, dropped {counts['dropped']} cookie rows; "
+                f"set DEDUP_BACKEND=hashed to use them"
+            )
+    finally:
+        close_database()
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
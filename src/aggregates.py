@@ -0,0 +1,68 @@
+from typing import Dict, Optional
+from .storage import storage, StorageBackend
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SystemAggregates:
+    """Running totals for /api/stats, seeded once from the database and updated on every write"""
+
+    def __init__(self, window_seconds: int = 86400, bucket_seconds: int = 300):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._total_tags = 0
+        self._total_visits = 0
+        # Badge creations per time bucket, covering the rolling "new today" window
+        self._created_buckets: Dict[int, int] = {}
+
+    def load(self, now: Optional[int] = None, backend: Optional[StorageBackend] = None):
+        """Seed the counters with one scan of the storage backend"""
+        backend = storage if backend is None else backend
+        now = int(time.time()) if now is None else now
+        total_tags, total_visits = backend.totals()
+        created_buckets = backend.created_buckets(now - self.window_seconds, self.bucket_seconds)
+        with self._lock:
+            self._total_tags = total_tags
+            self._total_visits = total_visits
+            self._created_buckets = created_buckets
+            self.loaded = True
+        logger.info(f"Loaded system aggregates: {total_tags} tags, {total_visits} visits")
+
+    def reset(self):
+        with self._lock:
+            self._total_tags = 0
+            self._total_visits = 0
+            self._created_buckets = {}
+            self.loaded = False
+
+    def record_badge_created(self, created: int):
+        if not self.loaded:
+            return
+        bucket = created // self.bucket_seconds
+        with self._lock:
+            self._total_tags += 1
+            self._created_buckets[bucket] = self._created_buckets.get(bucket, 0) + 1
+
+    def record_visits(self, amount: int = 1):
+        if not self.loaded:
+            return
+        with self._lock:
+            self._total_visits += amount
+
+    def snapshot(self, now: Optional[int] = None) -> dict:
+        now = int(time.time()) if now is None else now
+        oldest_bucket = (now - self.window_seconds) // self.bucket_seconds + 1
+        with self._lock:
+            for bucket in [b for b in self._created_buckets if b < oldest_bucket]:
+                del self._created_buckets[bucket]
+            return {
+                "total_tracked_tags": self._total_tags,
+                "total_visits": self._total_visits,
+                "new_badges_today": sum(self._created_buckets.values()),
+            }
+
+system_aggregates = SystemAggregates()
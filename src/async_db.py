@@ -0,0 +1,158 @@
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import queue
+import threading
+import os
+import logging
+from .models import db, use_shard, shard_for_tag, connection_scope
+from .cache import tag_cache
+from .aggregates import system_aggregates
+from .storage import storage
+from .executor import db_executor, DatabaseBusyError
+from .coordinator import coordinator_client
+from .coalesce import SingleFlight, Batcher
+from . import services
+
+logger = logging.getLogger(__name__)
+
+DB_WRITER_MAX_QUEUE = int(os.getenv("DB_WRITER_MAX_QUEUE", "1000"))
+
+class VisitWriter:
+    """One thread per shard that performs every visit write to that shard.
+
+    Writes are queued with a future the event loop awaits. Each thread keeps
+    its shard connection open while it runs, so sqlite3's per-connection
+    statement cache holds the write path's prepared statements, and writes
+    to one shard run one after another instead of pool threads waiting on
+    each other's write lock through busy_timeout.
+    """
+
+    def __init__(self, max_queue: int):
+        self.max_queue = max_queue
+        self._queues: List[queue.Queue] = []
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.writes = 0
+        self.rejected = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def start(self):
+        if self._threads:
+            return
+        for index in range(len(db.shards)):
+            jobs: queue.Queue = queue.Queue()
+            thread = threading.Thread(target=self._run, args=(index, jobs), name=f"visit-writer-{index}", daemon=True)
+            self._queues.append(jobs)
+            self._threads.append(thread)
+            thread.start()
+        logger.info(f"Visit writers started ({len(self._threads)} shards, max queue {self.max_queue})")
+
+    def stop(self):
+        """Finish queued writes and stop the threads"""
+        jobs_queues, threads = self._queues, self._threads
+        self._queues, self._threads = [], []
+        for jobs in jobs_queues:
+            jobs.put(None)
+        for thread in threads:
+            thread.join()
+
+    def submit(self, cookie_values: List[Optional[str]], tag_str: str) -> Future:
+        """Queue update_visit_counts on the tag's shard thread"""
+        with self._lock:
+            if self._in_flight >= self.max_queue:
+                self.rejected += 1
+                raise DatabaseBusyError("Visit write queue is full")
+            self._in_flight += 1
+        future: Future = Future()
+        self._queues[shard_for_tag(tag_str)].put((cookie_values, tag_str, future))
+        return future
+
+    def _run(self, index: int, jobs: queue.Queue):
+        with use_shard(index), connection_scope():
+            while True:
+                job = jobs.get()
+                if job is None:
+                    return
+                cookie_values, tag_str, future = job
+                try:
+                    if future.set_running_or_notify_cancel():
+                        future.set_result(services.update_visit_counts(cookie_values, tag_str))
+                except Exception as e:
+                    future.set_exception(e)
+                finally:
+                    with self._lock:
+                        self._in_flight -= 1
+                        self.writes += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "threads": len(self._threads),
+                "max_queue": self.max_queue,
+                "queue_depth": self._in_flight,
+                "writes": self.writes,
+                "rejected": self.rejected,
+            }
+
+visit_writer = VisitWriter(DB_WRITER_MAX_QUEUE)
+tag_count_reads = SingleFlight()
+visit_batches = Batcher()
+
+def start():
+    """Start the shard writers where this process writes to SQLite itself"""
+    if storage.name == "sqlite" and not coordinator_client.enabled:
+        visit_writer.start()
+
+def stop():
+    visit_writer.stop()
+
+def _reads_forwarded() -> bool:
+    # Only the coordinator holds the data of a backend that lives in process memory
+    return coordinator_client.enabled and not storage.shared_across_processes
+
+async def record_visit(cookie_value: Optional[str], tag_str: str) -> Tuple[int, bool, Optional[str]]:
+    """update_visit_count; visits to one tag that arrive while its previous write is running are written together"""
+    return await visit_batches.submit(tag_str, cookie_value, lambda cookie_values: record_visits(cookie_values, tag_str))
+
+async def record_visits(cookie_values: List[Optional[str]], tag_str: str) -> List[Tuple[int, bool, Optional[str]]]:
+    """update_visit_counts on the coordinator, the tag's shard writer or the database pool"""
+    if coordinator_client.enabled:
+        return await db_executor.run(coordinator_client.update_visit_counts, cookie_values, tag_str)
+    if visit_writer.running:
+        return await asyncio.wrap_future(visit_writer.submit(cookie_values, tag_str))
+    return await db_executor.run(services.update_visit_counts, cookie_values, tag_str)
+
+async def get_tag_visit_count(tag_str: str) -> int:
+    """Cached count, or one storage lookup shared by every concurrent miss for the tag"""
+    count = tag_cache.get(tag_str)
+    if count is None:
+        load = coordinator_client.get_tag_visit_count if _reads_forwarded() else services.load_tag_visit_count
+        count = await tag_count_reads.run(tag_str, lambda: db_executor.run(load, tag_str))
+    return count
+
+async def get_tag_visit_counts(tags: List[str]) -> Dict[str, int]:
+    """Counts for many tags; only the cache misses leave the event loop"""
+    if _reads_forwarded():
+        return await db_executor.run(coordinator_client.get_tag_visit_counts, tags)
+    counts = tag_cache.get_many(tags)
+    missing = [tag_str for tag_str in tags if tag_str not in counts]
+    if missing:
+        counts.update(await db_executor.run(services.load_tag_visit_counts, missing))
+    return {tag_str: counts[tag_str] for tag_str in tags}
+
+async def get_visit_history(tag_str: str, resolution: str, start: int, end: int) -> List[Tuple[int, int]]:
+    read_history = coordinator_client.get_visit_history if _reads_forwarded() else services.get_visit_history
+    return await db_executor.run(read_history, tag_str, resolution, start, end)
+
+async def get_system_statistics() -> dict:
+    """Served from the in-memory aggregates when loaded, without a thread hand-off"""
+    if coordinator_client.enabled:
+        return await db_executor.run(coordinator_client.get_system_statistics)
+    if system_aggregates.loaded:
+        return system_aggregates.snapshot()
+    return await db_executor.run(services.get_system_statistics)
@@ -0,0 +1,46 @@
+from functools import lru_cache
+from typing import NamedTuple
+from pydantic import TypeAdapter
+from .schemas import BadgeParams, BadgeTag
+from .badge_renderer import can_render_locally
+from .utils import shields_url_parts
+import os
+
+BADGE_PARAMS_CACHE_SIZE = int(os.getenv("BADGE_PARAMS_CACHE_SIZE", "1024"))
+
+_tag_adapter = TypeAdapter(BadgeTag)
+
+class BadgeVariant(NamedTuple):
+    """Validated display parameters of a badge with everything that does not depend on the count"""
+    label: str
+    color: str
+    style: str
+    logo: str
+    render_locally: bool
+    url_prefix: str
+    url_suffix: str
+    # Identifies the rendered body or redirect target in the ETag
+    etag_variant: str
+
+    def shields_url(self, count: int) -> str:
+        return f"{self.url_prefix}{count}{self.url_suffix}"
+
+@lru_cache(maxsize=BADGE_PARAMS_CACHE_SIZE)
+def badge_variant(label: str, color: str, style: str, logo: str) -> BadgeVariant:
+    """Validate raw query values once per distinct combination; raises ValueError if invalid.
+
+    Real traffic uses a handful of label/color/style/logo combinations, so
+    this is an LRU cache hit for nearly every request. Invalid input raises
+    and is never cached.
+    """
+    params = BadgeParams(tag="-", label=label, color=color, style=style, logo=logo)
+    render_locally = can_render_locally(params.logo)
+    url_prefix, url_suffix = shields_url_parts(params.label, params.color, params.style, params.logo)
+    return BadgeVariant(
+        params.label, params.color, params.style, params.logo, render_locally, url_prefix, url_suffix,
+        f"{render_locally}\0{params.label}\0{params.color}\0{params.style}\0{params.logo}",
+    )
+
+def parse_tag(tag: str) -> str:
+    """The tag if it is valid; raises ValueError if it is empty or too long"""
+    return _tag_adapter.validate_python(tag)
@@ -0,0 +1,177 @@
+from functools import lru_cache
+from typing import Dict
+import html
+import os
+import re
+
+BADGE_RENDERER = os.getenv("BADGE_RENDERER", "shields").lower()
+BADGE_RENDER_CACHE_SIZE = int(os.getenv("BADGE_RENDER_CACHE_SIZE", "4096"))
+
+# Advance widths of Verdana 11px (the shields.io badge font) for printable ASCII.
+_VERDANA_11_WIDTHS = {
+    " ": 3.87, "!": 4.33, '"': 5.05, "#": 9.0, "$": 7.0, "%": 11.84, "&": 7.99, "'": 2.95,
+    "(": 4.99, ")": 4.99, "*": 7.0, "+": 9.0, ",": 4.0, "-": 4.99, ".": 4.0, "/": 4.99,
+    "0": 7.0, "1": 7.0, "2": 7.0, "3": 7.0, "4": 7.0, "5": 7.0, "6": 7.0, "7": 7.0,
+    "8": 7.0, "9": 7.0, ":": 4.99, ";": 4.99, "<": 9.0, "=": 9.0, ">": 9.0, "?": 6.0,
+    "@": 11.0, "A": 7.52, "B": 7.54, "C": 7.68, "D": 8.48, "E": 6.96, "F": 6.32, "G": 8.53,
+    "H": 8.27, "I": 4.63, "J": 5.0, "K": 7.62, "L": 6.12, "M": 9.27, "N": 8.23, "O": 8.66,
+    "P": 6.63, "Q": 8.66, "R": 7.65, "S": 7.52, "T": 6.78, "U": 8.05, "V": 7.52, "W": 10.88,
+    "X": 7.54, "Y": 6.77, "Z": 7.54, "[": 4.99, "\\": 4.99, "]": 4.99, "^": 9.0, "_": 7.0,
+    "`": 7.0, "a": 6.61, "b": 6.82, "c": 5.73, "d": 6.82, "e": 6.55, "f": 3.87, "g": 6.82,
+    "h": 6.96, "i": 3.02, "j": 3.79, "k": 6.51, "l": 3.02, "m": 10.71, "n": 6.96, "o": 6.68,
+    "p": 6.82, "q": 6.82, "r": 4.69, "s": 5.73, "t": 4.33, "u": 6.96, "v": 6.51, "w": 8.98,
+    "x": 6.51, "y": 6.51, "z": 5.76, "{": 6.98, "|": 4.99, "}": 6.98, "~": 9.0,
+}
+
+# for-the-badge renders at 10px, with a bold message.
+_VERDANA_10_WIDTHS = {char: width * 10 / 11 for char, width in _VERDANA_11_WIDTHS.items()}
+_VERDANA_10_BOLD_WIDTHS = {char: width * 1.1 for char, width in _VERDANA_10_WIDTHS.items()}
+
+NAMED_COLORS = {
+    "brightgreen": "#4c1",
+    "green": "#97ca00",
+    "yellowgreen": "#a4a61d",
+    "yellow": "#dfb317",
+    "orange": "#fe7d37",
+    "red": "#e05d44",
+    "blue": "#007ec6",
+    "grey": "#555",
+    "gray": "#555",
+    "lightgrey": "#9f9f9f",
+    "lightgray": "#9f9f9f",
+    "success": "#4c1",
+    "important": "#fe7d37",
+    "critical": "#e05d44",
+    "informational": "#007ec6",
+    "inactive": "#9f9f9f",
+}
+
+LABEL_COLOR = "#555"
+_HEX_COLOR = re.compile(r"^(?:[0-9a-fA-F]{3}){1,2}$")
+
+SUPPORTED_STYLES = ("flat", "flat-square", "plastic", "for-the-badge")
+
+def text_width(text: str, widths: Dict[str, float]) -> float:
+    """Measure text using a precomputed glyph-width table"""
+    fallback = widths["m"]
+    return sum(widths.get(char, fallback) for char in text)
+
+def resolve_color(color: str) -> str:
+    """Map a shields-style color (name or bare hex) to an SVG fill"""
+    named = NAMED_COLORS.get(color.lower())
+    if named:
+        return named
+    if _HEX_COLOR.match(color):
+        return f"#{color.lower()}"
+    return NAMED_COLORS["lightgrey"]
+
+def _is_light(fill: str) -> bool:
+    hex_value = fill.lstrip("#")
+    if len(hex_value) == 3:
+        hex_value = "".join(c * 2 for c in hex_value)
+    r, g, b = (int(hex_value[i:i + 2], 16) for i in (0, 2, 4))
+    return (r * 299 + g * 587 + b * 114) / 255000 >= 0.69
+
+def _text_colors(fill: str):
+    if _is_light(fill):
+        return "#333", "#ccc"
+    return "#fff", "#010101"
+
+def _text_pair(text: str, center: float, width: float, fill: str, shadow: str, y: int) -> str:
+    escaped = html.escape(text)
+    x = round(center * 10)
+    length = round(width * 10)
+    return (
+        f'<text aria-hidden="true" x="{x}" y="{y + 10}" fill="{shadow}" fill-opacity=".3" '
+        f'transform="scale(.1)" textLength="{length}">{escaped}</text>'
+        f'<text x="{x}" y="{y}" transform="scale(.1)" fill="{fill}" textLength="{length}">{escaped}</text>'
+    )
+
+def _render_standard(label: str, message: str, color: str, style: str) -> str:
+    label_text_width = text_width(label, _VERDANA_11_WIDTHS)
+    message_text_width = text_width(message, _VERDANA_11_WIDTHS)
+    label_width = round(label_text_width + 10)
+    message_width = round(message_text_width + 10)
+    width = label_width + message_width
+    height = 18 if style == "plastic" else 20
+    text_y = 130 if style == "plastic" else 140
+
+    if style == "flat-square":
+        radius = 0
+        gradient = ""
+        overlay = ""
+    elif style == "plastic":
+        radius = 4
+        gradient = (
+            '<linearGradient id="s" x2="0" y2="100%"><stop offset="0" stop-color="#fff" stop-opacity=".7"/>'
+            '<stop offset=".1" stop-color="#aaa" stop-opacity=".1"/><stop offset=".9" stop-opacity=".3"/>'
+            '<stop offset="1" stop-opacity=".5"/></linearGradient>'
+        )
+        overlay = f'<rect width="{width}" height="{height}" fill="url(#s)"/>'
+    else:
+        radius = 3
+        gradient = (
+            '<linearGradient id="s" x2="0" y2="100%"><stop offset="0" stop-color="#bbb" stop-opacity=".1"/>'
+            '<stop offset="1" stop-opacity=".1"/></linearGradient>'
+        )
+        overlay = f'<rect width="{width}" height="{height}" fill="url(#s)"/>'
+
+    label_fill, label_shadow = _text_colors(LABEL_COLOR)
+    message_fill, message_shadow = _text_colors(color)
+    title = html.escape(f"{label}: {message}")
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" role="img" aria-label="{title}">'
+        f'<title>{title}</title>{gradient}'
+        f'<clipPath id="r"><rect width="{width}" height="{height}" rx="{radius}" fill="#fff"/></clipPath>'
+        f'<g clip-path="url(#r)"><rect width="{label_width}" height="{height}" fill="{LABEL_COLOR}"/>'
+        f'<rect x="{label_width}" width="{message_width}" height="{height}" fill="{color}"/>{overlay}</g>'
+        f'<g fill="#fff" text-anchor="middle" font-family="Verdana,Geneva,DejaVu Sans,sans-serif" '
+        f'text-rendering="geometricPrecision" font-size="110">'
+        f'{_text_pair(label, label_width / 2, label_text_width, label_fill, label_shadow, text_y)}'
+        f'{_text_pair(message, label_width + message_width / 2, message_text_width, message_fill, message_shadow, text_y)}'
+        f'</g></svg>'
+    )
+
+def _render_for_the_badge(label: str, message: str, color: str) -> str:
+    label = label.upper()
+    message = message.upper()
+    letter_spacing = 1.25
+    label_text_width = text_width(label, _VERDANA_10_WIDTHS) + letter_spacing * len(label)
+    message_text_width = text_width(message, _VERDANA_10_BOLD_WIDTHS) + letter_spacing * len(message)
+    label_width = round(label_text_width + 18)
+    message_width = round(message_text_width + 18)
+    width = label_width + message_width
+
+    label_fill, _ = _text_colors(LABEL_COLOR)
+    message_fill, _ = _text_colors(color)
+    title = html.escape(f"{label}: {message}")
+    escaped_label = html.escape(label)
+    escaped_message = html.escape(message)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="28" role="img" aria-label="{title}">'
+        f'<title>{title}</title>'
+        f'<g shape-rendering="crispEdges"><rect width="{label_width}" height="28" fill="{LABEL_COLOR}"/>'
+        f'<rect x="{label_width}" width="{message_width}" height="28" fill="{color}"/></g>'
+        f'<g fill="#fff" text-anchor="middle" font-family="Verdana,Geneva,DejaVu Sans,sans-serif" '
+        f'text-rendering="geometricPrecision" font-size="100">'
+        f'<text transform="scale(.1)" x="{round(label_width * 5)}" y="175" textLength="{round(label_text_width * 10)}" '
+        f'fill="{label_fill}">{escaped_label}</text>'
+        f'<text transform="scale(.1)" x="{round((label_width + message_width / 2) * 10)}" y="175" '
+        f'textLength="{round(message_text_width * 10)}" fill="{message_fill}" font-weight="bold">{escaped_message}</text>'
+        f'</g></svg>'
+    )
+
+@lru_cache(maxsize=BADGE_RENDER_CACHE_SIZE)
+def render_badge_svg(label: str, count: int, color: str, style: str) -> bytes:
+    """Render a badge as SVG bytes; repeat renders are served from an LRU cache"""
+    fill = resolve_color(color)
+    message = str(count)
+    if style == "for-the-badge":
+        svg = _render_for_the_badge(label, message, fill)
+    else:
+        svg = _render_standard(label, message, fill, style if style in SUPPORTED_STYLES else "flat")
+    return svg.encode("utf-8")
+
+def can_render_locally(logo: str) -> bool:
+    """Logos come from the simple-icons set on shields.io, so those badges still redirect"""
+    return BADGE_RENDERER == "svg" and not logo
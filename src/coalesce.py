@@ -0,0 +1,71 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+import asyncio
+
+class SingleFlight:
+    """Concurrent awaits of the same key share one call.
+
+    Lives on the event loop: the first caller starts the call and later
+    callers await the same future until it completes. A cancelled caller
+    does not cancel the shared call.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.shared = 0
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is None or future.get_loop() is not asyncio.get_running_loop():
+            future = asyncio.ensure_future(call())
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+class Batcher:
+    """Concurrent submissions for one key run as a single batch.
+
+    Lives on the event loop. The first submission for a key starts a drain
+    task that hands everything queued for the key to run_batch; items
+    submitted while a batch is running form the next one. run_batch returns
+    one result per item, in order.
+    """
+
+    def __init__(self):
+        self._queues: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, key: Hashable, item: Any, run_batch: Callable[[List[Any]], Awaitable[List[Any]]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(key)
+        if queue is None:
+            self._queues[key] = [(item, future)]
+            asyncio.ensure_future(self._drain(key, run_batch))
+        else:
+            queue.append((item, future))
+        return await future
+
+    async def _drain(self, key: Hashable, run_batch: Callable[[List[Any]], Awaitable[List[Any]]]):
+        try:
+            while self._queues[key]:
+                batch, self._queues[key] = self._queues[key], []
+                self.batches += 1
+                self.items += len(batch)
+                try:
+                    results = await run_batch([item for item, _ in batch])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            del self._queues[key]
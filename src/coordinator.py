@@ -0,0 +1,200 @@
+from typing import Dict, List, Optional, Tuple
+from .cache import tag_cache
+import asyncio
+import json
+import signal
+import socket
+import threading
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Unix socket of the coordinator process; empty means every process writes to SQLite itself
+COORDINATOR_SOCKET = os.getenv("COORDINATOR_SOCKET", "")
+COORDINATOR_TIMEOUT_SECONDS = float(os.getenv("COORDINATOR_TIMEOUT_SECONDS", "5"))
+
+class CoordinatorError(RuntimeError):
+    """Raised when the coordinator cannot be reached or reports a failure"""
+
+class CoordinatorClient:
+    """Forwards visit writes and system stats from a web worker to the coordinator.
+
+    Requests and replies are single JSON lines. Each thread keeps its own
+    connection, so the DB thread pool sends requests in parallel without
+    locking; a connection that fails is dropped and reopened on the next call.
+    """
+
+    def __init__(self, socket_path: str, timeout: float):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.socket_path)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            conn = self._local.conn = (sock, sock.makefile("rb"))
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            conn[1].close()
+            conn[0].close()
+
+    def request(self, op: str, **fields) -> dict:
+        payload = json.dumps({"op": op, **fields}).encode("utf-8") + b"\n"
+        try:
+            sock, reader = self._connection()
+            sock.sendall(payload)
+            line = reader.readline()
+        except OSError as e:
+            self._drop_connection()
+            raise CoordinatorError(f"Coordinator unavailable: {e}") from e
+        if not line:
+            self._drop_connection()
+            raise CoordinatorError("Coordinator closed the connection")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise CoordinatorError(reply["error"])
+        return reply
+
+    def update_visit_count(self, cookie_id: Optional[str], tag_str: str) -> Tuple[int, bool, str]:
+        """Same contract as services.update_visit_count, executed by the coordinator"""
+        reply = self.request("visit", cookie_id=cookie_id, tag=tag_str)
+        tag_cache.set_max(tag_str, reply["count"])
+        return reply["count"], reply["incremented"], reply["new_cookie_id"]
+
+    def update_visit_counts(self, cookie_ids: List[Optional[str]], tag_str: str) -> List[Tuple[int, bool, str]]:
+        """Same contract as services.update_visit_counts, executed by the coordinator"""
+        results = [tuple(result) for result in self.request("visits", cookie_ids=cookie_ids, tag=tag_str)["results"]]
+        tag_cache.set_max(tag_str, max(count for count, _, _ in results))
+        return results
+
+    def get_system_statistics(self) -> dict:
+        return self.request("stats")["stats"]
+
+    def get_tag_visit_count(self, tag_str: str) -> int:
+        count = self.request("count", tag=tag_str)["count"]
+        tag_cache.set_max(tag_str, count)
+        return count
+
+    def get_tag_visit_counts(self, tags: List[str]) -> Dict[str, int]:
+        counts = self.request("counts", tags=tags)["counts"]
+        for tag_str, count in counts.items():
+            tag_cache.set_max(tag_str, count)
+        return counts
+
+    def get_visit_history(self, tag_str: str, resolution: str, start: int, end: int) -> List[Tuple[int, int]]:
+        reply = self.request("history", tag=tag_str, resolution=resolution, start=start, end=end)
+        return [tuple(bucket) for bucket in reply["buckets"]]
+
+    def close(self):
+        self._drop_connection()
+
+coordinator_client = CoordinatorClient(COORDINATOR_SOCKET, COORDINATOR_TIMEOUT_SECONDS)
+
+async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Serve one worker connection; requests on it are answered in order"""
+    from . import async_db
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+                op = message.get("op")
+                if op == "visit":
+                    count, incremented, new_cookie_id = (
+                        await async_db.record_visits([message.get("cookie_id")], message["tag"])
+                    )[0]
+                    reply = {"count": count, "incremented": incremented, "new_cookie_id": new_cookie_id}
+                elif op == "visits":
+                    reply = {"results": await async_db.record_visits(message["cookie_ids"], message["tag"])}
+                elif op == "count":
+                    reply = {"count": await async_db.get_tag_visit_count(message["tag"])}
+                elif op == "counts":
+                    reply = {"counts": await async_db.get_tag_visit_counts(message["tags"])}
+                elif op == "history":
+                    buckets = await async_db.get_visit_history(
+                        message["tag"], message["resolution"], message["start"], message["end"]
+                    )
+                    reply = {"buckets": buckets}
+                elif op == "stats":
+                    reply = {"stats": await async_db.get_system_statistics()}
+                elif op == "ping":
+                    reply = {"ok": True}
+                else:
+                    reply = {"error": f"Unknown op '{op}'"}
+            except Exception as e:
+                logger.error(f"Error handling coordinator request: {e}")
+                reply = {"error": str(e)}
+            writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(socket_path: str, ready: Optional[asyncio.Event] = None):
+    """Own all database writes and answer workers until cancelled"""
+    from .main import app, lifespan
+
+    # This process is the writer; it must not forward to itself
+    coordinator_client.socket_path = ""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    if threading.current_thread() is threading.main_thread():
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, task.cancel)
+
+    connections = set()
+
+    async def track_connection(reader, writer):
+        task = asyncio.current_task()
+        connections.add(task)
+        try:
+            await handle_connection(reader, writer)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            connections.discard(task)
+
+    async with lifespan(app):
+        server = await asyncio.start_unix_server(track_connection, path=socket_path)
+        logger.info(f"Coordinator listening on {socket_path}")
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        except asyncio.CancelledError:
+            # Swallowed so the lifespan shutdown still flushes buffered visits
+            logger.info("Coordinator stopping")
+        finally:
+            # Workers keep their connections open; close them before the loop goes away
+            for task in list(connections):
+                task.cancel()
+            await asyncio.gather(*connections, return_exceptions=True)
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+def main():
+    socket_path = COORDINATOR_SOCKET or os.path.join(os.getcwd(), "data", "coordinator.sock")
+    asyncio.run(serve(socket_path))
+
+if __name__ == "__main__":
+    main()
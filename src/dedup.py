@@ -0,0 +1,253 @@
+from collections import OrderedDict
+from typing import Iterable, List, Tuple
+from .models import db, Cookie, VisitorKey, BloomSlice, BloomPage
+import hashlib
+import math
+import threading
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEDUP_BACKEND = os.getenv("DEDUP_BACKEND", "cookie").lower()
+BLOOM_ERROR_RATE = float(os.getenv("BLOOM_ERROR_RATE", "0.001"))
+BLOOM_INITIAL_CAPACITY = int(os.getenv("BLOOM_INITIAL_CAPACITY", "256"))
+BLOOM_CACHE_SIZE = int(os.getenv("BLOOM_CACHE_SIZE", "1024"))
+BLOOM_PAGE_BYTES = 256
+
+# Fixed SQL text for the per-visit inserts, so connections reuse the prepared statement;
+# a row already present for the (visitor, badge) is left alone and reports no change
+_INSERT_COOKIE_SQL = (
+    f"INSERT OR IGNORE INTO {Cookie._meta.table_name} (cookie_id, badge_id, last_visit) VALUES (?, ?, ?)"
+)
+_INSERT_VISITOR_KEY_SQL = (
+    f"INSERT OR IGNORE INTO {VisitorKey._meta.table_name} (key, last_visit) VALUES (?, ?)"
+)
+
+class CookieDedupStore:
+    """Exact dedup with one Cookie row per (visitor, badge).
+
+    Every store takes both the badge id and its tag; each uses whichever
+    identifies the badge in its own rows.
+    """
+
+    def check_and_add(self, badge_id: int, tag_str: str, cookie_id: str, current_time: int) -> bool:
+        """Record the visitor for the badge, returning True if it had not been counted"""
+        # The unique (cookie_id, badge) index turns a repeat into an ignored insert
+        return db.execute_sql(_INSERT_COOKIE_SQL, (cookie_id, badge_id, current_time)).rowcount > 0
+
+    def add_new(self, badge_id: int, tag_str: str, cookie_id: str, current_time: int) -> bool:
+        """Record a visitor id that was just issued; it cannot exist yet, so no lookup is needed"""
+        db.execute_sql(_INSERT_COOKIE_SQL, (cookie_id, badge_id, current_time))
+        return True
+
+    def contains(self, badge_id: int, tag_str: str, cookie_id: str) -> bool:
+        return Cookie.select().where((Cookie.cookie_id == cookie_id) & (Cookie.badge == badge_id)).exists()
+
+    def add_many(self, rows: Iterable[Tuple[int, str, str, int]]):
+        rows = [
+            {'badge': badge_id, 'cookie_id': cookie_id, 'last_visit': last_visit}
+            for badge_id, _, cookie_id, last_visit in rows
+        ]
+        if rows:
+            Cookie.insert_many(rows).on_conflict_ignore().execute()
+
+    def forget(self, badge_id: int):
+        pass
+
+def visitor_key(tag_str: str, cookie_id: str) -> int:
+    """Signed 64-bit BLAKE2b of (tag, visitor), so it fits an SQLite INTEGER"""
+    digest = hashlib.blake2b(f"{tag_str}\0{cookie_id}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+class HashedDedupStore:
+    """Exact dedup with one fixed-width key per (visitor, tag) in a WITHOUT ROWID table.
+
+    The row is the primary-key B-tree entry itself: 8 bytes of key plus the
+    last visit, with no rowid, no visitor string and no badge foreign key to
+    index. Keys hash the tag rather than the badge id, which differs between
+    databases, so imported cookie records map to the same keys. Two visitors
+    of a badge colliding in 64 bits would make the second one go uncounted;
+    with a billion rows the chance of any collision is below 3%, and of one
+    on a given visit far smaller.
+    """
+
+    def check_and_add(self, badge_id: int, tag_str: str, cookie_id: str, current_time: int) -> bool:
+        """Record the visitor for the badge, returning True if it had not been counted"""
+        # One B-tree probe: the insert is ignored if the key is already there
+        return db.execute_sql(_INSERT_VISITOR_KEY_SQL, (visitor_key(tag_str, cookie_id), current_time)).rowcount > 0
+
+    def add_new(self, badge_id: int, tag_str: str, cookie_id: str, current_time: int) -> bool:
+        self.check_and_add(badge_id, tag_str, cookie_id, current_time)
+        return True
+
+    def contains(self, badge_id: int, tag_str: str, cookie_id: str) -> bool:
+        return VisitorKey.select().where(VisitorKey.key == visitor_key(tag_str, cookie_id)).exists()
+
+    def add_many(self, rows: Iterable[Tuple[int, str, str, int]]):
+        rows = [
+            {'key': visitor_key(tag_str, cookie_id), 'last_visit': last_visit}
+            for _, tag_str, cookie_id, last_visit in rows
+        ]
+        if rows:
+            VisitorKey.insert_many(rows).on_conflict_ignore().execute()
+
+    def forget(self, badge_id: int):
+        pass
+
+def slice_parameters(capacity: int, error_rate: float) -> Tuple[int, int]:
+    """Optimal (num_bits, num_hashes) for a Bloom filter of the given capacity and error rate"""
+    num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+    num_bits = max(8, math.ceil(num_bits / 8) * 8)
+    num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+    return num_bits, num_hashes
+
+def bit_positions(item: str, num_bits: int, num_hashes: int) -> List[int]:
+    """Kirsch-Mitzenmacher double hashing over one 128-bit BLAKE2b digest"""
+    digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % num_bits for i in range(num_hashes)]
+
+class _Slice:
+    __slots__ = ("id", "capacity", "num_bits", "num_hashes", "count", "bits")
+
+    def __init__(self, row: BloomSlice, bits: bytearray):
+        self.id = row.id
+        self.capacity = row.capacity
+        self.num_bits = row.num_bits
+        self.num_hashes = row.num_hashes
+        self.count = row.count
+        self.bits = bits
+
+    def contains(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in bit_positions(item, self.num_bits, self.num_hashes))
+
+    def add(self, item: str) -> set:
+        """Set the item's bits, returning the indexes of the pages that changed"""
+        dirty = set()
+        for p in bit_positions(item, self.num_bits, self.num_hashes):
+            mask = 1 << (p & 7)
+            if not self.bits[p >> 3] & mask:
+                self.bits[p >> 3] |= mask
+                dirty.add((p >> 3) // BLOOM_PAGE_BYTES)
+        self.count += 1
+        return dirty
+
+class BloomDedupStore:
+    """Approximate dedup with a scalable Bloom filter per badge, persisted as blob pages.
+
+    Each slice doubles the capacity of the previous one and halves its error
+    rate, so the combined false-positive rate stays below error_rate however
+    many visitors a badge gets. A false positive means a new visitor is not
+    counted; visitors are never counted twice. Writes only touch the pages
+    whose bits changed and must run inside the caller's visit transaction.
+    """
+
+    growth = 2
+    tightening = 0.5
+
+    def __init__(self, error_rate: float, initial_capacity: int, cache_size: int):
+        self.error_rate = error_rate
+        self.initial_capacity = initial_capacity
+        self.cache_size = cache_size
+        # Keyed by (shard, badge id): badge ids are only unique within a shard
+        self._filters: "OrderedDict[Tuple[int, int], List[_Slice]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _slice_error_rate(self, slice_index: int) -> float:
+        return self.error_rate * (1 - self.tightening) * self.tightening ** slice_index
+
+    def _load(self, badge_id: int) -> List[_Slice]:
+        key = (db.current_shard, badge_id)
+        with self._lock:
+            slices = self._filters.get(key)
+            if slices is not None:
+                self._filters.move_to_end(key)
+                return slices
+
+        slices = []
+        rows = BloomSlice.select().where(BloomSlice.badge == badge_id).order_by(BloomSlice.slice_index)
+        for row in rows:
+            bits = bytearray(row.num_bits // 8)
+            for page in BloomPage.select().where(BloomPage.bloom_slice == row.id):
+                start = page.page * BLOOM_PAGE_BYTES
+                bits[start:start + len(page.bits)] = page.bits
+            slices.append(_Slice(row, bits))
+
+        with self._lock:
+            # Another thread may have loaded the same filter meanwhile; keep a single copy
+            slices = self._filters.setdefault(key, slices)
+            while len(self._filters) > self.cache_size:
+                self._filters.popitem(last=False)
+        return slices
+
+    def contains(self, badge_id: int, tag_str: str, cookie_id: str) -> bool:
+        return any(s.contains(cookie_id) for s in self._load(badge_id))
+
+    def add_new(self, badge_id: int, tag_str: str, cookie_id: str, current_time: int) -> bool:
+        # The filter has to be updated anyway, and a false positive must still count as seen
+        return self.check_and_add(badge_id, tag_str, cookie_id, current_time)
+
+    def check_and_add(self, badge_id: int, tag_str: str, cookie_id: str, current_time: int) -> bool:
+        """Record the visitor for the badge, returning True if it had not been counted"""
+        slices = self._load(badge_id)
+        if any(s.contains(cookie_id) for s in slices):
+            return False
+
+        if not slices or slices[-1].count >= slices[-1].capacity:
+            slice_index = len(slices)
+            capacity = self.initial_capacity * self.growth ** slice_index
+            num_bits, num_hashes = slice_parameters(capacity, self._slice_error_rate(slice_index))
+            row = BloomSlice.create(
+                badge=badge_id,
+                slice_index=slice_index,
+                capacity=capacity,
+                num_bits=num_bits,
+                num_hashes=num_hashes,
+            )
+            slices.append(_Slice(row, bytearray(num_bits // 8)))
+
+        target = slices[-1]
+        dirty_pages = [
+            {
+                'bloom_slice': target.id,
+                'page': page,
+                'bits': bytes(target.bits[page * BLOOM_PAGE_BYTES:(page + 1) * BLOOM_PAGE_BYTES]),
+            }
+            for page in target.add(cookie_id)
+        ]
+        if dirty_pages:
+            BloomPage.insert_many(dirty_pages).on_conflict(
+                conflict_target=[BloomPage.bloom_slice, BloomPage.page],
+                preserve=[BloomPage.bits],
+            ).execute()
+        BloomSlice.update(count=target.count).where(BloomSlice.id == target.id).execute()
+        return True
+
+    def add_many(self, rows: Iterable[Tuple[int, str, str, int]]):
+        for badge_id, tag_str, cookie_id, last_visit in rows:
+            self.check_and_add(badge_id, tag_str, cookie_id, last_visit)
+
+    def forget(self, badge_id: int):
+        """Drop the cached filter after a rolled-back transaction so it is reloaded from the database"""
+        with self._lock:
+            self._filters.pop((db.current_shard, badge_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._filters.clear()
+
+def create_dedup_store(backend: str = DEDUP_BACKEND):
+    if backend == "bloom":
+        logger.info(f"Using Bloom filter dedup (false-positive rate {BLOOM_ERROR_RATE})")
+        return BloomDedupStore(BLOOM_ERROR_RATE, BLOOM_INITIAL_CAPACITY, BLOOM_CACHE_SIZE)
+    if backend == "hashed":
+        logger.info("Using hashed visitor keys for dedup")
+        return HashedDedupStore()
+    if backend != "cookie":
+        logger.warning(f"Unknown DEDUP_BACKEND '{backend}', falling back to 'cookie'")
+    return CookieDedupStore()
+
+dedup_store = create_dedup_store()
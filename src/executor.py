@@ -0,0 +1,95 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import asyncio
+import functools
+import threading
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_WORKERS = int(os.getenv("DB_POOL_WORKERS", "4"))
+DB_POOL_MAX_QUEUE = int(os.getenv("DB_POOL_MAX_QUEUE", "1000"))
+
+class DatabaseBusyError(RuntimeError):
+    """Raised when the database pool already has max_queue calls waiting or running"""
+
+class DatabaseExecutor:
+    """Bounded thread pool that keeps blocking peewee calls off the event loop"""
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._completed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="db")
+        logger.info(f"Database thread pool started ({self.max_workers} workers, max queue {self.max_queue})")
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run func in the pool and await its result"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="db")
+            if self._in_flight >= self.max_queue:
+                self._rejected += 1
+                raise DatabaseBusyError("Database queue is full")
+            self._in_flight += 1
+            self._submitted += 1
+            executor = self._executor
+        call = functools.partial(self._timed_call, time.perf_counter(), func, args, kwargs)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, call)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def _timed_call(self, submitted_at: float, func: Callable, args: tuple, kwargs: dict) -> Any:
+        started_at = time.perf_counter()
+        waited = started_at - submitted_at
+        with self._lock:
+            self._running += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._run_total += time.perf_counter() - started_at
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self._in_flight - self._running,
+                "running": self._running,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._wait_total / self._completed * 1000, 3) if self._completed else 0.0,
+                "max_wait_ms": round(self._wait_max * 1000, 3),
+                "avg_run_ms": round(self._run_total / self._completed * 1000, 3) if self._completed else 0.0,
+            }
+
+db_executor = DatabaseExecutor(max_workers=DB_POOL_WORKERS, max_queue=DB_POOL_MAX_QUEUE)
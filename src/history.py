@@ -0,0 +1,151 @@
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from .models import db, VisitBucket, connection_scope, each_shard
+from .metrics import db_transaction_duration
+import asyncio
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Counted visits per tag are kept as hourly buckets, folded into days after
+# HISTORY_HOURLY_RETENTION_DAYS and into months after HISTORY_DAILY_RETENTION_DAYS.
+# Months are kept forever.
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "true").lower() in ("1", "true", "yes")
+HISTORY_HOURLY_RETENTION_DAYS = int(os.getenv("HISTORY_HOURLY_RETENTION_DAYS", "7"))
+HISTORY_DAILY_RETENTION_DAYS = int(os.getenv("HISTORY_DAILY_RETENTION_DAYS", "365"))
+HISTORY_ROLLUP_INTERVAL_SECONDS = int(os.getenv("HISTORY_ROLLUP_INTERVAL_SECONDS", "3600"))
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", "1000"))
+
+HOUR = "hour"
+DAY = "day"
+MONTH = "month"
+RESOLUTIONS = (HOUR, DAY, MONTH)
+
+def bucket_start(timestamp: int, resolution: str) -> int:
+    """Start of the UTC hour, day or calendar month containing timestamp"""
+    if resolution == HOUR:
+        return timestamp - timestamp % 3600
+    if resolution == DAY:
+        return timestamp - timestamp % 86400
+    moment = datetime.fromtimestamp(timestamp, timezone.utc)
+    return int(datetime(moment.year, moment.month, 1, tzinfo=timezone.utc).timestamp())
+
+def next_bucket(start: int, resolution: str) -> int:
+    if resolution == HOUR:
+        return start + 3600
+    if resolution == DAY:
+        return start + 86400
+    moment = datetime.fromtimestamp(start, timezone.utc)
+    year, month = (moment.year + 1, 1) if moment.month == 12 else (moment.year, moment.month + 1)
+    return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())
+
+def bucket_range(start: int, end: int, resolution: str) -> Iterator[int]:
+    """Bucket starts covering [start, end)"""
+    current = bucket_start(start, resolution)
+    while current < end:
+        yield current
+        current = next_bucket(current, resolution)
+
+def source_resolutions(resolution: str) -> Tuple[str, ...]:
+    """Stored resolutions that contribute to a query at `resolution`"""
+    return RESOLUTIONS[:RESOLUTIONS.index(resolution) + 1]
+
+def fold(rows: Iterable[Tuple[str, int, int]], resolution: str, start: int, end: int) -> List[Tuple[int, int]]:
+    """Merge (resolution, bucket_start, visits) rows into dense `resolution` buckets over [start, end)"""
+    totals = dict.fromkeys(bucket_range(start, end, resolution), 0)
+    for _, row_start, visits in rows:
+        key = bucket_start(row_start, resolution)
+        if key in totals:
+            totals[key] += visits
+    return list(totals.items())
+
+def rollup_cutoffs(now: int) -> Tuple[int, int]:
+    """Hourly buckets before the first cutoff become days, daily ones before the second become months.
+
+    Both are aligned to the coarser bucket so only complete days and months are folded.
+    """
+    hourly_cutoff = bucket_start(now - HISTORY_HOURLY_RETENTION_DAYS * 86400, DAY)
+    daily_cutoff = bucket_start(now - HISTORY_DAILY_RETENTION_DAYS * 86400, MONTH)
+    return hourly_cutoff, daily_cutoff
+
+def hourly_increments(timestamps: Iterable[int]) -> Dict[int, int]:
+    increments: Dict[int, int] = {}
+    for timestamp in timestamps:
+        hour = bucket_start(timestamp, HOUR)
+        increments[hour] = increments.get(hour, 0) + 1
+    return increments
+
+_ADD_HOURLY_VISITS_SQL = (
+    f"INSERT INTO {VisitBucket._meta.table_name} (badge_id, resolution, bucket_start, visits) VALUES (?, '{HOUR}', ?, ?) "
+    f"ON CONFLICT (badge_id, resolution, bucket_start) DO UPDATE SET visits = visits + excluded.visits"
+)
+
+def add_hourly_visits(badge_id: int, increments: Dict[int, int]):
+    """Upsert hourly buckets of a badge; runs inside the caller's transaction"""
+    for hour, visits in increments.items():
+        db.execute_sql(_ADD_HOURLY_VISITS_SQL, (badge_id, hour, visits))
+
+def read_history_rows(badge_id: int, resolution: str, start: int, end: int) -> List[Tuple[str, int, int]]:
+    query = (
+        VisitBucket.select(VisitBucket.resolution, VisitBucket.bucket_start, VisitBucket.visits)
+        .where(
+            (VisitBucket.badge == badge_id)
+            & VisitBucket.resolution.in_(source_resolutions(resolution))
+            & (VisitBucket.bucket_start >= bucket_start(start, resolution))
+            & (VisitBucket.bucket_start < end)
+        )
+        .tuples()
+    )
+    return list(query)
+
+_FOLD_SQL = {
+    DAY: "(bucket_start / 86400) * 86400",
+    MONTH: "CAST(strftime('%s', bucket_start, 'unixepoch', 'start of month') AS INTEGER)",
+}
+
+def rollup_sqlite(now: Optional[int] = None) -> dict:
+    """Fold old hourly and daily buckets on every shard, one transaction per step"""
+    started = time.perf_counter()
+    hourly_cutoff, daily_cutoff = rollup_cutoffs(int(time.time()) if now is None else now)
+    table = VisitBucket._meta.table_name
+    folded = 0
+    for _ in each_shard():
+        for source, target, cutoff in ((HOUR, DAY, hourly_cutoff), (DAY, MONTH, daily_cutoff)):
+            with connection_scope():
+                with db_transaction_duration.time("rollup"), db.atomic("IMMEDIATE"):
+                    db.execute_sql(
+                        f"INSERT INTO {table} (badge_id, resolution, bucket_start, visits) "
+                        f"SELECT badge_id, ?, {_FOLD_SQL[target]}, SUM(visits) FROM {table} "
+                        f"WHERE resolution = ? AND bucket_start < ? "
+                        f"GROUP BY badge_id, {_FOLD_SQL[target]} "
+                        f"ON CONFLICT (badge_id, resolution, bucket_start) DO UPDATE SET visits = visits + excluded.visits",
+                        (target, source, cutoff),
+                    )
+                    folded += VisitBucket.delete().where(
+                        (VisitBucket.resolution == source) & (VisitBucket.bucket_start < cutoff)
+                    ).execute()
+    result = {"buckets_folded": folded, "seconds": round(time.perf_counter() - started, 3)}
+    logger.info(f"History rollup folded {folded} buckets in {result['seconds']}s")
+    return result
+
+async def run_rollup_loop(rollup: Callable[[], dict], interval_seconds: int = HISTORY_ROLLUP_INTERVAL_SECONDS):
+    """Background task started from the lifespan hook"""
+    logger.info(
+        f"History rollup enabled (hourly kept {HISTORY_HOURLY_RETENTION_DAYS}d, "
+        f"daily kept {HISTORY_DAILY_RETENTION_DAYS}d, every {interval_seconds}s)"
+    )
+    # Nothing is urgent at startup; let the first requests through before taking write locks
+    await asyncio.sleep(min(interval_seconds, 60))
+    while True:
+        job = asyncio.ensure_future(asyncio.to_thread(rollup))
+        try:
+            await asyncio.shield(job)
+        except asyncio.CancelledError:
+            # Shutting down: let the pass in progress finish before the database closes
+            await asyncio.gather(job, return_exceptions=True)
+            raise
+        except Exception as e:
+            logger.error(f"Error rolling up visit history: {e}")
+        await asyncio.sleep(interval_seconds)
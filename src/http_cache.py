@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request
+from .static_cache import etag_matches
+import hashlib
+import threading
+import time
+import os
+
+# 0 keeps the historical no-store behaviour
+BADGE_CACHE_MAX_AGE = int(os.getenv("BADGE_CACHE_MAX_AGE", "0"))
+BADGE_CACHE_STALE_WHILE_REVALIDATE = int(os.getenv("BADGE_CACHE_STALE_WHILE_REVALIDATE", "0"))
+# Let CDNs and image proxies share one cached badge; such responses never set the visitor cookie
+BADGE_CACHE_PUBLIC = os.getenv("BADGE_CACHE_PUBLIC", "false").lower() in ("1", "true", "yes")
+STATS_CACHE_MAX_AGE = int(os.getenv("STATS_CACHE_MAX_AGE", "0"))
+STATS_CACHE_STALE_WHILE_REVALIDATE = int(os.getenv("STATS_CACHE_STALE_WHILE_REVALIDATE", "0"))
+# Comma separated, e.g. "Surrogate-Key" for Fastly or "Cache-Tag" for Cloudflare; empty disables
+SURROGATE_KEY_HEADERS = [h.strip() for h in os.getenv("SURROGATE_KEY_HEADERS", "Surrogate-Key").split(",") if h.strip()]
+
+NO_STORE_HEADERS = {
+    "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+    "Pragma": "no-cache",
+    "Expires": "0",
+}
+
+class CachePolicy:
+    """Cache-Control for one kind of response"""
+    __slots__ = ("max_age", "stale_while_revalidate", "public")
+
+    def __init__(self, max_age: int, stale_while_revalidate: int = 0, public: bool = True):
+        self.max_age = max_age
+        self.stale_while_revalidate = stale_while_revalidate
+        self.public = public
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age > 0
+
+    def shared(self, sets_cookie: bool = False) -> bool:
+        """Whether shared caches may store the response; never with a Set-Cookie"""
+        return self.enabled and self.public and not sets_cookie
+
+    def headers(self, sets_cookie: bool = False) -> dict:
+        if not self.enabled:
+            return dict(NO_STORE_HEADERS)
+        directives = ["public" if self.shared(sets_cookie) else "private", f"max-age={self.max_age}"]
+        if self.stale_while_revalidate > 0:
+            directives.append(f"stale-while-revalidate={self.stale_while_revalidate}")
+        return {"Cache-Control": ", ".join(directives)}
+
+badge_cache_policy = CachePolicy(BADGE_CACHE_MAX_AGE, BADGE_CACHE_STALE_WHILE_REVALIDATE, BADGE_CACHE_PUBLIC)
+stats_cache_policy = CachePolicy(STATS_CACHE_MAX_AGE, STATS_CACHE_STALE_WHILE_REVALIDATE)
+
+class CountClock:
+    """Remembers when this process first saw each tag's current count.
+
+    Counts are not timestamped in storage, so Last-Modified is the first time
+    a changed count was observed here. Bounded LRU; a forgotten tag restarts
+    from the current time, which only makes clients revalidate once more.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._seen: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def last_modified(self, tag: str, count: int) -> int:
+        now = int(time.time())
+        with self._lock:
+            entry = self._seen.get(tag)
+            if entry is None or entry[0] != count:
+                entry = (count, now)
+                self._seen[tag] = entry
+                while len(self._seen) > self.max_size:
+                    self._seen.popitem(last=False)
+            self._seen.move_to_end(tag)
+            return entry[1]
+
+count_clock = CountClock()
+
+def tag_surrogate_key(tag: str) -> str:
+    """Purge key for everything showing `tag`: "tag-" plus the first 16 hex digits of sha256(tag)"""
+    return "tag-" + hashlib.sha256(tag.encode("utf-8")).hexdigest()[:16]
+
+def count_etag(tag: str, count: int, variant: str = "", weak: bool = False) -> str:
+    digest = hashlib.blake2b(f"{tag}\0{variant}".encode("utf-8"), digest_size=8).hexdigest()
+    etag = f'"{digest}-{count}"'
+    return "W/" + etag if weak else etag
+
+def validator_headers(policy: CachePolicy, tag: str, count: int, etag: str, group: str, sets_cookie: bool = False) -> dict:
+    """Cache-Control, ETag, Last-Modified and surrogate keys for a response showing `count`"""
+    headers = policy.headers(sets_cookie)
+    headers["ETag"] = etag
+    headers["Last-Modified"] = formatdate(count_clock.last_modified(tag, count), usegmt=True)
+    if policy.shared(sets_cookie):
+        keys = f"{group} {tag_surrogate_key(tag)}"
+        for header in SURROGATE_KEY_HEADERS:
+            headers[header] = keys
+    return headers
+
+def is_not_modified(request: Request, headers: dict) -> bool:
+    """Evaluate If-None-Match, or If-Modified-Since when no ETag was sent"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return etag_matches(if_none_match, headers["ETag"].removeprefix("W/"))
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return since >= parsedate_to_datetime(headers["Last-Modified"]).timestamp()
+    return False
@@ -0,0 +1,315 @@
+from typing import Dict, List, Optional, Tuple
+from .history import HOUR, DAY, MONTH, bucket_start, rollup_cutoffs
+import hashlib
+import json
+import threading
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+class KeyValueStore:
+    """Tag counters and the visitor set in memory, made durable by an append-only log.
+
+    Only counted visits are logged (one JSON line each); deduplicated hits
+    cost a dictionary lookup and nothing else. The log is flushed to the OS
+    on every write and fsynced every fsync_interval seconds (0 = on every
+    write), so a crash loses at most that window. Snapshots rewrite the
+    whole state and start a new log, which bounds recovery time. Every record
+    carries a sequence number and replay skips anything the snapshot
+    already contains, so a crash at any point of a snapshot is safe.
+    """
+
+    def __init__(self, directory: str, fsync_interval: float = 1.0, snapshot_interval: float = 300.0,
+                 snapshot_log_bytes: int = 64 * 1024 * 1024, history: bool = True):
+        self.directory = directory
+        self.history = history
+        self.fsync_interval = fsync_interval
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_log_bytes = snapshot_log_bytes
+        self.log_path = os.path.join(directory, "visits.log")
+        self.old_log_path = os.path.join(directory, "visits.log.old")
+        self.snapshot_path = os.path.join(directory, "snapshot.json")
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._log = None
+        self._seq = 0
+        self._dirty = False
+        self._counts: Dict[str, int] = {}
+        self._created: Dict[str, int] = {}
+        self._visitors: Dict[bytes, int] = {}
+        self._buckets: Dict[str, Dict[Tuple[str, int], int]] = {}
+        self._total_visits = 0
+
+    @staticmethod
+    def visitor_key(cookie_id: str, tag_str: str) -> bytes:
+        return hashlib.blake2b(f"{tag_str}\0{cookie_id}".encode("utf-8"), digest_size=16).digest()
+
+    def open(self):
+        """Load the snapshot, replay the logs and start the background fsync/snapshot thread"""
+        os.makedirs(self.directory, exist_ok=True)
+        started = time.perf_counter()
+        snapshot_seq = self._load_snapshot()
+        replayed = self._replay(self.old_log_path, snapshot_seq) + self._replay(self.log_path, snapshot_seq)
+        self._log = open(self.log_path, "a", encoding="utf-8")
+        if os.path.exists(self.old_log_path):
+            # A previous snapshot did not finish; fold the old log in now
+            self.snapshot()
+        logger.info(
+            f"Key-value store opened in {time.perf_counter() - started:.2f}s: {len(self._counts)} tags, "
+            f"{len(self._visitors)} visitors, {replayed} log records replayed"
+        )
+        if self.fsync_interval > 0 or self.snapshot_interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="kv-store-sync", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self._log is not None:
+            self.snapshot()
+            with self._io_lock, self._lock:
+                self._log.close()
+                self._log = None
+
+    def _load_snapshot(self) -> int:
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        with open(self.snapshot_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        self._seq = state["seq"]
+        self._counts = state["counts"]
+        self._created = state["created"]
+        self._visitors = {bytes.fromhex(key): last_visit for key, last_visit in state["visitors"]}
+        self._buckets = {
+            tag_str: {(resolution, start): visits for resolution, start, visits in rows}
+            for tag_str, rows in state.get("buckets", {}).items()
+        }
+        self._total_visits = sum(self._counts.values())
+        return self._seq
+
+    def _replay(self, path: str, snapshot_seq: int) -> int:
+        if not os.path.exists(path):
+            return 0
+        replayed = 0
+        offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    record = json.loads(line)
+                except ValueError:
+                    # Only the last record can be torn by a crash mid-write; cut it off so
+                    # the next append starts on a fresh line
+                    logger.warning(f"Truncating unreadable record at byte {offset} of {path}")
+                    f.close()
+                    os.truncate(path, offset)
+                    break
+                offset += len(line)
+                if record["s"] <= snapshot_seq:
+                    continue
+                self._seq = record["s"]
+                if "x" in record:
+                    self._expire_locked(record["x"])
+                elif "r" in record:
+                    self._rollup_locked(*record["r"])
+                else:
+                    key = bytes.fromhex(record["v"]) if "v" in record else None
+                    self._apply_visit(record["t"], key, record["ts"])
+                replayed += 1
+        return replayed
+
+    def _apply_visit(self, tag_str: str, key: Optional[bytes], now: int) -> Tuple[int, bool]:
+        badge_created = tag_str not in self._counts
+        if badge_created:
+            self._created[tag_str] = now
+        count = self._counts.get(tag_str, 0) + 1
+        self._counts[tag_str] = count
+        if key is not None:
+            self._visitors[key] = now
+        self._total_visits += 1
+        if self.history:
+            buckets = self._buckets.setdefault(tag_str, {})
+            hour = (HOUR, bucket_start(now, HOUR))
+            buckets[hour] = buckets.get(hour, 0) + 1
+        return count, badge_created
+
+    def _append(self, record: dict):
+        self._seq += 1
+        record["s"] = self._seq
+        self._log.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._log.flush()
+        self._dirty = True
+        if self.fsync_interval <= 0:
+            os.fsync(self._log.fileno())
+            self._dirty = False
+
+    def record_visit(self, cookie_id: Optional[str], tag_str: str, now: int) -> Tuple[int, bool, bool]:
+        """Count the visitor once per tag, returning (count, was_incremented, badge_created).
+
+        A cookie_id of None is counted every time and leaves no visitor entry.
+        """
+        if cookie_id is None:
+            with self._lock:
+                self._append({"t": tag_str, "ts": now})
+                count, badge_created = self._apply_visit(tag_str, None, now)
+            return count, True, badge_created
+        key = self.visitor_key(cookie_id, tag_str)
+        with self._lock:
+            if key in self._visitors:
+                return self._counts.get(tag_str, 0), False, False
+            self._append({"t": tag_str, "v": key.hex(), "ts": now})
+            count, badge_created = self._apply_visit(tag_str, key, now)
+        return count, True, badge_created
+
+    def knows_visitor(self, cookie_id: str, tag_str: str) -> bool:
+        with self._lock:
+            return self.visitor_key(cookie_id, tag_str) in self._visitors
+
+    def get_count(self, tag_str: str) -> int:
+        return self._counts.get(tag_str, 0)
+
+    def totals(self) -> Tuple[int, int]:
+        with self._lock:
+            return len(self._counts), self._total_visits
+
+    def created_buckets(self, since: int, bucket_seconds: int) -> Dict[int, int]:
+        with self._lock:
+            created = list(self._created.values())
+        buckets: Dict[int, int] = {}
+        for timestamp in created:
+            if timestamp > since:
+                bucket = timestamp // bucket_seconds
+                buckets[bucket] = buckets.get(bucket, 0) + 1
+        return buckets
+
+    def expire(self, cutoff: int) -> int:
+        """Forget visitors last counted before cutoff so they are counted again"""
+        with self._lock:
+            removed = self._expire_locked(cutoff)
+            if removed:
+                self._append({"x": cutoff})
+        return removed
+
+    def _expire_locked(self, cutoff: int) -> int:
+        expired = [key for key, last_visit in self._visitors.items() if last_visit < cutoff]
+        for key in expired:
+            del self._visitors[key]
+        return len(expired)
+
+    def history_rows(self, tag_str: str) -> List[Tuple[str, int, int]]:
+        """(resolution, bucket_start, visits) of every stored bucket of a tag"""
+        with self._lock:
+            buckets = list(self._buckets.get(tag_str, {}).items())
+        return [(resolution, start, visits) for (resolution, start), visits in buckets]
+
+    def rollup(self, now: int) -> int:
+        """Fold buckets past their retention; logged with its cutoffs so replay folds identically"""
+        cutoffs = rollup_cutoffs(now)
+        with self._lock:
+            folded = self._rollup_locked(*cutoffs)
+            if folded:
+                self._append({"r": list(cutoffs)})
+        return folded
+
+    def _rollup_locked(self, hourly_cutoff: int, daily_cutoff: int) -> int:
+        folded = 0
+        for buckets in self._buckets.values():
+            for (source, target, cutoff) in ((HOUR, DAY, hourly_cutoff), (DAY, MONTH, daily_cutoff)):
+                old = [key for key in buckets if key[0] == source and key[1] < cutoff]
+                for key in old:
+                    coarse = (target, bucket_start(key[1], target))
+                    buckets[coarse] = buckets.get(coarse, 0) + buckets.pop(key)
+                folded += len(old)
+        return folded
+
+    def sync(self):
+        """fsync everything written so far"""
+        with self._io_lock:
+            with self._lock:
+                if not self._dirty or self._log is None:
+                    return
+                self._dirty = False
+                fd = self._log.fileno()
+            os.fsync(fd)
+
+    def snapshot(self):
+        """Write the full state and start a new log"""
+        with self._io_lock:
+            with self._lock:
+                self._log.flush()
+                os.fsync(self._log.fileno())
+                self._log.close()
+                if not os.path.exists(self.old_log_path):
+                    os.replace(self.log_path, self.old_log_path)
+                else:
+                    # The old log has not been folded in yet; keep appending to the current one
+                    self._append_file_to(self.log_path, self.old_log_path)
+                self._log = open(self.log_path, "w", encoding="utf-8")
+                self._dirty = False
+                state = {
+                    "seq": self._seq,
+                    "counts": dict(self._counts),
+                    "created": dict(self._created),
+                    "visitors": list(self._visitors.items()),
+                    "buckets": {
+                        tag_str: [[resolution, start, visits] for (resolution, start), visits in buckets.items()]
+                        for tag_str, buckets in self._buckets.items()
+                    },
+                }
+
+            state["visitors"] = [[key.hex(), last_visit] for key, last_visit in state["visitors"]]
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            _fsync_directory(self.directory)
+            os.remove(self.old_log_path)
+        logger.info(f"Key-value snapshot written at sequence {state['seq']}")
+
+    @staticmethod
+    def _append_file_to(source: str, target: str):
+        with open(source, "r", encoding="utf-8") as src, open(target, "a", encoding="utf-8") as dst:
+            dst.write(src.read())
+            dst.flush()
+            os.fsync(dst.fileno())
+
+    def log_size(self) -> int:
+        try:
+            return os.path.getsize(self.log_path)
+        except OSError:
+            return 0
+
+    def _run(self):
+        last_snapshot = time.monotonic()
+        interval = self.fsync_interval if self.fsync_interval > 0 else 1.0
+        while not self._stop.wait(interval):
+            try:
+                self.sync()
+                due = self.snapshot_interval > 0 and time.monotonic() - last_snapshot >= self.snapshot_interval
+                if due or self.log_size() >= self.snapshot_log_bytes:
+                    self.snapshot()
+                    last_snapshot = time.monotonic()
+            except Exception as e:
+                logger.error(f"Error syncing key-value store: {e}")
+
+def _fsync_directory(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
@@ -1,28 +1,76 @@
+from typing import List, Optional
 from fastapi import FastAPI, Request, HTTPException, Response
-from fastapi.responses import RedirectResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import RedirectResponse, HTMLResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+from itertools import islice
+import asyncio
+import math
 import time
 import os
 import logging
 import json
 from .models import initialize_database, close_database
-from .schemas import BadgeParams, TagStatsResponse, SystemStatsResponse
-from .services import update_visit_count, get_tag_visit_count, get_system_statistics, get_app_info, load_template
-from .utils import build_shields_url, get_security_headers
+from .schemas import TagStatsResponse, SystemStatsResponse, BatchStatsRequest, TagHistoryResponse
+from .services import get_seen_visit_count, get_app_info, get_cache_statistics
+from .utils import get_security_headers
+from .badge_renderer import render_badge_svg
+from .badge_params import badge_variant, parse_tag
+from .storage import storage
+from .write_buffer import visit_buffer
+from .aggregates import system_aggregates
+from .executor import db_executor, DatabaseBusyError
+from . import async_db
+from .async_db import tag_count_reads, visit_batches, visit_writer
+from .maintenance import RATE_LIMIT_WINDOW_SECONDS, run_compaction_loop, last_compaction
+from .metrics import metrics, MetricsMiddleware, METRICS_ENABLED, rate_limited
+from .static_cache import static_assets, asset_response, STATIC_MAX_AGE
+from .coordinator import coordinator_client
+from .history import HISTORY_ENABLED, HISTORY_MAX_POINTS, RESOLUTIONS, bucket_range, run_rollup_loop
+from .seen import seen_visitors
+from .rate_limit import ip_limiter, tag_limiter, client_ip
+from .http_cache import badge_cache_policy, stats_cache_policy, count_etag, validator_headers, is_not_modified
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+STATS_BATCH_MAX_TAGS = int(os.getenv("STATS_BATCH_MAX_TAGS", "500"))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting BadgeTrack application...")
     if not initialize_database():
         raise RuntimeError("Failed to initialize database")
+    static_assets.preload()
+    db_executor.start()
+    async_db.start()
+    # Behind a coordinator this worker only reads; the coordinator owns writes and aggregates
+    is_writer = not coordinator_client.enabled
+    compaction_task = None
+    rollup_task = None
+    if is_writer:
+        storage.start()
+        system_aggregates.load()
+        if RATE_LIMIT_WINDOW_SECONDS > 0:
+            compaction_task = asyncio.create_task(run_compaction_loop(storage.expire_visitors))
+        if HISTORY_ENABLED:
+            rollup_task = asyncio.create_task(run_rollup_loop(storage.rollup_history))
+    else:
+        logger.info(f"Forwarding visits to the coordinator at {coordinator_client.socket_path}")
     yield
     logger.info("Shutting down BadgeTrack application...")
+    for task in (compaction_task, rollup_task):
+        if task is not None:
+            task.cancel()
+            # The task waits for a pass already running in a thread before it ends
+            with suppress(asyncio.CancelledError):
+                await task
+    async_db.stop()
+    db_executor.shutdown()
+    if is_writer:
+        storage.stop()
+        system_aggregates.reset()
     close_database()
 
 def get_app_version():
@@ -56,17 +104,79 @@ assets_dir = os.path.join(os.path.dirname(__file__), "..", "assets")
 if not os.path.exists(assets_dir):
     assets_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "assets")
 
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
-app.mount("/assets", StaticFiles(directory=assets_dir), name="assets")
+templates_dir = os.path.join(os.path.dirname(__file__), "..", "templates")
+if not os.path.exists(templates_dir):
+    templates_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates")
+
+version_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "version.json")
+
+static_assets.register("index.html", os.path.join(templates_dir, "index.html"), "text/html")
+static_assets.register("about.html", os.path.join(templates_dir, "about.html"), "text/html")
+static_assets.register(
+    "app-info", version_file, "application/json", build=lambda: json.dumps(get_app_info()).encode("utf-8")
+)
+static_assets.register_directory("static", static_dir)
+static_assets.register_directory("assets", assets_dir)
+
+# Pages and app info always revalidate (cheap with ETags); static files may be cached
+PAGE_CACHE_CONTROL = "no-cache"
+STATIC_CACHE_CONTROL = "no-cache" if static_assets.reload else f"public, max-age={STATIC_MAX_AGE}"
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=False,
-    allow_methods=["GET"],
+    allow_methods=["GET", "POST"],
     allow_headers=["*"],
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+def collect_runtime_metrics():
+    """Gauges read from the caches, thread pool and background jobs at scrape time"""
+    cache_stats = get_cache_statistics()
+    for cache_name, stats in cache_stats.items():
+        labels = {"cache": cache_name}
+        yield "badgetrack_cache_entries", "Entries currently held", labels, stats["size"]
+        yield "badgetrack_cache_hits", "Cache hits since start", labels, stats["hits"]
+        yield "badgetrack_cache_misses", "Cache misses since start", labels, stats["misses"]
+    executor_stats = db_executor.stats()
+    yield "badgetrack_db_pool_queue_depth", "Database calls waiting for a worker", {}, executor_stats["queue_depth"]
+    yield "badgetrack_db_pool_running", "Database calls running", {}, executor_stats["running"]
+    yield "badgetrack_db_pool_rejected", "Database calls rejected with 503 since start", {}, executor_stats["rejected"]
+    for scope, limiter in (("ip", ip_limiter), ("tag", tag_limiter)):
+        if limiter.enabled:
+            yield "badgetrack_rate_limit_keys", "Token buckets currently tracked", {"scope": scope}, limiter.size()
+    yield "badgetrack_coalesced_reads", "Tag count lookups that joined one already in flight", {}, tag_count_reads.shared
+    yield "badgetrack_seen_visitors", "Counted visitors remembered for the write-free path", {}, seen_visitors.size()
+    yield "badgetrack_seen_visitor_hits", "Visits answered from the seen-visitor index", {}, seen_visitors.hits
+    yield "badgetrack_visit_batches", "Visit writes, each covering the concurrent visits of one tag", {}, visit_batches.batches
+    yield "badgetrack_visits_batched", "Visits written by those batches", {}, visit_batches.items
+    if visit_writer.running:
+        writer_stats = visit_writer.stats()
+        yield "badgetrack_visit_writer_queue_depth", "Visit writes queued or running on the shard writers", {}, writer_stats["queue_depth"]
+        yield "badgetrack_visit_writer_rejected", "Visit writes rejected with 503 since start", {}, writer_stats["rejected"]
+    if storage.name == "sqlite":
+        yield "badgetrack_write_buffer_pending", "Visits waiting for the next buffer flush", {}, visit_buffer.pending_events()
+    if last_compaction:
+        yield "badgetrack_compaction_rows_deleted", "Cookie rows removed by the last compaction", {}, last_compaction["rows_deleted"]
+        yield "badgetrack_compaction_finished_at", "Unix time the last compaction finished", {}, last_compaction["finished_at"]
+
+metrics.register_collector(collect_runtime_metrics)
+
+def _check_rate_limits(ip: str, tag: str):
+    """429 before any database work if the client or the tag is over its token bucket"""
+    for scope, limiter, key in (("ip", ip_limiter, ip), ("tag", tag_limiter, tag)):
+        retry_after = limiter.acquire(key)
+        if retry_after:
+            rate_limited.inc(scope)
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, slow down.",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
 @app.get("/badge")
 async def badge(
     request: Request,
@@ -78,29 +188,43 @@ async def badge(
     logo: str = "",
 ):
     try:
-        params = BadgeParams(tag=tag, label=label, color=color, style=style, logo=logo)
-    except Exception:
+        tag = parse_tag(tag)
+        variant = badge_variant(label, color, style, logo)
+    except ValueError:
         raise HTTPException(status_code=400, detail="Invalid parameters.")
 
+    _check_rate_limits(client_ip(request), tag)
     cookie_id = request.cookies.get("visitor_id")
 
-    try:
-        count, was_incremented, new_cookie_id = update_visit_count(cookie_id, params.tag)
-    except ValueError as e:
-        raise HTTPException(status_code=429, detail=str(e))
-    except Exception as e:
-        logger.error(f"Error updating visit count: {e}")
-        count = get_tag_visit_count(params.tag)
-        new_cookie_id = None
-
-    shields_url = build_shields_url(params.label, count, params.color, params.style, params.logo)
+    # A returning visitor this process already counted needs no write at all
+    count = get_seen_visit_count(cookie_id, tag)
+    new_cookie_id = None
+    if count is None:
+        try:
+            count, was_incremented, new_cookie_id = await async_db.record_visit(cookie_id, tag)
+        except DatabaseBusyError:
+            raise HTTPException(status_code=503, detail="Server busy, try again later.")
+        except Exception as e:
+            logger.error(f"Error updating visit count: {e}")
+            count = await async_db.get_tag_visit_count(tag)
 
+    # Shared-cache responses must not carry a cookie, or every viewer would share it
+    if badge_cache_policy.shared():
+        new_cookie_id = None
     headers = get_security_headers()
-    redirect_response = RedirectResponse(shields_url, status_code=302, headers=headers)
+    etag = count_etag(tag, count, variant.etag_variant)
+    headers.update(validator_headers(badge_cache_policy, tag, count, etag, "badges", bool(new_cookie_id)))
+    if is_not_modified(request, headers):
+        badge_response = Response(status_code=304, headers=headers)
+    elif variant.render_locally:
+        svg = render_badge_svg(variant.label, count, variant.color, variant.style)
+        badge_response = Response(content=svg, media_type="image/svg+xml", headers=headers)
+    else:
+        badge_response = RedirectResponse(variant.shields_url(count), status_code=302, headers=headers)
     
     # Set cookie if new visitor
     if new_cookie_id:
-        redirect_response.set_cookie(
+        badge_response.set_cookie(
             key="visitor_id", 
             value=new_cookie_id, 
             max_age=31536000,  # 1 year
@@ -108,51 +232,151 @@ async def badge(
             samesite="Lax"
         )
     
-    return redirect_response
+    return badge_response
+
+def _validate_batch_tags(tags: List[str]) -> List[str]:
+    """Deduplicated tags in request order, or 400"""
+    if not tags or len(tags) > STATS_BATCH_MAX_TAGS:
+        raise HTTPException(status_code=400, detail=f"Provide between 1 and {STATS_BATCH_MAX_TAGS} tags")
+    if any(not tag or len(tag) > 200 for tag in tags):
+        raise HTTPException(status_code=400, detail="Invalid tag parameter")
+    return list(dict.fromkeys(tags))
+
+async def _batch_stats_response(tags: List[str]) -> Response:
+    tags = _validate_batch_tags(tags)
+    try:
+        counts = await async_db.get_tag_visit_counts(tags)
+    except DatabaseBusyError:
+        raise HTTPException(status_code=503, detail="Server busy, try again later.")
+    except Exception as e:
+        logger.error(f"Error getting batch tag stats: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    body = {
+        "last_updated": int(time.time()),
+        "stats": [{"tag": tag, "visit_count": count} for tag, count in counts.items()],
+    }
+    return Response(content=json.dumps(body, separators=(",", ":")), media_type="application/json")
+
+# Outside /api/stats/ so no tag name is shadowed by the batch route
+@app.get("/api/stats-batch")
+async def get_batch_stats_endpoint(request: Request):
+    """Counts for every ?tag= parameter, in request order"""
+    return await _batch_stats_response(request.query_params.getlist("tag"))
+
+@app.post("/api/stats-batch")
+async def post_batch_stats_endpoint(body: BatchStatsRequest):
+    """Counts for {"tags": [...]}, in request order"""
+    return await _batch_stats_response(body.tags)
 
 @app.get("/api/stats/{tag}", response_model=TagStatsResponse)
-async def get_tag_stats_endpoint(tag: str):
+async def get_tag_stats_endpoint(request: Request, tag: str):
     try:
         if not tag or len(tag) > 200:
             raise HTTPException(status_code=400, detail="Invalid tag parameter")
         
-        count = get_tag_visit_count(tag)
-        return TagStatsResponse(
+        count = await async_db.get_tag_visit_count(tag)
+        # last_updated changes every second, so the ETag is weak: equal count, equivalent body
+        headers = validator_headers(stats_cache_policy, tag, count, count_etag(tag, count, weak=True), "stats")
+        if is_not_modified(request, headers):
+            return Response(status_code=304, headers=headers)
+        stats = TagStatsResponse(
             tag=tag,
             visit_count=count,
             last_updated=int(time.time())
         )
+        return Response(content=stats.model_dump_json(), media_type="application/json", headers=headers)
+    except HTTPException:
+        raise
+    except DatabaseBusyError:
+        raise HTTPException(status_code=503, detail="Server busy, try again later.")
     except Exception as e:
         logger.error(f"Error getting tag stats: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Default window per resolution when no start is given
+HISTORY_DEFAULT_SPAN = {"hour": 2 * 86400, "day": 30 * 86400, "month": 365 * 86400}
+
+@app.get("/api/stats/{tag}/history", response_model=TagHistoryResponse)
+async def get_tag_history_endpoint(tag: str, resolution: str = "day", start: Optional[int] = None, end: Optional[int] = None):
+    if not tag or len(tag) > 200:
+        raise HTTPException(status_code=400, detail="Invalid tag parameter")
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    end = int(time.time()) + 1 if end is None else end
+    start = end - HISTORY_DEFAULT_SPAN[resolution] if start is None else start
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if len(list(islice(bucket_range(start, end, resolution), HISTORY_MAX_POINTS + 1))) > HISTORY_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"Range covers more than {HISTORY_MAX_POINTS} buckets")
+
+    try:
+        buckets = await async_db.get_visit_history(tag, resolution, start, end)
+    except DatabaseBusyError:
+        raise HTTPException(status_code=503, detail="Server busy, try again later.")
+    except Exception as e:
+        logger.error(f"Error getting tag history: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    return TagHistoryResponse(
+        tag=tag,
+        resolution=resolution,
+        buckets=[{"start": bucket, "visits": visits} for bucket, visits in buckets],
+    )
+
 @app.get("/api/stats", response_model=SystemStatsResponse)
 async def get_system_stats_endpoint():
     try:
-        stats = get_system_statistics()
+        stats = await async_db.get_system_statistics()
         
         return SystemStatsResponse(
             total_tracked_tags=stats["total_tracked_tags"],
             total_visits=stats["total_visits"],
             new_badges_today=stats["new_badges_today"]
         )
+    except DatabaseBusyError:
+        raise HTTPException(status_code=503, detail="Server busy, try again later.")
     except Exception as e:
         logger.error(f"Error getting system stats: {e}")
         raise HTTPException(status_code=500, detail="Error retrieving stats")
 
+@app.get("/api/cache-stats")
+async def get_cache_stats_endpoint():
+    return get_cache_statistics()
+
+@app.get("/api/executor-stats")
+async def get_executor_stats_endpoint():
+    return db_executor.stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def _serve_asset(request: Request, name: str, cache_control: str) -> Response:
+    asset = static_assets.get(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return asset_response(request, asset, cache_control)
+
 @app.get("/api/app-info")
-async def get_app_info_endpoint():
-    return get_app_info()
+async def get_app_info_endpoint(request: Request):
+    return _serve_asset(request, "app-info", PAGE_CACHE_CONTROL)
 
 @app.get("/", response_class=HTMLResponse)
-async def homepage():
-    content = load_template("index.html")
-    return HTMLResponse(content=content)
+async def homepage(request: Request):
+    return _serve_asset(request, "index.html", PAGE_CACHE_CONTROL)
 
 @app.get("/about", response_class=HTMLResponse)
-async def about_page():
-    content = load_template("about.html")
-    return HTMLResponse(content=content)
+async def about_page(request: Request):
+    return _serve_asset(request, "about.html", PAGE_CACHE_CONTROL)
+
+@app.api_route("/static/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def static_file(request: Request, path: str):
+    return _serve_asset(request, f"static/{path}", STATIC_CACHE_CONTROL)
+
+@app.api_route("/assets/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def asset_file(request: Request, path: str):
+    return _serve_asset(request, f"assets/{path}", STATIC_CACHE_CONTROL)
 
 @app.get("/health")
 async def health_check():
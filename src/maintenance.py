@@ -0,0 +1,104 @@
+from typing import Callable, Optional
+from .models import db, Cookie, VisitorKey, connection_scope, each_shard
+from .dedup import DEDUP_BACKEND
+from .seen import seen_visitors
+import asyncio
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A visitor is counted again for a badge once this long has passed since they
+# were last counted. 0 keeps dedup records forever.
+RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "0"))
+COMPACTION_INTERVAL_SECONDS = int(os.getenv("COMPACTION_INTERVAL_SECONDS", "3600"))
+COMPACTION_BATCH_SIZE = int(os.getenv("COMPACTION_BATCH_SIZE", "500"))
+COMPACTION_BATCH_PAUSE_SECONDS = float(os.getenv("COMPACTION_BATCH_PAUSE_SECONDS", "0.05"))
+INCREMENTAL_VACUUM_MIN_ROWS = int(os.getenv("INCREMENTAL_VACUUM_MIN_ROWS", "10000"))
+
+last_compaction: dict = {}
+
+# Hashed dedup keeps the same last_visit column in its own table
+DEDUP_MODEL = VisitorKey if DEDUP_BACKEND == "hashed" else Cookie
+
+def compact_cookies(
+    window_seconds: int = RATE_LIMIT_WINDOW_SECONDS,
+    batch_size: int = COMPACTION_BATCH_SIZE,
+    pause_seconds: float = COMPACTION_BATCH_PAUSE_SECONDS,
+    now: Optional[int] = None,
+) -> dict:
+    """Delete dedup rows older than the window in small transactions, then reclaim free pages"""
+    started = time.perf_counter()
+    cutoff = (int(time.time()) if now is None else now) - window_seconds
+    rows_deleted = 0
+    batches = 0
+
+    vacuumed_pages = 0
+    for _ in each_shard():
+        shard_deleted = 0
+        while True:
+            with connection_scope():
+                # Each batch is its own short transaction so visit writes can interleave
+                with db.atomic("IMMEDIATE"):
+                    key = DEDUP_MODEL._meta.primary_key
+                    expired = DEDUP_MODEL.select(key).where(DEDUP_MODEL.last_visit < cutoff).limit(batch_size)
+                    deleted = DEDUP_MODEL.delete().where(key.in_(expired)).execute()
+            shard_deleted += deleted
+            batches += 1
+            if deleted < batch_size:
+                break
+            time.sleep(pause_seconds)
+
+        rows_deleted += shard_deleted
+        if shard_deleted >= INCREMENTAL_VACUUM_MIN_ROWS:
+            vacuumed_pages += incremental_vacuum()
+    # After the rows are gone, so a visit deduplicated meanwhile cannot be remembered again
+    seen_visitors.expire(cutoff)
+
+    result = {
+        "rows_deleted": rows_deleted,
+        "batches": batches,
+        "vacuumed_pages": vacuumed_pages,
+        "seconds": round(time.perf_counter() - started, 3),
+        "finished_at": int(time.time()),
+    }
+    last_compaction.clear()
+    last_compaction.update(result)
+    logger.info(
+        f"Cookie compaction removed {rows_deleted} rows in {batches} batches "
+        f"and freed {vacuumed_pages} pages in {result['seconds']}s"
+    )
+    return result
+
+def incremental_vacuum() -> int:
+    """Return free pages to the filesystem if the current shard uses auto_vacuum=INCREMENTAL"""
+    with connection_scope():
+        auto_vacuum = db.execute_sql("PRAGMA auto_vacuum").fetchone()[0]
+        if auto_vacuum != 2:
+            logger.info("Skipping incremental vacuum: auto_vacuum is not INCREMENTAL (run VACUUM once to enable it)")
+            return 0
+        free_before = db.execute_sql("PRAGMA freelist_count").fetchone()[0]
+        db.execute_sql("PRAGMA incremental_vacuum").fetchall()
+        free_after = db.execute_sql("PRAGMA freelist_count").fetchone()[0]
+        return free_before - free_after
+
+async def run_compaction_loop(compact: Callable[[], dict] = compact_cookies, interval_seconds: int = COMPACTION_INTERVAL_SECONDS):
+    """Background task started from the lifespan hook"""
+    if DEDUP_BACKEND == "bloom":
+        logger.warning("RATE_LIMIT_WINDOW_SECONDS only expires cookie and hashed dedup rows; Bloom filter entries are kept forever")
+    logger.info(
+        f"Cookie compaction enabled (window {RATE_LIMIT_WINDOW_SECONDS}s, every {interval_seconds}s, "
+        f"batches of {COMPACTION_BATCH_SIZE})"
+    )
+    while True:
+        job = asyncio.ensure_future(asyncio.to_thread(compact))
+        try:
+            await asyncio.shield(job)
+        except asyncio.CancelledError:
+            # Shutting down: let the pass in progress finish before the database closes
+            await asyncio.gather(job, return_exceptions=True)
+            raise
+        except Exception as e:
+            logger.error(f"Error compacting cookies: {e}")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,231 @@
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+import threading
+import time
+import os
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+class _Shard:
+    """Counters and histogram cells written by a single thread"""
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters: Dict[tuple, float] = {}
+        self.histograms: Dict[tuple, list] = {}
+
+class MetricsRegistry:
+    """Counters and histograms sharded per thread so recording never takes a lock.
+
+    Each thread only ever writes its own shard; a scrape copies every shard
+    and sums them. Copies of a shard taken while its owner is writing may miss
+    that one in-flight update, which the next scrape picks up.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+        self._families: Dict[str, tuple] = {}
+        self._collectors: List[Callable[[], Iterable[tuple]]] = []
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> "Counter":
+        self._families[name] = ("counter", help_text, tuple(label_names), None)
+        return Counter(self, name)
+
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = HTTP_BUCKETS) -> "Histogram":
+        self._families[name] = ("histogram", help_text, tuple(label_names), tuple(buckets))
+        return Histogram(self, name, tuple(buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[tuple]]):
+        """Add a callback yielding (name, help, labels dict, value) gauges at scrape time"""
+        self._collectors.append(collector)
+
+    def inc(self, name: str, labels: tuple, amount: float = 1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name: str, labels: tuple, buckets: tuple, value: float):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        cell = histograms.get(key)
+        if cell is None:
+            # One slot per bucket plus +Inf, then sum
+            cell = histograms[key] = [0] * (len(buckets) + 2)
+        cell[bisect_left(buckets, value)] += 1
+        cell[-1] += value
+
+    def collect(self) -> Tuple[Dict[tuple, float], Dict[tuple, list]]:
+        """Merge all shards into (counters, histograms)"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        counters: Dict[tuple, float] = {}
+        histograms: Dict[tuple, list] = {}
+        for shard in shards:
+            for key, value in dict(shard.counters).items():
+                counters[key] = counters.get(key, 0) + value
+            for key, cell in dict(shard.histograms).items():
+                cell = list(cell)
+                merged = histograms.get(key)
+                if merged is None:
+                    histograms[key] = cell
+                else:
+                    histograms[key] = [a + b for a, b in zip(merged, cell)]
+        return counters, histograms
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text, label_names, buckets) in self._families.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(label_names, labels)} {_format_value(value)}")
+                continue
+            for (metric, labels), cell in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float("inf"),), cell):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    bucket_labels = _format_labels(label_names + ("le",), labels + (le,))
+                    lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+                label_text = _format_labels(label_names, labels)
+                lines.append(f"{name}_sum{label_text} {_format_value(cell[-1])}")
+                lines.append(f"{name}_count{label_text} {cumulative}")
+
+        gauges: Dict[str, tuple] = {}
+        for collector in self._collectors:
+            for name, help_text, labels, value in collector():
+                gauges.setdefault(name, (help_text, []))[1].append((labels, value))
+        for name, (help_text, samples) in gauges.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+class Counter:
+    __slots__ = ("_registry", "name")
+
+    def __init__(self, registry: MetricsRegistry, name: str):
+        self._registry = registry
+        self.name = name
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._registry.inc(self.name, labels, amount)
+
+class Histogram:
+    __slots__ = ("_registry", "name", "buckets")
+
+    def __init__(self, registry: MetricsRegistry, name: str, buckets: tuple):
+        self._registry = registry
+        self.name = name
+        self.buckets = buckets
+
+    def observe(self, value: float, *labels: str):
+        self._registry.observe(self.name, labels, self.buckets, value)
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_started")
+
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._started, *self._labels)
+        return False
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class MetricsMiddleware:
+    """ASGI middleware counting requests and timing them per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = _route_label(scope)
+            http_requests.inc(route, scope["method"], str(status))
+            http_request_duration.observe(time.perf_counter() - started, route)
+
+def _route_label(scope) -> str:
+    """Path template of the matched route, so /api/stats/{tag} is one series"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if scope.get("endpoint") is not None:
+        # Static mounts only set their mount point as root_path
+        return scope.get("root_path") or "unmatched"
+    return "unmatched"
+
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter(
+    "badgetrack_http_requests_total", "HTTP requests by route template, method and status", ("route", "method", "status")
+)
+http_request_duration = metrics.histogram(
+    "badgetrack_http_request_duration_seconds", "HTTP request latency by route template", ("route",)
+)
+db_transaction_duration = metrics.histogram(
+    "badgetrack_db_transaction_seconds", "Time spent in write transactions", ("operation",), buckets=DB_BUCKETS
+)
+visits = metrics.counter(
+    "badgetrack_visits_total", "Badge hits by outcome: counted, deduplicated or error", ("result",)
+)
+visitor_cookies = metrics.counter(
+    "badgetrack_visitor_cookies_total", "Visitor cookies issued, rejected as forged or malformed, or re-signed", ("result",)
+)
+rate_limited = metrics.counter(
+    "badgetrack_rate_limited_total", "Badge requests rejected with 429 by the ip or tag token bucket", ("scope",)
+)
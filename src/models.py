@@ -3,18 +3,158 @@ from peewee import (
     Model,
     CharField,
     IntegerField,
+    BigIntegerField,
     ForeignKeyField,
+    BlobField,
+    DatabaseProxy,
 )
+from playhouse.pool import PooledSqliteDatabase
+from contextlib import contextmanager
+from typing import List
+import threading
+import zlib
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
-if os.getenv("TESTING"):
-    db = SqliteDatabase(":memory:")
-else:
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "visitors.db")
-    db = SqliteDatabase(db_path)
+DEFAULT_DATABASE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "visitors.db")
+DATABASE_PATH = os.getenv("DATABASE_PATH", DEFAULT_DATABASE_PATH)
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default").lower()
+SQLITE_MAX_CONNECTIONS = int(os.getenv("SQLITE_MAX_CONNECTIONS", "32"))
+# Badges (and their dedup rows) are hash-partitioned by tag across this many files
+SHARD_COUNT = max(1, int(os.getenv("SHARD_COUNT", "1")))
+
+SQLITE_PROFILES = {
+    # SQLite's own defaults: rollback journal and a full fsync on every commit
+    "default": {},
+    # WAL lets readers run alongside the writer and NORMAL only fsyncs at checkpoints
+    "tuned": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "cache_size": -64000,  # 64 MB page cache per connection
+        "mmap_size": 268435456,  # 256 MB memory-mapped I/O
+        "busy_timeout": 5000,
+        "temp_store": "memory",
+        # Only takes effect for new database files (or after a VACUUM)
+        "auto_vacuum": "incremental",
+    },
+}
+
+_PRAGMA_OVERRIDES = {
+    "cache_size": "SQLITE_CACHE_SIZE",
+    "mmap_size": "SQLITE_MMAP_SIZE",
+    "busy_timeout": "SQLITE_BUSY_TIMEOUT_MS",
+}
+
+def get_sqlite_pragmas(profile: str = SQLITE_PROFILE) -> dict:
+    """Pragmas for a storage profile, with per-pragma environment overrides"""
+    if profile not in SQLITE_PROFILES:
+        logger.warning(f"Unknown SQLITE_PROFILE '{profile}', falling back to 'default'")
+        profile = "default"
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for pragma, env_var in _PRAGMA_OVERRIDES.items():
+        value = os.getenv(env_var)
+        if value:
+            pragmas[pragma] = int(value)
+    return pragmas
+
+def shard_database_path(index: int, count: int) -> str:
+    """visitors.db for a single shard, visitors.shard<N>.db otherwise"""
+    if count == 1:
+        return DATABASE_PATH
+    root, ext = os.path.splitext(DATABASE_PATH)
+    return f"{root}.shard{index}{ext or '.db'}"
+
+def _create_shard_database(index: int, count: int):
+    if os.getenv("TESTING"):
+        # Shared-cache so the worker threads in the database pool see the same tables
+        name = "badgetrack" if count == 1 else f"badgetrack-shard{index}"
+        return SqliteDatabase(f"file:{name}?mode=memory&cache=shared", uri=True, pragmas=get_sqlite_pragmas())
+    # Each thread checks a connection out of the pool for a unit of work and
+    # returns it afterwards, so pragmas only run when a connection is first opened.
+    return PooledSqliteDatabase(
+        shard_database_path(index, count),
+        pragmas=get_sqlite_pragmas(),
+        max_connections=SQLITE_MAX_CONNECTIONS,
+        stale_timeout=300,
+        check_same_thread=False,
+    )
+
+class ShardRouter(DatabaseProxy):
+    """DatabaseProxy resolving to the shard the calling thread selected with use_shard().
+
+    Every shard is its own SQLite file with its own connection pool and write
+    lock, so writes to badges on different shards never wait for each other.
+    Threads that never select a shard use shard 0.
+    """
+    __slots__ = ("shards", "_local")
+
+    def __init__(self, shards: List[SqliteDatabase]):
+        object.__setattr__(self, "_callbacks", [])
+        object.__setattr__(self, "shards", shards)
+        object.__setattr__(self, "_local", threading.local())
+
+    @property
+    def obj(self):
+        return self.shards[getattr(self._local, "index", 0)]
+
+    def attach_callback(self, callback):
+        # Field hooks only need the driver type, which is the same for every shard
+        callback(self.shards[0])
+        return callback
+
+    @property
+    def current_shard(self) -> int:
+        return getattr(self._local, "index", 0)
+
+db = ShardRouter([_create_shard_database(i, SHARD_COUNT) for i in range(SHARD_COUNT)])
+
+def shard_for_tag(tag: str) -> int:
+    """Stable shard index for a tag (CRC32, so it is the same in every process)"""
+    count = len(db.shards)
+    return zlib.crc32(tag.encode("utf-8")) % count if count > 1 else 0
+
+@contextmanager
+def use_shard(index: int):
+    """Route this thread's queries to one shard; must wrap connection_scope, not sit inside it"""
+    local = db._local
+    previous = getattr(local, "index", 0)
+    local.index = index
+    try:
+        yield
+    finally:
+        local.index = previous
+
+def tag_shard(tag: str):
+    return use_shard(shard_for_tag(tag))
+
+def each_shard():
+    """Select every shard in turn, yielding its index"""
+    for index in range(len(db.shards)):
+        with use_shard(index):
+            yield index
+
+def configure_shards(count: int):
+    """Replace the shard set; only safe before the app starts (used by tests and tools)"""
+    close_database()
+    object.__setattr__(db, "shards", [_create_shard_database(i, count) for i in range(count)])
+
+def is_memory_database() -> bool:
+    return "mode=memory" in db.database
+
+@contextmanager
+def connection_scope():
+    """Hold this thread's connection for a unit of work, returning it to the pool afterwards"""
+    if not db.is_closed():
+        yield
+        return
+    db.connect()
+    try:
+        yield
+    finally:
+        if not db.is_closed() and not db.in_transaction():
+            db.close()
 
 class BaseModel(Model):
     class Meta:
@@ -24,13 +164,13 @@ class Badge(BaseModel):
     """Badge tags with their total visit counts"""
     tag = CharField(max_length=200, unique=True)
     visits = IntegerField(default=0)
-    created = IntegerField()  # When first created
+    created = IntegerField(index=True)  # When first created
 
 class Cookie(BaseModel):
     """Track individual cookie visits to prevent spam"""
-    cookie_id = CharField(max_length=64, unique=True)
+    cookie_id = CharField(max_length=64)
     badge = ForeignKeyField(Badge, backref='cookies')
-    last_visit = IntegerField()
+    last_visit = IntegerField(index=True)
 
     class Meta:
         database = db
@@ -38,20 +178,78 @@ class Cookie(BaseModel):
             (("cookie_id", "badge"), True),  # One record per cookie+Badge combo
         )
 
+class VisitorKey(BaseModel):
+    """Compact dedup row (DEDUP_BACKEND=hashed): a 64-bit hash of (tag, visitor) instead of a Cookie row"""
+    key = BigIntegerField(primary_key=True)
+    last_visit = IntegerField(index=True)
+
+    class Meta:
+        database = db
+        without_rowid = True
+
+class BloomSlice(BaseModel):
+    """One slice of a badge's scalable Bloom filter (DEDUP_BACKEND=bloom)"""
+    badge = ForeignKeyField(Badge, backref='bloom_slices')
+    slice_index = IntegerField()
+    capacity = IntegerField()
+    num_bits = IntegerField()
+    num_hashes = IntegerField()
+    count = IntegerField(default=0)
+
+    class Meta:
+        database = db
+        indexes = (
+            (("badge", "slice_index"), True),
+        )
+
+class BloomPage(BaseModel):
+    """Fixed-size chunk of a slice's bit array; pages that were never set are not stored"""
+    bloom_slice = ForeignKeyField(BloomSlice, backref='pages')
+    page = IntegerField()
+    bits = BlobField()
+
+    class Meta:
+        database = db
+        indexes = (
+            (("bloom_slice", "page"), True),
+        )
+
+class VisitBucket(BaseModel):
+    """Counted visits of a badge within one hour, day or month (see history.py)"""
+    badge = ForeignKeyField(Badge, backref='buckets')
+    resolution = CharField(max_length=5)
+    bucket_start = IntegerField()
+    visits = IntegerField(default=0)
+
+    class Meta:
+        database = db
+        indexes = (
+            (("badge", "resolution", "bucket_start"), True),
+        )
+
+ALL_MODELS = [Badge, Cookie, VisitorKey, BloomSlice, BloomPage, VisitBucket]
+
 def initialize_database():
     try:
-        if os.getenv("TESTING"):
+        if is_memory_database():
             logger.info("Using in-memory database for testing")
         else:
-            db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "visitors.db")
-            logger.info(f"Database path: {db_path}")
-            logger.info(f"Database directory exists: {os.path.exists(os.path.dirname(db_path))}")
+            logger.info(f"Database path: {shard_database_path(0, len(db.shards))}")
+            logger.info(f"Database directory exists: {os.path.exists(os.path.dirname(DATABASE_PATH))}")
             # Ensure the data directory exists
-            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
+        logger.info(f"SQLite profile: {SQLITE_PROFILE} {get_sqlite_pragmas()}")
         
-        if db.is_closed():
-            db.connect()
-        db.create_tables([Badge, Cookie], safe=True)
+        for _ in each_shard():
+            if db.is_closed():
+                db.connect()
+            db.create_tables(ALL_MODELS, safe=True)
+            drop_legacy_cookie_index()
+            if not is_memory_database():
+                # Request handlers open their own connections through connection_scope()
+                db.close()
+        if len(db.shards) > 1:
+            logger.info(f"Badges are partitioned across {len(db.shards)} shards")
         logger.info("Database initialized successfully")
         return True
     except Exception as e:
@@ -61,10 +259,20 @@ def initialize_database():
         logger.error(f"Full traceback: {traceback.format_exc()}")
         return False
 
+def drop_legacy_cookie_index():
+    """Drop the old unique index on cookie_id that limited a visitor to one badge"""
+    for index in db.get_indexes(Cookie._meta.table_name):
+        if index.unique and index.columns == ["cookie_id"]:
+            db.execute_sql(f'DROP INDEX IF EXISTS "{index.name}"')
+            logger.info(f"Dropped legacy unique index {index.name}")
+
 def close_database():
     try:
-        if not db.is_closed():
-            db.close()
+        for shard in db.shards:
+            if isinstance(shard, PooledSqliteDatabase):
+                shard.close_all()
+            elif not shard.is_closed():
+                shard.close()
         logger.info("Database connection closed")
     except Exception as e:
         logger.error(f"Error closing database: {e}")
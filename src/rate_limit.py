@@ -0,0 +1,92 @@
+from collections import OrderedDict
+from typing import Optional
+from fastapi import Request
+import threading
+import time
+import os
+
+# Requests per second and burst size per client IP and per tag; a rate of 0 disables that limit
+RATE_LIMIT_IP_PER_SECOND = float(os.getenv("RATE_LIMIT_IP_PER_SECOND", "0"))
+RATE_LIMIT_IP_BURST = int(os.getenv("RATE_LIMIT_IP_BURST", "20"))
+RATE_LIMIT_TAG_PER_SECOND = float(os.getenv("RATE_LIMIT_TAG_PER_SECOND", "0"))
+RATE_LIMIT_TAG_BURST = int(os.getenv("RATE_LIMIT_TAG_BURST", "200"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "16"))
+# Header holding the client address when behind a reverse proxy, e.g. X-Forwarded-For
+RATE_LIMIT_CLIENT_IP_HEADER = os.getenv("RATE_LIMIT_CLIENT_IP_HEADER", "")
+
+class _Shard:
+    __slots__ = ("lock", "buckets", "limited", "evictions")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> [tokens, last refill]; least recently used first
+        self.buckets: "OrderedDict[str, list]" = OrderedDict()
+        self.limited = 0
+        self.evictions = 0
+
+class TokenBucketLimiter:
+    """Token bucket per key, held in memory and split into independently locked shards.
+
+    Each shard keeps at most max_keys / shards buckets and evicts the least
+    recently used one. A bucket idle for burst / rate seconds is full again,
+    so evicting idle buckets loses nothing; only a flood of distinct keys can
+    evict a bucket that is still draining.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = RATE_LIMIT_MAX_KEYS, shards: int = RATE_LIMIT_SHARDS):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._shards = [_Shard() for _ in range(max(shards, 1))]
+        self._keys_per_shard = max(max_keys // len(self._shards), 1)
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def acquire(self, key: str, now: Optional[float] = None) -> float:
+        """Take a token for key; returns 0 if allowed, else seconds until one is available"""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        shard = self._shards[hash(key) % len(self._shards)]
+        with shard.lock:
+            bucket = shard.buckets.get(key)
+            if bucket is None:
+                bucket = shard.buckets[key] = [float(self.burst), now]
+                if len(shard.buckets) > self._keys_per_shard:
+                    shard.buckets.popitem(last=False)
+                    shard.evictions += 1
+            else:
+                shard.buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0.0
+            shard.limited += 1
+            return (1 - bucket[0]) / self.rate
+
+    def size(self) -> int:
+        return sum(len(shard.buckets) for shard in self._shards)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "keys": self.size(),
+            "limited": sum(shard.limited for shard in self._shards),
+            "evictions": sum(shard.evictions for shard in self._shards),
+        }
+
+ip_limiter = TokenBucketLimiter(RATE_LIMIT_IP_PER_SECOND, RATE_LIMIT_IP_BURST)
+tag_limiter = TokenBucketLimiter(RATE_LIMIT_TAG_PER_SECOND, RATE_LIMIT_TAG_BURST)
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_CLIENT_IP_HEADER:
+        forwarded = request.headers.get(RATE_LIMIT_CLIENT_IP_HEADER)
+        if forwarded:
+            # The proxy appends the address it saw last; earlier hops are client-controlled
+            return forwarded.rsplit(",", 1)[-1].strip()
+    return request.client.host if request.client else "unknown"
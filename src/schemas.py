@@ -1,11 +1,13 @@
 from pydantic import BaseModel, Field
-from typing import Annotated
+from typing import Annotated, List
+
+BadgeTag = Annotated[str, Field(strip_whitespace=True, min_length=1, max_length=200)]
 
 class BadgeParams(BaseModel):
-    tag: Annotated[str, Field(strip_whitespace=True, min_length=1, max_length=200)]
+    tag: BadgeTag
     label: Annotated[str, Field(strip_whitespace=True, min_length=1, max_length=20)] = "visits"
     color: Annotated[str, Field(strip_whitespace=True, min_length=3, max_length=10)] = "4ade80"
-    style: Annotated[str, Field(strip_whitespace=True, min_length=2, max_length=10)] = "flat"
+    style: Annotated[str, Field(strip_whitespace=True, min_length=2, max_length=13)] = "flat"
     logo: Annotated[str, Field(strip_whitespace=True, max_length=20)] = ""
 
 class TagStatsResponse(BaseModel):
@@ -13,6 +15,18 @@ class TagStatsResponse(BaseModel):
     visit_count: int
     last_updated: int
 
+class BatchStatsRequest(BaseModel):
+    tags: List[str]
+
+class HistoryBucket(BaseModel):
+    start: int
+    visits: int
+
+class TagHistoryResponse(BaseModel):
+    tag: str
+    resolution: str
+    buckets: List[HistoryBucket]
+
 class SystemStatsResponse(BaseModel):
     total_tracked_tags: int
     total_visits: int
@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from typing import Optional
+import hashlib
+import threading
+import os
+
+SEEN_INDEX_SIZE = int(os.getenv("SEEN_INDEX_SIZE", "100000"))
+
+class SeenIndex:
+    """(visitor cookie, tag) pairs that storage already counted, kept in memory.
+
+    A returning visitor found here is answered without a write transaction.
+    Entries are keyed by a hash of the signed cookie value, so a hit also
+    stands for a cookie that was verified when it was recorded. Whatever
+    expires dedup records must call expire() with the same cutoff; visitors
+    found already counted at an unknown time are dropped by any expiry.
+    """
+
+    def __init__(self, max_size: int = SEEN_INDEX_SIZE):
+        self.max_size = max_size
+        # key -> time the visit was counted; least recently used first
+        self._entries: "OrderedDict[bytes, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    @staticmethod
+    def _key(cookie_value: str, tag_str: str) -> bytes:
+        return hashlib.blake2b(f"{tag_str}\0{cookie_value}".encode("utf-8"), digest_size=16).digest()
+
+    def add(self, cookie_value: str, tag_str: str, counted_at: Optional[int]):
+        """Remember a counted visitor; counted_at is None if it was counted at an unknown time"""
+        if self.max_size <= 0:
+            return
+        key = self._key(cookie_value, tag_str)
+        with self._lock:
+            self._entries[key] = counted_at or 0
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def contains(self, cookie_value: str, tag_str: str) -> bool:
+        key = self._key(cookie_value, tag_str)
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True
+
+    def expire(self, cutoff: int) -> int:
+        """Forget visitors counted before cutoff, as their dedup records are being deleted"""
+        with self._lock:
+            expired = [key for key, counted_at in self._entries.items() if counted_at < cutoff]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+seen_visitors = SeenIndex()
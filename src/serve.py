@@ -0,0 +1,59 @@
+"""Start BadgeTrack, with a coordinator process in front of SQLite when running several workers"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import logging
+
+from .coordinator import CoordinatorClient, CoordinatorError, COORDINATOR_SOCKET
+
+logger = logging.getLogger(__name__)
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+def wait_for_coordinator(socket_path: str, process: subprocess.Popen, timeout: float = 30.0):
+    client = CoordinatorClient(socket_path, timeout=1.0)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Coordinator exited with status {process.returncode}")
+        try:
+            client.request("ping")
+            client.close()
+            return
+        except CoordinatorError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Coordinator did not start listening on {socket_path}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--host", default=os.getenv("UVICORN_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("UVICORN_PORT", "8000")))
+    parser.add_argument("--log-level", default=os.getenv("UVICORN_LOG_LEVEL", "info").lower())
+    args = parser.parse_args()
+
+    import uvicorn
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+
+    if args.workers <= 1:
+        uvicorn.run("src.main:app", host=args.host, port=args.port, log_level=args.log_level)
+        return 0
+
+    socket_path = COORDINATOR_SOCKET or os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "coordinator.sock")
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    # Workers are spawned with this environment, so they all forward to the coordinator
+    os.environ["COORDINATOR_SOCKET"] = socket_path
+    coordinator = subprocess.Popen([sys.executable, "-m", "src.coordinator"], env=dict(os.environ))
+    try:
+        wait_for_coordinator(socket_path, coordinator)
+        logger.info(f"Coordinator ready on {socket_path}, starting {args.workers} workers")
+        uvicorn.run("src.main:app", host=args.host, port=args.port, log_level=args.log_level, workers=args.workers)
+    finally:
+        coordinator.terminate()
+        coordinator.wait(timeout=30)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
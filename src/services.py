@@ -1,70 +1,155 @@
-from typing import Tuple
-from peewee import fn
-from .models import db, Badge, Cookie
+from typing import Dict, List, Optional, Tuple
+from .cache import tag_cache
+from .seen import seen_visitors
+from .aggregates import system_aggregates
+from .storage import storage
+from .http_cache import badge_cache_policy
+from .badge_renderer import render_badge_svg
+from .metrics import visits, visitor_cookies
+from .utils import new_visitor_id, sign_visitor_id, verify_visitor_cookie
 import time
 import os
 import json
 import logging
-import secrets
 
 logger = logging.getLogger(__name__)
 
-def update_visit_count(cookie_id: str, tag_str: str) -> Tuple[int, bool, str]:
-    """Update visit count for a tag and cookie combination"""
-    current_time = int(time.time())
-    new_cookie_id = None
+def update_visit_count(cookie_value: Optional[str], tag_str: str) -> Tuple[int, bool, Optional[str]]:
+    """Update visit count for a tag and visitor cookie.
 
-    try:
-        with db.atomic():
-            badge, badge_created = Badge.get_or_create(
-                tag=tag_str,
-                defaults={'created': current_time}
-            )
-
-            if not cookie_id:
-                cookie_id = secrets.token_hex(16)
-                new_cookie_id = cookie_id
-
-            cookie, cookie_created = Cookie.get_or_create(
-                cookie_id=cookie_id,
-                badge=badge,
-                defaults={'last_visit': current_time}
-            )
-
-            if cookie_created:
-                badge.visits += 1
-                badge.save()
-                return badge.visits, True, new_cookie_id
-            else:
-                return badge.visits, False, new_cookie_id
+    Returns (count, was_incremented, new_cookie_value); the cookie value is set
+    when the visitor had no valid signed cookie and must be sent one.
+    """
+    return update_visit_counts([cookie_value], tag_str)[0]
+
+def update_visit_counts(cookie_values: List[Optional[str]], tag_str: str) -> List[Tuple[int, bool, Optional[str]]]:
+    """update_visit_count for concurrent visitors of one tag, written in a single storage call.
+
+    When badges go to shared caches, no cookie ever reaches the visitor, so a
+    visitor without a valid cookie gets no id: the hit is counted as an
+    anonymous visit and nothing is stored for dedup.
+    """
+    anonymous = badge_cache_policy.shared()
+    now = int(time.time())
+    results: List[Optional[Tuple[int, bool, Optional[str]]]] = [None] * len(cookie_values)
+    pending = []
+    for index, cookie_value in enumerate(cookie_values):
+        if cookie_value and seen_visitors.contains(cookie_value, tag_str):
+            results[index] = (get_tag_visit_count(tag_str), False, None)
+            visits.inc("deduplicated")
+            continue
+        visitor_id, reissue = verify_visitor_cookie(cookie_value) if cookie_value else (None, False)
+        if reissue and not storage.knows_visitor(tag_str, visitor_id):
+            # A bare id is only trusted if it was counted before; anyone can make one up
+            visitor_id = None
+        is_new_visitor = visitor_id is None
+        if is_new_visitor and anonymous:
+            if cookie_value:
+                visitor_cookies.inc("rejected")
+            pending.append((index, cookie_value, None, (None, False, now)))
+            continue
+        if is_new_visitor:
+            # Forged and malformed cookies never reach storage; the visitor is treated as new
+            visitor_cookies.inc("rejected" if cookie_value else "issued")
+            visitor_id = new_visitor_id()
+        elif reissue:
+            visitor_cookies.inc("resigned")
+        new_cookie_id = sign_visitor_id(visitor_id) if is_new_visitor or reissue else None
+        pending.append((index, cookie_value, new_cookie_id, (visitor_id, is_new_visitor, now)))
+    if not pending:
+        return results
 
+    try:
+        written = storage.record_visits(tag_str, [visit for _, _, _, visit in pending])
     except Exception as e:
         logger.error(f"Error updating visit count: {e}")
-        try:
-            badge = Badge.get(Badge.tag == tag_str)
-            return badge.visits, False, new_cookie_id
-        except Badge.DoesNotExist:
-            return 0, False, new_cookie_id
+        visits.inc("error", amount=len(pending))
+        count = _read_visit_count(tag_str)
+        for index, _, new_cookie_id, _ in pending:
+            results[index] = (count, False, new_cookie_id)
+        return results
+
+    counted = 0
+    for (index, cookie_value, new_cookie_id, visit), (count, was_incremented, _) in zip(pending, written):
+        results[index] = (count, was_incremented, new_cookie_id)
+        counted += was_incremented
+        if visit[0] is not None:
+            seen_visitors.add(new_cookie_id or cookie_value, tag_str, now if was_incremented else None)
+    if counted:
+        visits.inc("counted", amount=counted)
+    if counted < len(written):
+        visits.inc("deduplicated", amount=len(written) - counted)
+    tag_cache.set_max(tag_str, max(count for count, _, _ in written))
+    if any(badge_created for _, _, badge_created in written):
+        system_aggregates.record_badge_created(now)
+    if counted:
+        system_aggregates.record_visits(counted)
+    return results
+
+def get_seen_visit_count(cookie_value: Optional[str], tag_str: str) -> Optional[int]:
+    """Count for a visitor this process already counted for the tag, without touching storage.
+
+    None means the visit has to go through update_visit_count, either because
+    the visitor is not known here or because the count is not cached.
+    """
+    if not cookie_value or not seen_visitors.contains(cookie_value, tag_str):
+        return None
+    count = tag_cache.get(tag_str)
+    if count is not None:
+        visits.inc("deduplicated")
+    return count
 
 def get_tag_visit_count(tag_str: str) -> int:
     """Get total visit count for a tag"""
+    count = tag_cache.get(tag_str)
+    if count is None:
+        count = load_tag_visit_count(tag_str)
+    return count
+
+def get_tag_visit_counts(tags: List[str]) -> Dict[str, int]:
+    """Counts for many tags: one cache multi-get, then one storage lookup for the misses"""
+    counts = tag_cache.get_many(tags)
+    missing = [tag_str for tag_str in tags if tag_str not in counts]
+    if missing:
+        counts.update(load_tag_visit_counts(missing))
+    return {tag_str: counts[tag_str] for tag_str in tags}
+
+def load_tag_visit_counts(tags: List[str]) -> Dict[str, int]:
+    """Read many tags' counts from storage and refresh the cache with them"""
+    counts = storage.get_counts(tags)
+    for tag_str, count in counts.items():
+        tag_cache.set_max(tag_str, count)
+    return counts
+
+def load_tag_visit_count(tag_str: str) -> int:
+    """Read a tag's count from storage and refresh the cache with it"""
+    count = storage.get_count(tag_str)
+    tag_cache.set_max(tag_str, count)
+    return count
+
+def get_visit_history(tag_str: str, resolution: str, start: int, end: int) -> List[Tuple[int, int]]:
+    """(bucket_start, visits) pairs for a tag, served from the hourly buckets and their rollups"""
+    return storage.visit_history(tag_str, resolution, start, end)
+
+def _read_visit_count(tag_str: str) -> int:
     try:
-        badge = Badge.get(Badge.tag == tag_str)
-        return badge.visits
-    except Badge.DoesNotExist:
+        return storage.get_count(tag_str)
+    except Exception as e:
+        logger.error(f"Error reading visit count: {e}")
         return 0
 
 def get_system_statistics() -> dict:
     """Get system-wide statistics"""
+    if system_aggregates.loaded:
+        return system_aggregates.snapshot()
+    return _scan_system_statistics()
+
+def _scan_system_statistics() -> dict:
     try:
-        total_tags = Badge.select().count()
-        total_visits = Badge.select(fn.SUM(Badge.visits)).scalar() or 0
-        
+        total_tags, total_visits = storage.totals()
         # Count badges created in last 24 hours
         day_ago = int(time.time()) - 86400
-        recent_badges = Badge.select().where(
-            Badge.created > day_ago
-        ).count()
+        recent_badges = sum(storage.created_buckets(day_ago, 86400).values())
         
         return {
             "total_tracked_tags": total_tags,
@@ -79,6 +164,19 @@ def get_system_statistics() -> dict:
             "new_badges_today": 0,
         }
 
+def get_cache_statistics() -> dict:
+    """Hit/miss counters for the in-memory caches, used to size them"""
+    render_info = render_badge_svg.cache_info()
+    return {
+        "tag_cache": tag_cache.stats(),
+        "render_cache": {
+            "size": render_info.currsize,
+            "max_size": render_info.maxsize,
+            "hits": render_info.hits,
+            "misses": render_info.misses,
+        },
+    }
+
 def get_app_info() -> dict:
     app_version = "N/A"
     default_env = "Production"
@@ -97,20 +195,3 @@ def get_app_info() -> dict:
     current_env = os.getenv("APP_ENV", default_env)
     
     return {"version": app_version, "environment": current_env}
-
-def load_template(template_name: str) -> str:
-    template_path = os.path.join(os.path.dirname(__file__), "..", "templates", template_name)
-    if not os.path.exists(template_path):
-        alt_template_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates", template_name)
-        if os.path.exists(alt_template_path):
-            template_path = alt_template_path
-        else:
-            logger.error(f"Template '{template_name}' not found at {template_path} or {alt_template_path}")
-            return "Template not found"
-    
-    try:
-        with open(template_path, "r", encoding="utf-8") as f:
-            return f.read()
-    except Exception as e:
-        logger.error(f"Error loading template '{template_name}': {e}")
-        return "Error loading template"
@@ -0,0 +1,186 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from fastapi import Request, Response
+import gzip
+import hashlib
+import mimetypes
+import threading
+import os
+import logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Re-read changed files on request; on by default when APP_ENV=Development
+STATIC_RELOAD = os.getenv(
+    "STATIC_RELOAD", "true" if os.getenv("APP_ENV") == "Development" else "false"
+).lower() in ("1", "true", "yes")
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_BYTES = 256
+
+class StaticAsset:
+    """Immutable response body with precompressed variants and a strong ETag"""
+    __slots__ = ("body", "variants", "etag", "media_type", "mtime")
+
+    def __init__(self, body: bytes, media_type: str, mtime: Optional[int] = None):
+        self.body = body
+        self.media_type = media_type
+        self.mtime = mtime
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        # Ordered by preference; each variant only kept if it is actually smaller
+        self.variants: List[Tuple[str, bytes]] = []
+        if media_type.startswith(COMPRESSIBLE_TYPES) and len(body) >= MIN_COMPRESS_BYTES:
+            if brotli is not None:
+                self.variants.append(("br", brotli.compress(body, quality=11)))
+            self.variants.append(("gzip", gzip.compress(body, compresslevel=9, mtime=0)))
+            self.variants = [(encoding, data) for encoding, data in self.variants if len(data) < len(body)]
+
+    def select(self, accept_encoding: str) -> Tuple[Optional[str], bytes]:
+        """Pick the best precompressed body the client accepts"""
+        weights = _encoding_weights(accept_encoding)
+        for encoding, data in self.variants:
+            if weights.get(encoding, weights.get("*", 0.0)) > 0:
+                return encoding, data
+        return None, self.body
+
+def _encoding_weights(accept_encoding: str) -> Dict[str, float]:
+    """Accept-Encoding as {coding: q}; a coding with q=0 is refused"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        coding, *params = [item.strip() for item in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights
+
+class _Source:
+    __slots__ = ("path", "media_type", "build")
+
+    def __init__(self, path: str, media_type: str, build: Optional[Callable[[], bytes]]):
+        self.path = path
+        self.media_type = media_type
+        self.build = build
+
+class AssetStore:
+    """Pages, JSON documents and static files held in memory as StaticAssets.
+
+    Everything is read once by preload(), or by the first get() of an asset
+    if preload() has not run. With reload enabled, get() compares
+    the source file's mtime on each request and rebuilds the asset if it
+    changed, and files added to a registered directory are picked up.
+    """
+
+    def __init__(self, reload: bool = STATIC_RELOAD):
+        self.reload = reload
+        self._sources: Dict[str, _Source] = {}
+        self._directories: Dict[str, str] = {}
+        self._assets: Dict[str, StaticAsset] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, path: str, media_type: Optional[str] = None, build: Optional[Callable[[], bytes]] = None):
+        """Serve `name` from the file at `path`, or from build() whenever that file changes"""
+        if media_type is None:
+            media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self._sources[name] = _Source(path, media_type, build)
+
+    def register_directory(self, prefix: str, directory: str):
+        """Serve every file below `directory` as `prefix/<relative path>`"""
+        directory = os.path.realpath(directory)
+        self._directories[prefix] = directory
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                relative = os.path.relpath(path, directory).replace(os.sep, "/")
+                self.register(f"{prefix}/{relative}", path)
+
+    def preload(self) -> int:
+        """Build every registered asset, returning how many were loaded"""
+        for name in list(self._sources):
+            self._build(name)
+        total = sum(len(asset.body) for asset in self._assets.values())
+        logger.info(f"Loaded {len(self._assets)} static assets ({total} bytes, brotli {'on' if brotli else 'off'})")
+        return len(self._assets)
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        asset = self._assets.get(name)
+        if not self.reload:
+            if asset is None and name in self._sources:
+                asset = self._build(name)
+            return asset
+        if name not in self._sources and not self._discover(name):
+            return None
+        if asset is None or _mtime(self._sources[name].path) != asset.mtime:
+            asset = self._build(name)
+        return asset
+
+    def _discover(self, name: str) -> bool:
+        prefix, _, relative = name.partition("/")
+        directory = self._directories.get(prefix)
+        if directory is None:
+            return False
+        path = os.path.realpath(os.path.join(directory, relative))
+        if os.path.commonpath([directory, path]) != directory or not os.path.isfile(path):
+            return False
+        self.register(name, path)
+        return True
+
+    def _build(self, name: str) -> Optional[StaticAsset]:
+        source = self._sources[name]
+        mtime = _mtime(source.path)
+        try:
+            if source.build is not None:
+                body = source.build()
+            else:
+                with open(source.path, "rb") as f:
+                    body = f.read()
+        except Exception as e:
+            logger.error(f"Error loading static asset '{name}' from {source.path}: {e}")
+            return self._assets.get(name)
+        asset = StaticAsset(body, source.media_type, mtime)
+        with self._lock:
+            self._assets[name] = asset
+        return asset
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison as required for If-None-Match"""
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
+
+def asset_response(request: Request, asset: StaticAsset, cache_control: str, headers: Optional[dict] = None) -> Response:
+    """200 with the best precompressed body, or 304 if the client's copy is current"""
+    encoding, body = asset.select(request.headers.get("accept-encoding", ""))
+    # Each encoding is a different representation, so it gets its own strong ETag
+    etag = asset.etag if encoding is None else f'{asset.etag[:-1]}-{encoding}"'
+    response_headers = dict(headers or {})
+    response_headers.update({"ETag": etag, "Cache-Control": cache_control})
+    if asset.variants:
+        response_headers["Vary"] = "Accept-Encoding"
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (etag_matches(if_none_match, etag) or etag_matches(if_none_match, asset.etag)):
+        return Response(status_code=304, headers=response_headers)
+    if encoding is not None:
+        response_headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=asset.media_type, headers=response_headers)
+
+static_assets = AssetStore()
@@ -0,0 +1,308 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from peewee import fn
+from .models import db, Badge, DATABASE_PATH, connection_scope, tag_shard, each_shard, shard_for_tag, use_shard
+from .write_buffer import visit_buffer
+from .dedup import dedup_store
+from .kvstore import KeyValueStore
+from .maintenance import compact_cookies, last_compaction, RATE_LIMIT_WINDOW_SECONDS
+from .metrics import db_transaction_duration
+from .seen import seen_visitors
+from .history import HISTORY_ENABLED, add_hourly_visits, hourly_increments, fold, read_history_rows, rollup_sqlite
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite").lower()
+KV_DATA_DIR = os.getenv("KV_DATA_DIR", os.path.join(os.path.dirname(DATABASE_PATH), "kv"))
+KV_FSYNC_INTERVAL = float(os.getenv("KV_FSYNC_INTERVAL", "1.0"))
+KV_SNAPSHOT_INTERVAL = float(os.getenv("KV_SNAPSHOT_INTERVAL", "300"))
+KV_SNAPSHOT_LOG_BYTES = int(os.getenv("KV_SNAPSHOT_LOG_BYTES", str(64 * 1024 * 1024)))
+
+# Tags per IN (...) query, well below SQLite's bound-parameter limit
+COUNT_QUERY_CHUNK_SIZE = 500
+
+# The visit write path runs fixed SQL text, so each connection's sqlite3
+# statement cache prepares it once instead of peewee rendering it per visit
+_BADGE_TABLE = Badge._meta.table_name
+SELECT_BADGE_SQL = f"SELECT id, visits FROM {_BADGE_TABLE} WHERE tag = ?"
+INSERT_BADGE_SQL = f"INSERT INTO {_BADGE_TABLE} (tag, visits, created) VALUES (?, 0, ?)"
+ADD_BADGE_VISITS_SQL = f"UPDATE {_BADGE_TABLE} SET visits = visits + ? WHERE id = ?"
+
+class StorageBackend(ABC):
+    """Where tag counts and the per-tag visitor set live.
+
+    record_visit raises on failure; callers fall back to get_count. A cookie_id
+    of None is an anonymous visit: it is counted and nothing is kept for dedup.
+    A backend missing any abstract method cannot be instantiated.
+    """
+
+    name = "base"
+    # False if the data only exists inside the writer process
+    shared_across_processes = True
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    @abstractmethod
+    def record_visit(self, cookie_id: Optional[str], tag_str: str, is_new_cookie: bool, now: int) -> Tuple[int, bool, bool]:
+        """Count the visitor once per tag, returning (count, was_incremented, badge_created)"""
+
+    def record_visits(self, tag_str: str, visits: List[Tuple[str, bool, int]]) -> List[Tuple[int, bool, bool]]:
+        """record_visit for several (cookie_id, is_new_cookie, now) visits of one tag, in order"""
+        return [self.record_visit(cookie_id, tag_str, is_new_cookie, now) for cookie_id, is_new_cookie, now in visits]
+
+    @abstractmethod
+    def knows_visitor(self, tag_str: str, cookie_id: str) -> bool:
+        """Whether the visitor is already counted for the tag; a lookup only, nothing is written"""
+
+    @abstractmethod
+    def get_count(self, tag_str: str) -> int:
+        """Visits of one tag; 0 if it is unknown"""
+
+    def get_counts(self, tags: List[str]) -> Dict[str, int]:
+        """Counts of many tags at once; unknown tags are 0"""
+        return {tag_str: self.get_count(tag_str) for tag_str in tags}
+
+    @abstractmethod
+    def totals(self) -> Tuple[int, int]:
+        """(number of tags, sum of all visits)"""
+
+    @abstractmethod
+    def created_buckets(self, since: int, bucket_seconds: int) -> Dict[int, int]:
+        """Tags created after `since`, counted per `created // bucket_seconds`"""
+
+    @abstractmethod
+    def expire_visitors(self) -> dict:
+        """Forget visitors older than RATE_LIMIT_WINDOW_SECONDS so they are counted again"""
+
+    @abstractmethod
+    def visit_history(self, tag_str: str, resolution: str, start: int, end: int) -> List[Tuple[int, int]]:
+        """Dense (bucket_start, visits) pairs at `resolution` over [start, end)"""
+
+    @abstractmethod
+    def rollup_history(self) -> dict:
+        """Fold hourly and daily buckets that are past their retention into coarser ones"""
+
+class SqliteBackend(StorageBackend):
+    """Badge and Cookie rows in SQLite (optionally sharded, buffered or Bloom-deduplicated)"""
+
+    name = "sqlite"
+
+    def start(self):
+        visit_buffer.start()
+
+    def stop(self):
+        visit_buffer.stop()
+
+    def record_visit(self, cookie_id: str, tag_str: str, is_new_cookie: bool, now: int) -> Tuple[int, bool, bool]:
+        return self.record_visits(tag_str, [(cookie_id, is_new_cookie, now)])[0]
+
+    def record_visits(self, tag_str: str, visits: List[Tuple[str, bool, int]]) -> List[Tuple[int, bool, bool]]:
+        with tag_shard(tag_str):
+            return self._record_visits(tag_str, visits)
+
+    @connection_scope()
+    def _record_visits(self, tag_str: str, visits: List[Tuple[str, bool, int]]) -> List[Tuple[int, bool, bool]]:
+        if visit_buffer.enabled:
+            return [visit_buffer.record(cookie_id, tag_str, is_new_cookie, now) for cookie_id, is_new_cookie, now in visits]
+
+        badge_id = None
+        try:
+            # IMMEDIATE takes the write lock up front so concurrent writers wait on
+            # busy_timeout instead of failing when they upgrade from a read lock
+            with db_transaction_duration.time("visit"), db.atomic("IMMEDIATE"):
+                row = db.execute_sql(SELECT_BADGE_SQL, (tag_str,)).fetchone()
+                badge_created = row is None
+                if badge_created:
+                    badge_id, visits_before = db.execute_sql(INSERT_BADGE_SQL, (tag_str, visits[0][2])).lastrowid, 0
+                else:
+                    badge_id, visits_before = row
+                counted_at = []
+                for cookie_id, is_new_cookie, now in visits:
+                    if cookie_id is None:
+                        was_incremented = True
+                    elif is_new_cookie:
+                        was_incremented = dedup_store.add_new(badge_id, tag_str, cookie_id, now)
+                    else:
+                        was_incremented = dedup_store.check_and_add(badge_id, tag_str, cookie_id, now)
+                    counted_at.append(now if was_incremented else None)
+                increments = [now for now in counted_at if now is not None]
+                if increments:
+                    # One UPDATE for the whole batch; each visit is reported with the
+                    # count it would have seen had the visits run one by one
+                    db.execute_sql(ADD_BADGE_VISITS_SQL, (len(increments), badge_id))
+                    if HISTORY_ENABLED:
+                        add_hourly_visits(badge_id, hourly_increments(increments))
+            results = []
+            count = visits_before
+            for index, now in enumerate(counted_at):
+                if now is not None:
+                    count += 1
+                results.append((count, now is not None, badge_created and index == 0))
+            return results
+        except Exception:
+            if badge_id is not None:
+                dedup_store.forget(badge_id)
+            raise
+
+    def knows_visitor(self, tag_str: str, cookie_id: str) -> bool:
+        with tag_shard(tag_str), connection_scope():
+            if visit_buffer.enabled:
+                return visit_buffer.knows_visitor(cookie_id, tag_str)
+            row = db.execute_sql(SELECT_BADGE_SQL, (tag_str,)).fetchone()
+            return row is not None and dedup_store.contains(row[0], tag_str, cookie_id)
+
+    def get_count(self, tag_str: str) -> int:
+        with tag_shard(tag_str):
+            return self._read_count(tag_str)
+
+    @connection_scope()
+    def _read_count(self, tag_str: str) -> int:
+        if visit_buffer.enabled:
+            return visit_buffer.get_count(tag_str)
+        try:
+            badge = Badge.get(Badge.tag == tag_str)
+            return badge.visits
+        except Badge.DoesNotExist:
+            return 0
+
+    def get_counts(self, tags: List[str]) -> Dict[str, int]:
+        by_shard: Dict[int, List[str]] = {}
+        for tag_str in tags:
+            by_shard.setdefault(shard_for_tag(tag_str), []).append(tag_str)
+        counts: Dict[str, int] = {}
+        for shard, shard_tags in by_shard.items():
+            with use_shard(shard):
+                counts.update(self._read_counts(shard_tags))
+        return counts
+
+    @connection_scope()
+    def _read_counts(self, tags: List[str]) -> Dict[str, int]:
+        if visit_buffer.enabled:
+            return visit_buffer.get_counts(tags, self._query_counts)
+        return self._query_counts(tags)
+
+    def _query_counts(self, tags: List[str]) -> Dict[str, int]:
+        counts = dict.fromkeys(tags, 0)
+        for start in range(0, len(tags), COUNT_QUERY_CHUNK_SIZE):
+            chunk = tags[start:start + COUNT_QUERY_CHUNK_SIZE]
+            query = Badge.select(Badge.tag, Badge.visits).where(Badge.tag.in_(chunk)).tuples()
+            counts.update(query)
+        return counts
+
+    def totals(self) -> Tuple[int, int]:
+        total_tags = 0
+        total_visits = 0
+        for _ in each_shard():
+            with connection_scope():
+                total_tags += Badge.select().count()
+                total_visits += Badge.select(fn.SUM(Badge.visits)).scalar() or 0
+        return total_tags, total_visits
+
+    def created_buckets(self, since: int, bucket_seconds: int) -> Dict[int, int]:
+        # Integer division in SQLite, so this yields the bucket index
+        bucket = (Badge.created / bucket_seconds).alias("bucket")
+        buckets: Dict[int, int] = {}
+        for _ in each_shard():
+            with connection_scope():
+                recent = (
+                    Badge.select(bucket, fn.COUNT(Badge.id).alias("created_count"))
+                    .where(Badge.created > since)
+                    .group_by(bucket)
+                    .tuples()
+                )
+                for bucket_index, created_count in recent:
+                    buckets[bucket_index] = buckets.get(bucket_index, 0) + created_count
+        return buckets
+
+    def expire_visitors(self) -> dict:
+        return compact_cookies()
+
+    def visit_history(self, tag_str: str, resolution: str, start: int, end: int) -> List[Tuple[int, int]]:
+        with tag_shard(tag_str), connection_scope():
+            badge = Badge.get_or_none(Badge.tag == tag_str)
+            rows = read_history_rows(badge.id, resolution, start, end) if badge else []
+        return fold(rows, resolution, start, end)
+
+    def rollup_history(self) -> dict:
+        return rollup_sqlite()
+
+class KeyValueBackend(StorageBackend):
+    """Counts and visitor hashes in memory, persisted by KeyValueStore's log and snapshots"""
+
+    name = "kv"
+    shared_across_processes = False
+
+    def __init__(self, store: KeyValueStore):
+        self.store = store
+
+    def start(self):
+        self.store.open()
+
+    def stop(self):
+        self.store.close()
+
+    def record_visit(self, cookie_id: str, tag_str: str, is_new_cookie: bool, now: int) -> Tuple[int, bool, bool]:
+        with db_transaction_duration.time("visit"):
+            return self.store.record_visit(cookie_id, tag_str, now)
+
+    def record_visits(self, tag_str: str, visits: List[Tuple[str, bool, int]]) -> List[Tuple[int, bool, bool]]:
+        with db_transaction_duration.time("visit"):
+            return [self.store.record_visit(cookie_id, tag_str, now) for cookie_id, _, now in visits]
+
+    def knows_visitor(self, tag_str: str, cookie_id: str) -> bool:
+        return self.store.knows_visitor(cookie_id, tag_str)
+
+    def get_count(self, tag_str: str) -> int:
+        return self.store.get_count(tag_str)
+
+    def get_counts(self, tags: List[str]) -> Dict[str, int]:
+        return {tag_str: self.store.get_count(tag_str) for tag_str in tags}
+
+    def totals(self) -> Tuple[int, int]:
+        return self.store.totals()
+
+    def created_buckets(self, since: int, bucket_seconds: int) -> Dict[int, int]:
+        return self.store.created_buckets(since, bucket_seconds)
+
+    def expire_visitors(self) -> dict:
+        started = time.perf_counter()
+        cutoff = int(time.time()) - RATE_LIMIT_WINDOW_SECONDS
+        removed = self.store.expire(cutoff)
+        seen_visitors.expire(cutoff)
+        result = {
+            "rows_deleted": removed,
+            "batches": 1,
+            "vacuumed_pages": 0,
+            "seconds": round(time.perf_counter() - started, 3),
+            "finished_at": int(time.time()),
+        }
+        last_compaction.clear()
+        last_compaction.update(result)
+        logger.info(f"Expired {removed} visitors from the key-value store")
+        return result
+
+    def visit_history(self, tag_str: str, resolution: str, start: int, end: int) -> List[Tuple[int, int]]:
+        return fold(self.store.history_rows(tag_str), resolution, start, end)
+
+    def rollup_history(self) -> dict:
+        started = time.perf_counter()
+        folded = self.store.rollup(int(time.time()))
+        logger.info(f"History rollup folded {folded} key-value buckets")
+        return {"buckets_folded": folded, "seconds": round(time.perf_counter() - started, 3)}
+
+def create_storage_backend(backend: str = STORAGE_BACKEND) -> StorageBackend:
+    if backend == "kv":
+        logger.info(f"Using key-value storage in {KV_DATA_DIR}")
+        return KeyValueBackend(KeyValueStore(KV_DATA_DIR, KV_FSYNC_INTERVAL, KV_SNAPSHOT_INTERVAL, KV_SNAPSHOT_LOG_BYTES, HISTORY_ENABLED))
+    if backend != "sqlite":
+        logger.warning(f"Unknown STORAGE_BACKEND '{backend}', falling back to 'sqlite'")
+    return SqliteBackend()
+
+storage = create_storage_backend()
@@ -1,4 +1,8 @@
+from typing import Optional, Tuple
+import base64
 import hashlib
+import hmac
+import re
 import secrets
 import urllib.parse
 import os
@@ -13,28 +17,59 @@ if SECRET_KEY == default_secret_key_placeholder or len(SECRET_KEY) < 32:
     )
     if SECRET_KEY == default_secret_key_placeholder:
         logging.info("Generating a temporary SECRET_KEY for this session as a fallback.")
+        logging.warning("Visitor cookies are signed with SECRET_KEY; with a temporary key they are invalid after a restart.")
         SECRET_KEY = secrets.token_urlsafe(32)
     elif len(SECRET_KEY) < 32:
         logging.warning("Provided SECRET_KEY is too short. Consider generating a new one.")
 
+# Accept the bare hex visitor ids issued before cookies were signed, re-signing them on the next visit
+# if storage already counted them for the tag; set to false once those cookies have been replaced
+ACCEPT_UNSIGNED_VISITOR_IDS = os.getenv("ACCEPT_UNSIGNED_VISITOR_IDS", "true").lower() in ("1", "true", "yes")
 
-def build_shields_url(label: str, count: int, color: str, style: str, logo: str = "") -> str:
-    shields_url = (
-        f"https://img.shields.io/badge/"
-        f"{urllib.parse.quote(label)}-{count}-{color}.svg"
-        f"?style={style}"
-    )
+VISITOR_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+_VISITOR_KEY = hashlib.sha256(b"visitor-id\0" + SECRET_KEY.encode("utf-8")).digest()
+
+
+def new_visitor_id() -> str:
+    return secrets.token_hex(16)
+
+
+def sign_visitor_id(visitor_id: str) -> str:
+    """Cookie value "<id>.<128-bit HMAC-SHA256 of the id, base64url>" """
+    mac = hmac.new(_VISITOR_KEY, visitor_id.encode("ascii"), hashlib.sha256).digest()[:16]
+    return f"{visitor_id}.{base64.urlsafe_b64encode(mac).rstrip(b'=').decode('ascii')}"
+
+
+def verify_visitor_cookie(value: str) -> Tuple[Optional[str], bool]:
+    """Visitor id carried by a cookie value, or None if it is forged or malformed.
+
+    The second item is True when the cookie should be replaced by a signed one.
+    """
+    visitor_id, _, signature = value.partition(".")
+    if not VISITOR_ID_PATTERN.fullmatch(visitor_id):
+        return None, False
+    if not signature:
+        return (visitor_id, True) if ACCEPT_UNSIGNED_VISITOR_IDS else (None, False)
+    if hmac.compare_digest(sign_visitor_id(visitor_id), value):
+        return visitor_id, False
+    return None, False
+
+
+def shields_url_parts(label: str, color: str, style: str, logo: str = "") -> Tuple[str, str]:
+    """Quoted shields.io badge URL around the count: (prefix, suffix)"""
+    suffix = f"-{color}.svg?style={style}"
     if logo:
-        shields_url += f"&logo={urllib.parse.quote(logo)}"
+        suffix += f"&logo={urllib.parse.quote(logo)}"
+    return f"https://img.shields.io/badge/{urllib.parse.quote(label)}-", suffix
+
 
-    return shields_url
+def build_shields_url(label: str, count: int, color: str, style: str, logo: str = "") -> str:
+    prefix, suffix = shields_url_parts(label, color, style, logo)
+    return f"{prefix}{count}{suffix}"
 
 
 def get_security_headers() -> dict:
     return {
         "X-Content-Type-Options": "nosniff",
         "X-Frame-Options": "DENY",
-        "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
-        "Pragma": "no-cache",
-        "Expires": "0",
     }
@@ -0,0 +1,250 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from .models import db, Badge, connection_scope, shard_for_tag, use_shard
+from .dedup import dedup_store
+from .metrics import db_transaction_duration
+from .history import HISTORY_ENABLED, add_hourly_visits, hourly_increments
+import threading
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+WRITE_BUFFER_ENABLED = os.getenv("WRITE_BUFFER_ENABLED", "false").lower() in ("1", "true", "yes")
+WRITE_BUFFER_FLUSH_INTERVAL = float(os.getenv("WRITE_BUFFER_FLUSH_INTERVAL", "1.0"))
+WRITE_BUFFER_MAX_EVENTS = int(os.getenv("WRITE_BUFFER_MAX_EVENTS", "1000"))
+
+class VisitBuffer:
+    """Write-behind buffer that batches visit increments and dedup rows into few transactions"""
+
+    def __init__(self, flush_interval: float, max_events: int, enabled: bool = True):
+        self.enabled = enabled
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Bumped after every committed flush; recorders that read the DB in an
+        # older generation retry so they never mix pre- and post-flush state.
+        self._generation = 0
+        self._base_visits: Dict[str, int] = {}
+        self._badge_ids: Dict[str, int] = {}
+        self._pending_visits: Dict[str, int] = {}
+        self._pending_created: Dict[str, int] = {}
+        self._pending_cookies: Dict[Tuple[str, str], int] = {}
+
+    def pending_events(self) -> int:
+        with self._lock:
+            return len(self._pending_cookies)
+
+    @connection_scope()
+    def record(self, cookie_id: Optional[str], tag_str: str, is_new_cookie: bool, current_time: int) -> Tuple[int, bool, bool]:
+        """Record a visit, returning (count, was_incremented, badge_created)"""
+        anonymous = cookie_id is None
+        # An anonymous visit gets a key of its own, so it is always counted and never
+        # matches another; the flush writes no dedup row for it
+        key = (object() if anonymous else cookie_id, tag_str)
+        while True:
+            with self._lock:
+                generation = self._generation
+                if key in self._pending_cookies:
+                    return self._visible_count(tag_str), False, False
+                base_visits = self._base_visits.get(tag_str)
+                badge_id = self._badge_ids.get(tag_str)
+
+            if base_visits is None:
+                badge = Badge.get_or_none(Badge.tag == tag_str)
+                badge_id = badge.id if badge is not None else None
+                base_visits = badge.visits if badge is not None else 0
+            badge_exists = badge_id is not None
+            already_counted = (
+                not anonymous and not is_new_cookie and badge_exists
+                and dedup_store.contains(badge_id, tag_str, cookie_id)
+            )
+
+            with self._lock:
+                if generation != self._generation:
+                    continue
+                if key in self._pending_cookies:
+                    return self._visible_count(tag_str), False, False
+                self._base_visits.setdefault(tag_str, base_visits)
+                if badge_exists:
+                    self._badge_ids.setdefault(tag_str, badge_id)
+                if already_counted:
+                    return self._visible_count(tag_str), False, False
+
+                badge_created = not badge_exists and tag_str not in self._pending_created
+                if badge_created:
+                    self._pending_created[tag_str] = current_time
+                self._pending_cookies[key] = current_time
+                self._pending_visits[tag_str] = self._pending_visits.get(tag_str, 0) + 1
+                count = self._visible_count(tag_str)
+                should_flush = len(self._pending_cookies) >= self.max_events
+            break
+
+        if should_flush:
+            if self._thread is not None and self._thread.is_alive():
+                self._wake.set()
+            else:
+                self.flush()
+        return count, True, badge_created
+
+    def knows_visitor(self, cookie_id: str, tag_str: str) -> bool:
+        """Whether the visitor is counted for the tag, in the buffer or in the database"""
+        with self._lock:
+            if (cookie_id, tag_str) in self._pending_cookies:
+                return True
+            badge_id = self._badge_ids.get(tag_str)
+        if badge_id is None:
+            badge = Badge.get_or_none(Badge.tag == tag_str)
+            if badge is None:
+                return False
+            badge_id = badge.id
+        return dedup_store.contains(badge_id, tag_str, cookie_id)
+
+    @connection_scope()
+    def get_count(self, tag_str: str) -> int:
+        """Current visit count for a tag including buffered increments"""
+        while True:
+            with self._lock:
+                generation = self._generation
+                if tag_str in self._base_visits:
+                    return self._visible_count(tag_str)
+            badge = Badge.get_or_none(Badge.tag == tag_str)
+            with self._lock:
+                if generation != self._generation:
+                    continue
+                return (badge.visits if badge else 0) + self._pending_visits.get(tag_str, 0)
+
+    def get_counts(self, tags: List[str], read_visits: Callable[[List[str]], Dict[str, int]]) -> Dict[str, int]:
+        """Like get_count for many tags; read_visits loads stored counts of the unknown ones"""
+        while True:
+            with self._lock:
+                generation = self._generation
+                counts = {tag_str: self._visible_count(tag_str) for tag_str in tags if tag_str in self._base_visits}
+            missing = [tag_str for tag_str in tags if tag_str not in counts]
+            stored = read_visits(missing) if missing else {}
+            with self._lock:
+                if generation != self._generation:
+                    continue
+                for tag_str in missing:
+                    counts[tag_str] = stored.get(tag_str, 0) + self._pending_visits.get(tag_str, 0)
+                return counts
+
+    def _visible_count(self, tag_str: str) -> int:
+        return self._base_visits.get(tag_str, 0) + self._pending_visits.get(tag_str, 0)
+
+    def flush(self) -> int:
+        """Write all buffered events to the database, returning how many were flushed"""
+        with self._flush_lock:
+            with self._lock:
+                visits = dict(self._pending_visits)
+                created = dict(self._pending_created)
+                cookies = dict(self._pending_cookies)
+            if not cookies:
+                with self._lock:
+                    self._base_visits.clear()
+                    self._badge_ids.clear()
+                    self._generation += 1
+                return 0
+
+            # One transaction per shard; a failing shard keeps its events for the next flush
+            shards: Dict[int, list] = {}
+            for key in cookies:
+                shards.setdefault(shard_for_tag(key[1]), []).append(key)
+            flushed = 0
+            for shard, keys in shards.items():
+                shard_visits = {tag_str: visits[tag_str] for tag_str in {tag for _, tag in keys}}
+                with use_shard(shard):
+                    if not self._flush_shard(shard_visits, created, {key: cookies[key] for key in keys}):
+                        continue
+                # The flushed amounts now live in the database: the cached base counts
+                # go with them in the same step, and readers of older state retry
+                with self._lock:
+                    for tag_str, amount in shard_visits.items():
+                        remaining = self._pending_visits.get(tag_str, 0) - amount
+                        if remaining > 0:
+                            self._pending_visits[tag_str] = remaining
+                        else:
+                            self._pending_visits.pop(tag_str, None)
+                        self._pending_created.pop(tag_str, None)
+                        self._base_visits.pop(tag_str, None)
+                        self._badge_ids.pop(tag_str, None)
+                    for key in keys:
+                        self._pending_cookies.pop(key, None)
+                    self._generation += 1
+                flushed += len(keys)
+
+            with self._lock:
+                self._base_visits.clear()
+                self._badge_ids.clear()
+                self._generation += 1
+
+            logger.debug(f"Flushed {flushed} buffered visits across {len(visits)} badges")
+            return flushed
+
+    @connection_scope()
+    def _flush_shard(self, visits: Dict[str, int], created: Dict[str, int], cookies: Dict[Tuple[str, str], int]) -> bool:
+        badge_ids = {}
+        visit_times: Dict[str, list] = {}
+        if HISTORY_ENABLED:
+            for (_, tag_str), last_visit in cookies.items():
+                visit_times.setdefault(tag_str, []).append(last_visit)
+        try:
+            with db_transaction_duration.time("flush"), db.atomic("IMMEDIATE"):
+                for tag_str in visits:
+                    badge, _ = Badge.get_or_create(
+                        tag=tag_str,
+                        defaults={'created': created.get(tag_str, int(time.time()))}
+                    )
+                    badge_ids[tag_str] = badge.id
+                    Badge.update(visits=Badge.visits + visits[tag_str]).where(Badge.id == badge.id).execute()
+                    if tag_str in visit_times:
+                        add_hourly_visits(badge.id, hourly_increments(visit_times[tag_str]))
+                dedup_store.add_many(
+                    (badge_ids[tag_str], tag_str, cookie_id, last_visit)
+                    for (cookie_id, tag_str), last_visit in cookies.items()
+                    if isinstance(cookie_id, str)
+                )
+            return True
+        except Exception as e:
+            logger.error(f"Error flushing visit buffer ({len(cookies)} events kept for retry): {e}")
+            for badge_id in badge_ids.values():
+                dedup_store.forget(badge_id)
+            return False
+
+    def start(self):
+        """Start the background flush thread"""
+        if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="visit-buffer-flush", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Visit write buffer started (flush interval {self.flush_interval}s, max events {self.max_events})"
+        )
+
+    def stop(self):
+        """Stop the flush thread and write out anything still buffered"""
+        if self._thread is not None:
+            self._stop.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        flushed = self.flush()
+        if flushed:
+            logger.info(f"Flushed {flushed} buffered visits on shutdown")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+visit_buffer = VisitBuffer(
+    flush_interval=WRITE_BUFFER_FLUSH_INTERVAL,
+    max_events=WRITE_BUFFER_MAX_EVENTS,
+    enabled=WRITE_BUFFER_ENABLED,
+)
@@ -50,6 +50,116 @@ def main():
         [sys.executable, "tests/test_simple.py"],
         "Unit Tests (Database & Core Logic)"
     ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_write_buffer.py"],
+        "Write Buffer Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_badge_renderer.py"],
+        "Badge Renderer Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_cache.py"],
+        "Cache Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_aggregates.py"],
+        "Aggregate Statistics Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_executor.py"],
+        "Database Executor Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_dedup.py"],
+        "Dedup Store Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_maintenance.py"],
+        "Maintenance Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_metrics.py"],
+        "Metrics Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_static_cache.py"],
+        "Static Cache Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_sharding.py"],
+        "Sharding Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_coordinator.py"],
+        "Coordinator Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_storage.py"],
+        "Storage Backend Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_http_caching.py"],
+        "HTTP Caching Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_batch_stats.py"],
+        "Batch Stats Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_history.py"],
+        "Visit History Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_visitor_cookies.py"],
+        "Visitor Cookie Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_rate_limit.py"],
+        "Rate Limiter Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_coalesce.py"],
+        "Coalescing Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_seen_index.py"],
+        "Seen Visitor Index Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_badge_params.py"],
+        "Badge Parameter Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_admin.py"],
+        "Admin Export/Import Tests"
+    ))
+
+    test_results.append(run_command(
+        [sys.executable, "tests/test_async_db.py"],
+        "Async Data Access Tests"
+    ))
     
     # Test 2: FastAPI Integration tests (currently disabled due to database isolation issues)
     print("\n[SKIP] FastAPI Integration Tests - Skipped due to database isolation issues")
@@ -0,0 +1,198 @@
+import io
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src.models import initialize_database, Badge, Cookie, VisitorKey
+from src import admin
+from src.admin import (
+    export_records, import_records, read_records, backup_database, migrate_cookies_to_keys,
+    BackupRestartedError, _restart_watch,
+)
+from src.dedup import HashedDedupStore
+
+def _seed():
+    initialize_database()
+    Cookie.delete().execute()
+    Badge.delete().execute()
+    now = int(time.time())
+    for i in range(25):
+        badge = Badge.create(tag=f"admin-{i}", visits=i + 1, created=now - i)
+        for j in range(i % 3):
+            Cookie.create(cookie_id=f"visitor-{j}", badge=badge, last_visit=now - j)
+    return {tag: (visits, created) for tag, visits, created in Badge.select(Badge.tag, Badge.visits, Badge.created).tuples()}
+
+def test_export_import_round_trip():
+    """Test that an export replaces into an empty database unchanged, in both formats"""
+    print("Testing export and import...")
+    before = _seed()
+    cookies_before = Cookie.select().count()
+    for fmt in ("ndjson", "csv"):
+        out = io.StringIO()
+        counts = export_records(out, fmt, cookies=True, chunk_size=7)
+        assert counts == {"badge": 25, "cookie": cookies_before}
+
+        Cookie.delete().execute()
+        Badge.delete().execute()
+        imported = import_records(read_records(io.StringIO(out.getvalue()), fmt), "replace", batch_size=4)
+        assert imported == {"badge": 25, "cookie": cookies_before, "skipped": 0}
+        after = {tag: (visits, created) for tag, visits, created in Badge.select(Badge.tag, Badge.visits, Badge.created).tuples()}
+        assert after == before, f"{fmt} round trip changed the data"
+        assert Cookie.select().count() == cookies_before
+    print(f"(checkmark) 25 badges and {cookies_before} cookies round-tripped as NDJSON and CSV")
+
+def test_merge_and_replace():
+    """Test that merge adds counts while replace overwrites them"""
+    print("Testing merge and replace...")
+    before = _seed()
+    out = io.StringIO()
+    export_records(out, "ndjson", cookies=True)
+    exported = out.getvalue()
+
+    import_records(read_records(io.StringIO(exported)), "merge")
+    merged = dict(Badge.select(Badge.tag, Badge.visits).tuples())
+    assert all(merged[tag] == 2 * visits for tag, (visits, _) in before.items())
+    cookies = Cookie.select().count()
+
+    import_records(read_records(io.StringIO(exported)), "replace")
+    replaced = dict(Badge.select(Badge.tag, Badge.visits).tuples())
+    assert all(replaced[tag] == visits for tag, (visits, _) in before.items())
+    assert Cookie.select().count() == cookies, "Cookies are upserted, never duplicated"
+
+    orphan = '{"type":"cookie","tag":"no-such-badge","cookie_id":"v","last_visit":1}\n'
+    assert import_records(read_records(io.StringIO(orphan)))["skipped"] == 1
+    print("(checkmark) Merge sums visits, replace overwrites them")
+
+def test_migrate_to_hashed_keys():
+    """Test that every cookie row becomes a hashed key the hashed store recognises"""
+    print("Testing dedup migration...")
+    _seed()
+    VisitorKey.delete().execute()
+    cookies = list(Cookie.select(Cookie.badge, Badge.tag, Cookie.cookie_id).join(Badge).tuples())
+    assert migrate_cookies_to_keys(batch_size=5) == {"migrated": len(cookies), "dropped": 0}
+    assert migrate_cookies_to_keys(batch_size=5)["migrated"] == len(cookies), "Running again is harmless"
+    assert VisitorKey.select().count() == len(cookies)
+
+    store = HashedDedupStore()
+    assert all(store.contains(*cookie) for cookie in cookies)
+    assert migrate_cookies_to_keys(batch_size=5, drop_cookies=True)["dropped"] == len(cookies), "Dropped in batches"
+    assert Cookie.select().count() == 0
+    assert not store.check_and_add(*cookies[0], int(time.time())), "Migrated visitor stays counted"
+    print(f"(checkmark) {len(cookies)} cookie rows migrated to hashed keys")
+
+def test_hashed_backend_import_and_export():
+    """Test that cookie records import as hashed keys and that exporting them is refused"""
+    print("Testing import and export with hashed dedup...")
+    _seed()
+    VisitorKey.delete().execute()
+    original = admin.DEDUP_BACKEND
+    admin.DEDUP_BACKEND = "hashed"
+    try:
+        records = '{"type":"cookie","tag":"admin-3","cookie_id":"imported","last_visit":100}\n'
+        assert import_records(read_records(io.StringIO(records)))["cookie"] == 1
+        badge = Badge.get(Badge.tag == "admin-3")
+        assert HashedDedupStore().contains(badge.id, badge.tag, "imported")
+        assert Cookie.select().where(Cookie.cookie_id == "imported").count() == 0
+
+        assert export_records(io.StringIO())["badge"] == 25, "Badges still export"
+        try:
+            export_records(io.StringIO(), cookies=True)
+            raise AssertionError("Exporting cookies with hashed dedup should be refused")
+        except ValueError as e:
+            assert "DEDUP_BACKEND=hashed" in str(e)
+    finally:
+        admin.DEDUP_BACKEND = original
+    print("(checkmark) Cookie records become visitor keys; cookie export is refused")
+
+def test_backup_and_cli():
+    """Test the online backup and the command-line entry point"""
+    print("Testing backup and CLI...")
+    before = _seed()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "backup.db")
+        assert backup_database(path, pages=1, sleep=0) == [path]
+        with sqlite3.connect(path) as copy:
+            assert dict(copy.execute("SELECT tag, visits FROM badge").fetchall()) == {
+                tag: visits for tag, (visits, _) in before.items()
+            }
+
+        # The CLI against a database file, as it runs in production
+        env = {key: value for key, value in os.environ.items() if key != "TESTING"}
+        env.update({"DATABASE_PATH": os.path.join(tmp_dir, "cli.db"), "LOG_LEVEL": "WARNING"})
+        source = os.path.join(tmp_dir, "badges.ndjson")
+        with open(source, "w", encoding="utf-8") as f:
+            f.write('{"type":"badge","tag":"cli","visits":5,"created":100}\n')
+            f.write('{"type":"cookie","tag":"cli","cookie_id":"visitor","last_visit":100}\n')
+        export_path = os.path.join(tmp_dir, "badges.csv")
+        root = Path(__file__).parent.parent
+        for args in (["import", source], ["import", source, "--mode", "merge"], ["export", "--cookies", "-o", export_path]):
+            subprocess.run([sys.executable, "-m", "src.admin", *args], env=env, cwd=root, check=True, capture_output=True)
+        with open(export_path, encoding="utf-8") as f:
+            assert f.read().splitlines() == [
+                "type,tag,visits,created,cookie_id,last_visit",
+                "badge,cli,10,100,,",
+                "cookie,cli,,,visitor,100",
+            ]
+    print("(checkmark) Backup copied every badge; CLI export/import works")
+
+def test_backup_gives_up_on_restarts():
+    """Test that a stepped backup restarted by concurrent writes fails instead of looping"""
+    print("Testing backup restart detection...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "live.db")
+        with sqlite3.connect(path) as setup:
+            setup.execute("CREATE TABLE visit (id INTEGER PRIMARY KEY, payload TEXT)")
+            setup.executemany("INSERT INTO visit (payload) VALUES (?)", [("x" * 500,)] * 200)
+        source = sqlite3.connect(path)
+        writer = sqlite3.connect(path, isolation_level=None)
+        watch = _restart_watch(2)
+
+        def progress(status, remaining, total):
+            watch(status, remaining, total)
+            writer.execute("INSERT INTO visit (payload) VALUES ('y')")
+
+        try:
+            with sqlite3.connect(os.path.join(tmp_dir, "copy.db")) as target:
+                source.backup(target, pages=1, progress=progress)
+            raise AssertionError("Backup of a database written every step should not finish")
+        except BackupRestartedError as e:
+            assert "3 times" in str(e)
+        finally:
+            source.close()
+            writer.close()
+    print("(checkmark) Restarted backup fails with a clear error")
+
+def main():
+    """Run all tests"""
+    print("Starting admin tests...\n")
+
+    try:
+        test_export_import_round_trip()
+        test_merge_and_replace()
+        test_migrate_to_hashed_keys()
+        test_hashed_backend_import_and_export()
+        test_backup_and_cli()
+        test_backup_gives_up_on_restarts()
+
+        print("\nAll admin tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
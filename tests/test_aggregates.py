@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src.models import initialize_database, close_database, Badge, Cookie, db
+from src.aggregates import SystemAggregates, system_aggregates
+from src.services import update_visit_count, get_system_statistics
+
+def test_load_matches_database():
+    """Test that seeding from the database matches a full scan"""
+    print("Testing aggregate seeding...")
+    initialize_database()
+    Cookie.delete().execute()
+    Badge.delete().execute()
+    now = int(time.time())
+    Badge.create(tag="agg-old", visits=5, created=now - 3 * 86400)
+    Badge.create(tag="agg-new", visits=2, created=now - 60)
+
+    aggregates = SystemAggregates()
+    aggregates.load(now)
+    assert aggregates.snapshot(now) == {
+        "total_tracked_tags": 2,
+        "total_visits": 7,
+        "new_badges_today": 1,
+    }
+    print("(checkmark) Seeded aggregates match the database")
+
+def test_rolling_window_expires_old_badges():
+    """Test that badge creations fall out of the 24 hour window"""
+    print("Testing rolling window...")
+    aggregates = SystemAggregates(window_seconds=3600, bucket_seconds=60)
+    aggregates.loaded = True
+    now = 1_000_000
+    aggregates.record_badge_created(now)
+    aggregates.record_visits(3)
+    assert aggregates.snapshot(now)["new_badges_today"] == 1
+    later = aggregates.snapshot(now + 3600 + 60)
+    assert later["new_badges_today"] == 0
+    assert later["total_tracked_tags"] == 1
+    assert later["total_visits"] == 3
+    print("(checkmark) Old creations expire from the window")
+
+def test_visits_update_system_statistics():
+    """Test that visits keep the loaded aggregates current"""
+    print("Testing incremental statistics...")
+    initialize_database()
+    system_aggregates.load()
+    before = get_system_statistics()
+    update_visit_count(None, "agg-incremental")
+    update_visit_count(None, "agg-incremental")
+    after = get_system_statistics()
+    system_aggregates.reset()
+    assert after["total_tracked_tags"] == before["total_tracked_tags"] + 1
+    assert after["total_visits"] == before["total_visits"] + 2
+    assert after["new_badges_today"] == before["new_badges_today"] + 1
+    assert after == get_system_statistics(), "Aggregates should agree with a full scan"
+    print("(checkmark) Statistics updated incrementally")
+
+def cleanup_database():
+    """Clean up test database"""
+    try:
+        db.drop_tables([Badge, Cookie])
+        close_database()
+    except Exception as e:
+        print(f"Warning during cleanup: {e}")
+
+def main():
+    """Run all tests"""
+    print("Starting aggregate tests...\n")
+
+    try:
+        test_load_matches_database()
+        test_rolling_window_expires_old_badges()
+        test_visits_update_system_statistics()
+
+        print("\nAll aggregate tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+    finally:
+        cleanup_database()
+
+if __name__ == "__main__":
+    exit(main())
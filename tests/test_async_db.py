@@ -0,0 +1,135 @@
+import os
+import sys
+import asyncio
+import threading
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src import async_db
+from src.async_db import VisitWriter
+from src.aggregates import system_aggregates
+from src.cache import tag_cache
+from src.executor import db_executor, DatabaseBusyError
+from src.models import initialize_database, Badge
+
+def test_writes_run_on_the_shard_writer():
+    """Test that visits are written by the shard's writer thread on one long-lived connection"""
+    print("Testing shard writer...")
+    initialize_database()
+    from src import services
+    writer = VisitWriter(max_queue=10)
+    writer.start()
+    seen = []
+    original = services.update_visit_counts
+
+    def tracked(cookie_values, tag_str):
+        from src.models import db
+        seen.append((threading.current_thread().name, id(db.connection())))
+        return original(cookie_values, tag_str)
+
+    services.update_visit_counts = tracked
+    try:
+        async def scenario():
+            first = await asyncio.wrap_future(writer.submit([None], "writer-tag"))
+            second = await asyncio.wrap_future(writer.submit([None, None], "writer-tag"))
+            return first, second
+
+        first, second = asyncio.run(scenario())
+    finally:
+        services.update_visit_counts = original
+        writer.stop()
+    assert [count for count, _, _ in first + second] == [1, 2, 3]
+    assert seen[0] == seen[1] and seen[0][0] == "visit-writer-0"
+    assert writer.stats()["writes"] == 2 and writer.stats()["queue_depth"] == 0
+    assert not writer.running
+    print("(checkmark) Both writes ran on visit-writer-0 over the same connection")
+
+def test_full_writer_queue_is_rejected():
+    """Test that a write beyond max_queue fails fast"""
+    print("Testing writer queue bound...")
+    writer = VisitWriter(max_queue=0)
+    writer.start()
+    try:
+        writer.submit([None], "writer-busy")
+        assert False, "expected DatabaseBusyError"
+    except DatabaseBusyError:
+        pass
+    finally:
+        writer.stop()
+    assert writer.stats()["rejected"] == 1
+    print("(checkmark) Full queue rejected")
+
+def test_concurrent_visits_are_counted_once():
+    """Test that concurrent record_visit calls through the writers count every new visitor"""
+    print("Testing concurrent visits...")
+    initialize_database()
+    async_db.start()
+    try:
+        async def scenario():
+            return await asyncio.gather(*(
+                async_db.record_visit(None, f"writer-herd-{i % 2}") for i in range(32)
+            ))
+
+        results = asyncio.run(scenario())
+    finally:
+        async_db.stop()
+    assert all(incremented and cookie for _, incremented, cookie in results)
+    assert Badge.get(Badge.tag == "writer-herd-0").visits == 16
+    assert Badge.get(Badge.tag == "writer-herd-1").visits == 16
+    assert async_db.visit_writer.stats()["writes"] < 32
+    print(f"(checkmark) 32 visits written in {async_db.visit_writer.stats()['writes']} writes")
+
+def test_reads_stay_on_the_event_loop_when_possible():
+    """Test that cached counts and loaded aggregates are returned without the database pool"""
+    print("Testing loop-side reads...")
+    initialize_database()
+    tag_cache.set_max("loop-cached", 7)
+    system_aggregates.load()
+    try:
+        submitted = db_executor.stats()["submitted"]
+
+        async def scenario():
+            count = await async_db.get_tag_visit_count("loop-cached")
+            counts = await async_db.get_tag_visit_counts(["loop-cached"])
+            stats = await async_db.get_system_statistics()
+            return count, counts, stats
+
+        count, counts, stats = asyncio.run(scenario())
+        assert count == 7 and counts == {"loop-cached": 7}
+        assert stats == system_aggregates.snapshot()
+        assert db_executor.stats()["submitted"] == submitted
+
+        missing = asyncio.run(async_db.get_tag_visit_counts(["loop-cached", "loop-missing"]))
+        assert missing == {"loop-cached": 7, "loop-missing": 0}
+        assert db_executor.stats()["submitted"] == submitted + 1
+    finally:
+        system_aggregates.reset()
+    print("(checkmark) Only the cache miss went to the pool")
+
+def main():
+    """Run all tests"""
+    print("Starting async data access tests...\n")
+
+    try:
+        test_writes_run_on_the_shard_writer()
+        test_full_writer_queue_is_rejected()
+        test_concurrent_visits_are_counted_once()
+        test_reads_stay_on_the_event_loop_when_possible()
+
+        print("\nAll async data access tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,76 @@
+import os
+import sys
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from fastapi.testclient import TestClient
+from src.badge_params import badge_variant, parse_tag
+from src.utils import build_shields_url
+
+def test_variant_matches_shields_url():
+    """Test that the cached URL pieces give the same URL as building it from scratch"""
+    print("Testing badge variants...")
+    variant = badge_variant("my views", "blue", "flat-square", "github")
+    assert (variant.label, variant.style, variant.logo) == ("my views", "flat-square", "github")
+    assert variant.shields_url(42) == build_shields_url("my views", 42, "blue", "flat-square", "github")
+    assert variant.shields_url(7) == "https://img.shields.io/badge/my%20views-7-blue.svg?style=flat-square&logo=github"
+    assert not variant.render_locally, "Logos are only rendered by shields.io"
+
+    hits = badge_variant.cache_info().hits
+    assert badge_variant("my views", "blue", "flat-square", "github") is variant
+    assert badge_variant.cache_info().hits == hits + 1
+    assert badge_variant("views", "blue", "flat", "").etag_variant != badge_variant("views", "blue", "plastic", "").etag_variant
+    print("(checkmark) One validated variant per parameter combination")
+
+def test_invalid_parameters():
+    """Test that invalid values raise ValueError and are rejected with 400"""
+    print("Testing invalid parameters...")
+    for label, color, style in (("", "blue", "flat"), ("x" * 21, "blue", "flat"), ("views", "b", "flat")):
+        try:
+            badge_variant(label, color, style, "")
+            assert False, f"Accepted {label!r}, {color!r}"
+        except ValueError:
+            pass
+    assert parse_tag("user/project") == "user/project"
+    for tag in ("", "t" * 201):
+        try:
+            parse_tag(tag)
+            assert False, f"Accepted tag {tag!r}"
+        except ValueError:
+            pass
+
+    from src.main import app
+    with TestClient(app, follow_redirects=False) as client:
+        assert client.get("/badge", params={"tag": "ok", "color": "b"}).status_code == 400
+        assert client.get("/badge", params={"tag": ""}).status_code == 400
+        response = client.get("/badge", params={"tag": "params-test", "label": "hits"})
+        assert response.status_code in (200, 302)
+        if response.status_code == 302:
+            assert response.headers["location"].startswith("https://img.shields.io/badge/hits-1-")
+    print("(checkmark) Invalid parameters rejected")
+
+def main():
+    """Run all tests"""
+    print("Starting badge parameter tests...\n")
+
+    try:
+        test_variant_matches_shields_url()
+        test_invalid_parameters()
+
+        print("\nAll badge parameter tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,76 @@
+import os
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src.badge_renderer import render_badge_svg, resolve_color, text_width, SUPPORTED_STYLES, _VERDANA_11_WIDTHS
+
+def test_all_styles_render_valid_svg():
+    """Test that every supported style produces well-formed SVG"""
+    print("Testing badge styles...")
+    for style in SUPPORTED_STYLES:
+        svg = render_badge_svg("visits", 1234, "4ade80", style)
+        root = ET.fromstring(svg)
+        assert root.tag.endswith("svg"), f"{style} did not render an svg root"
+        assert int(root.get("width")) > 0
+        assert b"1234" in svg
+    assert b'height="28"' in render_badge_svg("visits", 1, "blue", "for-the-badge")
+    assert b'height="18"' in render_badge_svg("visits", 1, "blue", "plastic")
+    print("(checkmark) All styles rendered")
+
+def test_render_cache_returns_same_bytes():
+    """Test that repeat renders come from the LRU cache"""
+    print("Testing render cache...")
+    first = render_badge_svg("cached", 7, "red", "flat")
+    hits_before = render_badge_svg.cache_info().hits
+    second = render_badge_svg("cached", 7, "red", "flat")
+    assert first is second
+    assert render_badge_svg.cache_info().hits == hits_before + 1
+    print("(checkmark) Render cache hit")
+
+def test_text_is_escaped_and_measured():
+    """Test label escaping and glyph-width measurement"""
+    print("Testing escaping and text width...")
+    svg = render_badge_svg("<b>&", 1, "red", "flat")
+    ET.fromstring(svg)
+    assert b"&lt;b&gt;&amp;" in svg
+    assert text_width("mmm", _VERDANA_11_WIDTHS) > text_width("iii", _VERDANA_11_WIDTHS)
+    print("(checkmark) Escaping and measurement work")
+
+def test_color_resolution():
+    """Test named, hex and invalid colors"""
+    print("Testing color resolution...")
+    assert resolve_color("brightgreen") == "#4c1"
+    assert resolve_color("4ADE80") == "#4ade80"
+    assert resolve_color("fff") == "#fff"
+    assert resolve_color("url(#x)") == "#9f9f9f"
+    print("(checkmark) Colors resolved")
+
+def main():
+    """Run all tests"""
+    print("Starting badge renderer tests...\n")
+
+    try:
+        test_all_styles_render_valid_svg()
+        test_render_cache_returns_same_bytes()
+        test_text_is_escaped_and_measured()
+        test_color_resolution()
+
+        print("\nAll badge renderer tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
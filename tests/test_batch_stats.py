@@ -0,0 +1,86 @@
+import os
+import sys
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from fastapi.testclient import TestClient
+from src import storage as storage_module
+from src.models import initialize_database
+from src.cache import tag_cache
+from src.services import update_visit_count, get_tag_visit_counts
+
+def test_counts_from_cache_and_storage():
+    """Test that cached tags are not read again and misses are loaded in chunks"""
+    print("Testing batch count lookup...")
+    initialize_database()
+    tags = [f"batch-{i}" for i in range(7)]
+    for tag in tags[:5]:
+        update_visit_count(None, tag)
+    tag_cache.clear()
+    tag_cache.set("batch-0", 1)
+
+    chunk_size = storage_module.COUNT_QUERY_CHUNK_SIZE
+    storage_module.COUNT_QUERY_CHUNK_SIZE = 2
+    try:
+        counts = get_tag_visit_counts(tags)
+    finally:
+        storage_module.COUNT_QUERY_CHUNK_SIZE = chunk_size
+    assert list(counts) == tags, "Counts come back in request order"
+    assert counts == {**dict.fromkeys(tags[:5], 1), "batch-5": 0, "batch-6": 0}
+    assert tag_cache.get("batch-3") == 1, "Loaded counts are cached"
+    print("(checkmark) Batch counts served from cache and chunked queries")
+
+def test_batch_endpoints():
+    """Test GET and POST /api/stats-batch"""
+    print("Testing batch endpoints...")
+    from src.main import app
+
+    with TestClient(app, follow_redirects=False) as client:
+        client.get("/badge?tag=batch-api-a")
+        client.get("/badge?tag=batch-api-b")
+
+        response = client.get("/api/stats-batch?tag=batch-api-a&tag=batch-api-none&tag=batch-api-a")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        body = response.json()
+        assert body["stats"] == [
+            {"tag": "batch-api-a", "visit_count": 1},
+            {"tag": "batch-api-none", "visit_count": 0},
+        ], "Duplicates are dropped and order is kept"
+
+        posted = client.post("/api/stats-batch", json={"tags": ["batch-api-b", "batch-api-a"]})
+        assert [entry["tag"] for entry in posted.json()["stats"]] == ["batch-api-b", "batch-api-a"]
+
+        assert client.get("/api/stats-batch").status_code == 400
+        assert client.post("/api/stats-batch", json={"tags": ["x" * 201]}).status_code == 400
+        assert client.post("/api/stats-batch", json={"tags": ["t"] * 501}).status_code == 400
+        assert client.get("/api/stats/batch-api-a").json()["visit_count"] == 1, "Single-tag route unaffected"
+        client.get("/badge?tag=batch")
+        assert client.get("/api/stats/batch").json()["visit_count"] == 1, "A tag named batch is reachable"
+    print("(checkmark) Batch endpoints return counts in request order")
+
+def main():
+    """Run all tests"""
+    print("Starting batch stats tests...\n")
+
+    try:
+        test_counts_from_cache_and_storage()
+        test_batch_endpoints()
+
+        print("\nAll batch stats tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src.cache import TTLCache
+from src.models import initialize_database, close_database, Badge, Cookie, db
+from src.services import update_visit_count, get_tag_visit_count
+from src.cache import tag_cache
+
+def test_hits_misses_and_eviction():
+    """Test LRU eviction and hit/miss accounting"""
+    print("Testing cache eviction...")
+    cache = TTLCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now most recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None, "Least recently used entry should be evicted"
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (2, 1, 1, 2)
+    print("(checkmark) Eviction and counters work")
+
+def test_entries_expire():
+    """Test TTL expiry"""
+    print("Testing cache expiry...")
+    cache = TTLCache(max_size=10, ttl_seconds=0.05)
+    cache.set("a", 1)
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    print("(checkmark) Entries expire")
+
+def test_get_many():
+    """Test multi-get returns only fresh entries and counts each key"""
+    print("Testing cache multi-get...")
+    cache = TTLCache(max_size=10, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    print("(checkmark) Multi-get works")
+
+def test_set_max_keeps_larger_count():
+    """Test that a stale read cannot overwrite a newer count"""
+    print("Testing monotonic updates...")
+    cache = TTLCache(max_size=10, ttl_seconds=60)
+    cache.set_max("tag", 5)
+    cache.set_max("tag", 4)
+    assert cache.get("tag") == 5
+    cache.set_max("tag", 6)
+    assert cache.get("tag") == 6
+    print("(checkmark) Larger count kept")
+
+def test_visits_update_cache_in_place():
+    """Test that update_visit_count refreshes the cached count"""
+    print("Testing cache update on visit...")
+    initialize_database()
+    tag_cache.clear()
+    update_visit_count(None, "cache-test")
+    hits_before = tag_cache.hits
+    assert get_tag_visit_count("cache-test") == 1
+    assert tag_cache.hits == hits_before + 1, "Count should be served from the cache"
+    update_visit_count(None, "cache-test")
+    assert get_tag_visit_count("cache-test") == 2
+    print("(checkmark) Cache updated in place")
+
+def cleanup_database():
+    """Clean up test database"""
+    try:
+        db.drop_tables([Badge, Cookie])
+        close_database()
+    except Exception as e:
+        print(f"Warning during cleanup: {e}")
+
+def main():
+    """Run all tests"""
+    print("Starting cache tests...\n")
+
+    try:
+        test_hits_misses_and_eviction()
+        test_entries_expire()
+        test_get_many()
+        test_set_max_keeps_larger_count()
+        test_visits_update_cache_in_place()
+
+        print("\nAll cache tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+    finally:
+        cleanup_database()
+
+if __name__ == "__main__":
+    exit(main())
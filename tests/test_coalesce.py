@@ -0,0 +1,128 @@
+import os
+import sys
+import asyncio
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src.coalesce import SingleFlight, Batcher
+from src.models import initialize_database, Badge
+from src.storage import SqliteBackend
+
+def test_single_flight_shares_one_call():
+    """Test that concurrent awaits of one key run the call once"""
+    print("Testing single-flight reads...")
+    flight = SingleFlight()
+    calls = []
+
+    async def lookup(key):
+        calls.append(key)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def scenario():
+        results = await asyncio.gather(*(flight.run("tag", lambda: lookup("tag")) for _ in range(10)))
+        other = await flight.run("other", lambda: lookup("other"))
+
+        # A caller that gives up does not cancel the shared lookup
+        first = asyncio.ensure_future(flight.run("cancel", lambda: lookup("cancel")))
+        second = asyncio.ensure_future(flight.run("cancel", lambda: lookup("cancel")))
+        await asyncio.sleep(0)
+        first.cancel()
+        return results, other, await second
+
+    results, other, survivor = asyncio.run(scenario())
+    assert results == [1] * 10 and other == 2 and survivor == 3
+    assert calls == ["tag", "other", "cancel"] and flight.shared == 10
+    print("(checkmark) Ten reads, one lookup")
+
+def test_batcher_folds_waiting_items():
+    """Test that items submitted while a batch runs form the next batch"""
+    print("Testing batched writes...")
+    batcher = Batcher()
+    batches = []
+
+    async def run_batch(items):
+        batches.append(list(items))
+        await asyncio.sleep(0.05)
+        return [item * 10 for item in items]
+
+    async def failing(items):
+        raise RuntimeError("disk full")
+
+    async def scenario():
+        first = asyncio.ensure_future(batcher.submit("tag", 0, run_batch))
+        await asyncio.sleep(0.01)
+        rest = await asyncio.gather(*(batcher.submit("tag", item, run_batch) for item in range(1, 6)))
+        try:
+            await batcher.submit("tag", 1, failing)
+            assert False, "Batch errors reach the submitter"
+        except RuntimeError:
+            pass
+        return [await first] + rest, await batcher.submit("tag", 7, run_batch)
+
+    results, after_failure = asyncio.run(scenario())
+    assert batches == [[0], [1, 2, 3, 4, 5], [7]]
+    assert results == [item * 10 for item in range(6)]
+    assert after_failure == 70, "Key usable after a failed batch"
+    assert (batcher.batches, batcher.items) == (4, 8)
+    print("(checkmark) Waiting items written in one batch")
+
+def test_visits_share_one_transaction():
+    """Test that a batch of visits is counted like the same visits one by one"""
+    print("Testing batched visits...")
+    initialize_database()
+    backend = SqliteBackend()
+    now = int(time.time())
+    visits = [("visitor-1", True, now), ("visitor-2", True, now), ("visitor-1", False, now), ("visitor-3", False, now)]
+    results = backend.record_visits("coalesced", visits)
+
+    assert results == [(1, True, True), (2, True, False), (2, False, False), (3, True, False)]
+    assert Badge.get(Badge.tag == "coalesced").visits == 3
+    assert backend.record_visits("coalesced", [("visitor-2", False, now)]) == [(3, False, False)]
+    print("(checkmark) Four visits, three counted, one transaction")
+
+def test_concurrent_badge_requests():
+    """Test that concurrent /badge hits for one tag are all counted exactly once"""
+    print("Testing concurrent badge requests...")
+    from src.async_db import record_visit, visit_batches
+
+    async def scenario():
+        return await asyncio.gather(*(record_visit(None, "coalesced-herd") for _ in range(16)))
+
+    batches_before = visit_batches.batches
+    results = asyncio.run(scenario())
+    assert sorted(count for count, _, _ in results) == list(range(1, 17))
+    assert all(incremented and cookie for _, incremented, cookie in results)
+    assert Badge.get(Badge.tag == "coalesced-herd").visits == 16
+    batches = visit_batches.batches - batches_before
+    assert batches < 16
+    print(f"(checkmark) 16 visits written in {batches} batches")
+
+def main():
+    """Run all tests"""
+    print("Starting coalescing tests...\n")
+
+    try:
+        test_single_flight_shares_one_call()
+        test_batcher_folds_waiting_items()
+        test_visits_share_one_transaction()
+        test_concurrent_badge_requests()
+
+        print("\nAll coalescing tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
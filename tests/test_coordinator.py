@@ -0,0 +1,116 @@
+import os
+import sys
+import asyncio
+import tempfile
+import time
+import threading
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src.models import Badge, Cookie, db, close_database
+from src.coordinator import CoordinatorClient, CoordinatorError, serve
+
+class RunningCoordinator:
+    """Coordinator served from a background thread with its own event loop"""
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        ready = asyncio.Event()
+        self.task = self.loop.create_task(serve(self.socket_path, ready))
+        self.loop.create_task(self._signal_ready(ready))
+        self.loop.run_until_complete(self.task)
+
+    async def _signal_ready(self, ready):
+        await ready.wait()
+        self.ready.set()
+
+    def __enter__(self):
+        self.thread.start()
+        assert self.ready.wait(10), "Coordinator did not start"
+        return self
+
+    def __exit__(self, *exc_info):
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join(10)
+
+def test_visits_are_forwarded():
+    """Test that a worker client gets the same results the coordinator computes"""
+    print("Testing visit forwarding...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        socket_path = os.path.join(tmp_dir, "coordinator.sock")
+        with RunningCoordinator(socket_path):
+            client = CoordinatorClient(socket_path, timeout=5)
+            count, incremented, cookie_id = client.update_visit_count(None, "coordinated")
+            assert (count, incremented) == (1, True) and cookie_id
+            assert client.update_visit_count(cookie_id, "coordinated") == (1, False, None)
+
+            # Each thread that uses the client opens its own connection; they run one
+            # after another because the shared-cache test database does not wait for locks
+            results = []
+            for _ in range(8):
+                thread = threading.Thread(target=lambda: results.append(client.update_visit_count(None, "coordinated")))
+                thread.start()
+                thread.join()
+            assert [r[0] for r in results] == list(range(2, 10))
+
+            stats = client.get_system_statistics()
+            assert stats["total_visits"] >= 9
+            assert client.get_tag_visit_counts(["coordinated", "uncoordinated"]) == {"coordinated": 9, "uncoordinated": 0}
+            now = int(time.time())
+            assert sum(visits for _, visits in client.get_visit_history("coordinated", "day", now - 86400, now + 1)) == 9
+            client.close()
+        assert not os.path.exists(socket_path), "Socket removed on shutdown"
+    print("(checkmark) Visits and stats answered by the coordinator")
+
+def test_unreachable_coordinator():
+    """Test that a missing coordinator surfaces as CoordinatorError"""
+    print("Testing unreachable coordinator...")
+    client = CoordinatorClient("/nonexistent/coordinator.sock", timeout=1)
+    try:
+        client.update_visit_count(None, "nowhere")
+        raise AssertionError("Expected CoordinatorError")
+    except CoordinatorError:
+        pass
+    print("(checkmark) CoordinatorError raised")
+
+def cleanup_database():
+    """Clean up test database"""
+    try:
+        db.drop_tables([Badge, Cookie])
+        close_database()
+    except Exception as e:
+        print(f"Warning during cleanup: {e}")
+
+def main():
+    """Run all tests"""
+    print("Starting coordinator tests...\n")
+
+    try:
+        test_visits_are_forwarded()
+        test_unreachable_coordinator()
+
+        print("\nAll coordinator tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+    finally:
+        cleanup_database()
+
+if __name__ == "__main__":
+    exit(main())
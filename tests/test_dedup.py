@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src.models import initialize_database, close_database, Badge, Cookie, VisitorKey, BloomSlice, BloomPage, db
+from src.dedup import BloomDedupStore, CookieDedupStore, HashedDedupStore, slice_parameters, visitor_key
+
+def _badge(tag):
+    badge, _ = Badge.get_or_create(tag=tag, defaults={'created': int(time.time())})
+    return badge
+
+def test_slice_parameters():
+    """Test the textbook sizing: ~14.4 bits and 10 hashes per item at 0.1%"""
+    print("Testing Bloom sizing...")
+    num_bits, num_hashes = slice_parameters(1000, 0.001)
+    assert 14000 <= num_bits <= 14500, num_bits
+    assert num_hashes == 10
+    print(f"(checkmark) 1000 items at 0.1% -> {num_bits} bits, {num_hashes} hashes")
+
+def test_bloom_store_persists_and_grows():
+    """Test dedup decisions survive a reload and the filter scales past its initial capacity"""
+    print("Testing Bloom persistence and growth...")
+    initialize_database()
+    badge = _badge("bloom-test")
+    store = BloomDedupStore(error_rate=0.001, initial_capacity=16, cache_size=8)
+    now = int(time.time())
+
+    with db.atomic():
+        added = sum(store.check_and_add(badge.id, badge.tag, f"visitor-{i}", now) for i in range(100))
+    assert added >= 99, f"Expected at most one false positive, got {100 - added}"
+    assert BloomSlice.select().where(BloomSlice.badge == badge.id).count() >= 3, "Filter should have grown"
+
+    store.forget(badge.id)
+    assert all(store.contains(badge.id, badge.tag, f"visitor-{i}") for i in range(100)), "No false negatives after reload"
+    assert not store.check_and_add(badge.id, badge.tag, "visitor-5", now)
+    print("(checkmark) Bloom filter persisted and scaled")
+
+def test_bloom_false_positive_rate():
+    """Test that the measured false-positive rate stays near the configured one"""
+    print("Testing Bloom false-positive rate...")
+    initialize_database()
+    badge = _badge("bloom-fpr")
+    store = BloomDedupStore(error_rate=0.01, initial_capacity=500, cache_size=8)
+    now = int(time.time())
+    with db.atomic():
+        for i in range(2000):
+            store.check_and_add(badge.id, badge.tag, f"member-{i}", now)
+    false_positives = sum(store.contains(badge.id, badge.tag, f"outsider-{i}") for i in range(5000))
+    rate = false_positives / 5000
+    assert rate <= 0.02, f"False-positive rate {rate} is far above 0.01"
+    print(f"(checkmark) Measured false-positive rate {rate:.4f} (target 0.01)")
+
+def test_rolled_back_add_is_forgotten():
+    """Test that bits set in a rolled-back transaction do not linger in memory"""
+    print("Testing rollback handling...")
+    initialize_database()
+    badge = _badge("bloom-rollback")
+    store = BloomDedupStore(error_rate=0.001, initial_capacity=16, cache_size=8)
+    try:
+        with db.atomic():
+            store.check_and_add(badge.id, badge.tag, "visitor-x", int(time.time()))
+            raise RuntimeError("simulated failure")
+    except RuntimeError:
+        store.forget(badge.id)
+    assert not store.contains(badge.id, badge.tag, "visitor-x")
+    print("(checkmark) Rolled-back visitor not remembered")
+
+def test_cookie_store():
+    """Test the exact Cookie-row store"""
+    print("Testing cookie dedup store...")
+    initialize_database()
+    badge = _badge("cookie-store")
+    store = CookieDedupStore()
+    now = int(time.time())
+    assert store.check_and_add(badge.id, badge.tag, "visitor-a", now)
+    assert not store.check_and_add(badge.id, badge.tag, "visitor-a", now)
+    store.add_many([(badge.id, badge.tag, "visitor-a", now), (badge.id, badge.tag, "visitor-b", now)])
+    assert store.contains(badge.id, badge.tag, "visitor-b")
+    assert Cookie.select().where(Cookie.badge == badge.id).count() == 2
+    print("(checkmark) Cookie store deduplicates exactly")
+
+def test_hashed_store():
+    """Test the fixed-width hashed key store"""
+    print("Testing hashed dedup store...")
+    initialize_database()
+    badge = _badge("hashed-store")
+    other = _badge("hashed-store-other")
+    VisitorKey.delete().execute()
+    store = HashedDedupStore()
+    now = int(time.time())
+    assert store.check_and_add(badge.id, badge.tag, "visitor-a", now)
+    assert not store.check_and_add(badge.id, badge.tag, "visitor-a", now)
+    assert store.check_and_add(other.id, other.tag, "visitor-a", now), "Keys are per tag"
+    assert store.add_new(badge.id, badge.tag, "visitor-b", now)
+    store.add_many([(badge.id, badge.tag, "visitor-b", now), (badge.id, badge.tag, "visitor-c", now)])
+    assert store.contains(badge.id, badge.tag, "visitor-c") and not store.contains(badge.id, badge.tag, "visitor-d")
+    assert VisitorKey.select().count() == 4
+    assert -2 ** 63 <= visitor_key(badge.tag, "visitor-a") < 2 ** 63
+    print("(checkmark) Hashed store deduplicates per tag")
+
+def cleanup_database():
+    """Clean up test database"""
+    try:
+        db.drop_tables([Badge, Cookie, VisitorKey, BloomSlice, BloomPage])
+        close_database()
+    except Exception as e:
+        print(f"Warning during cleanup: {e}")
+
+def main():
+    """Run all tests"""
+    print("Starting dedup tests...\n")
+
+    try:
+        test_slice_parameters()
+        test_bloom_store_persists_and_grows()
+        test_bloom_false_positive_rate()
+        test_rolled_back_add_is_forgotten()
+        test_cookie_store()
+        test_hashed_store()
+
+        print("\nAll dedup tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+    finally:
+        cleanup_database()
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src.executor import DatabaseExecutor, DatabaseBusyError
+from src.models import initialize_database, close_database, Badge, Cookie, db
+from src.services import update_visit_count
+
+def test_calls_run_off_the_event_loop():
+    """Test that calls run in a pool thread and are accounted for"""
+    print("Testing executor thread hand-off...")
+    executor = DatabaseExecutor(max_workers=2, max_queue=10)
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        worker_thread = await executor.run(threading.get_ident)
+        return loop_thread, worker_thread
+
+    loop_thread, worker_thread = asyncio.run(scenario())
+    executor.shutdown()
+    assert loop_thread != worker_thread
+    stats = executor.stats()
+    assert stats["submitted"] == 1 and stats["completed"] == 1 and stats["queue_depth"] == 0
+    print("(checkmark) Call ran on a worker thread")
+
+def test_full_queue_is_rejected():
+    """Test that calls beyond max_queue fail fast instead of piling up"""
+    print("Testing queue bound...")
+    executor = DatabaseExecutor(max_workers=1, max_queue=2)
+
+    async def scenario():
+        slow = [asyncio.ensure_future(executor.run(time.sleep, 0.2)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert executor.stats()["queue_depth"] == 1, "One call should be running and one queued"
+        try:
+            await executor.run(time.sleep, 0)
+            raise AssertionError("Expected DatabaseBusyError")
+        except DatabaseBusyError:
+            pass
+        await asyncio.gather(*slow)
+
+    asyncio.run(scenario())
+    executor.shutdown()
+    stats = executor.stats()
+    assert stats["rejected"] == 1
+    assert stats["max_wait_ms"] >= 100, "Queued call should have waited for the running one"
+    print("(checkmark) Full queue rejected")
+
+def test_visits_through_pool_share_the_database():
+    """Test that pool threads write to the same database as the caller"""
+    print("Testing visits through the pool...")
+    initialize_database()
+    executor = DatabaseExecutor(max_workers=1, max_queue=10)
+
+    async def scenario():
+        for _ in range(3):
+            await executor.run(update_visit_count, None, "executor-test")
+
+    asyncio.run(scenario())
+    executor.shutdown()
+    assert Badge.get(Badge.tag == "executor-test").visits == 3
+    print("(checkmark) Pool threads share the database")
+
+def cleanup_database():
+    """Clean up test database"""
+    try:
+        db.drop_tables([Badge, Cookie])
+        close_database()
+    except Exception as e:
+        print(f"Warning during cleanup: {e}")
+
+def main():
+    """Run all tests"""
+    print("Starting executor tests...\n")
+
+    try:
+        test_calls_run_off_the_event_loop()
+        test_full_queue_is_rejected()
+        test_visits_through_pool_share_the_database()
+
+        print("\nAll executor tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+    finally:
+        cleanup_database()
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,142 @@
+import os
+import sys
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from fastapi.testclient import TestClient
+from src.models import initialize_database, VisitBucket
+from src.history import DAY, HOUR, MONTH, bucket_start, bucket_range, fold, rollup_sqlite
+from src.kvstore import KeyValueStore
+from src.storage import SqliteBackend
+from src.write_buffer import VisitBuffer
+
+def utc(*args) -> int:
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+# Two visits on 2024-01-31 and one on 2024-02-01; "now" is far enough ahead that
+# hourly buckets become days and days become months
+VISITS = [utc(2024, 1, 31, 10, 5), utc(2024, 1, 31, 10, 55), utc(2024, 2, 1, 23, 0)]
+LATER = utc(2026, 1, 1)
+
+def test_bucket_boundaries():
+    """Test UTC hour, day and calendar-month bucketing"""
+    print("Testing bucket boundaries...")
+    assert bucket_start(utc(2024, 2, 29, 13, 30), HOUR) == utc(2024, 2, 29, 13)
+    assert bucket_start(utc(2024, 2, 29, 13, 30), DAY) == utc(2024, 2, 29)
+    assert bucket_start(utc(2024, 2, 29, 13, 30), MONTH) == utc(2024, 2, 1)
+    assert list(bucket_range(utc(2023, 11, 15), utc(2024, 2, 1), MONTH)) == [
+        utc(2023, 11, 1), utc(2023, 12, 1), utc(2024, 1, 1)
+    ]
+    print("(checkmark) Buckets aligned to UTC calendar boundaries")
+
+def check_history(history, tag):
+    assert history(tag, HOUR, utc(2024, 1, 31, 9), utc(2024, 1, 31, 12)) == [
+        (utc(2024, 1, 31, 9), 0), (utc(2024, 1, 31, 10), 2), (utc(2024, 1, 31, 11), 0)
+    ]
+    assert history(tag, DAY, utc(2024, 1, 31), utc(2024, 2, 2)) == [(utc(2024, 1, 31), 2), (utc(2024, 2, 1), 1)]
+    assert history(tag, MONTH, utc(2024, 1, 1), utc(2024, 3, 1)) == [(utc(2024, 1, 1), 2), (utc(2024, 2, 1), 1)]
+
+def test_sqlite_history_and_rollup():
+    """Test hourly buckets on SQLite and that rollups keep day and month totals"""
+    print("Testing SQLite history...")
+    initialize_database()
+    VisitBucket.delete().execute()
+    backend = SqliteBackend()
+    for i, timestamp in enumerate(VISITS):
+        backend.record_visit(f"visitor-{i}", "history-sqlite", True, timestamp)
+    backend.record_visit("visitor-0", "history-sqlite", False, VISITS[0])
+    check_history(backend.visit_history, "history-sqlite")
+    assert VisitBucket.select().count() == 2, "One row per tag and hour"
+
+    assert rollup_sqlite(LATER)["buckets_folded"] == 4
+    assert VisitBucket.select().where(VisitBucket.resolution != MONTH).count() == 0
+    assert backend.visit_history("history-sqlite", MONTH, utc(2024, 1, 1), utc(2024, 3, 1)) == [
+        (utc(2024, 1, 1), 2), (utc(2024, 2, 1), 1)
+    ]
+    assert rollup_sqlite(LATER)["buckets_folded"] == 0
+    print("(checkmark) Hourly buckets rolled up without losing visits")
+
+def test_buffered_visits_reach_history():
+    """Test that a write-buffer flush writes hourly buckets"""
+    print("Testing buffered history...")
+    initialize_database()
+    buffer = VisitBuffer(flush_interval=60, max_events=1000)
+    for i, timestamp in enumerate(VISITS):
+        buffer.record(f"visitor-{i}", "history-buffer", True, timestamp)
+    buffer.flush()
+    check_history(SqliteBackend().visit_history, "history-buffer")
+    print("(checkmark) Buffered visits bucketed by hour")
+
+def test_kv_history_survives_restart():
+    """Test key-value history, its rollup and replay of both"""
+    print("Testing key-value history...")
+    directory = tempfile.mkdtemp()
+    try:
+        store = KeyValueStore(directory, fsync_interval=0, snapshot_interval=0)
+        store.open()
+        for i, timestamp in enumerate(VISITS):
+            store.record_visit(f"visitor-{i}", "history-kv", timestamp)
+        store.snapshot()
+        assert store.rollup(LATER) == 4
+        assert fold(store.history_rows("history-kv"), MONTH, utc(2024, 1, 1), utc(2024, 3, 1)) == [
+            (utc(2024, 1, 1), 2), (utc(2024, 2, 1), 1)
+        ]
+        # Crash after the rollup: it only exists in the log
+        store._log.close()
+
+        reopened = KeyValueStore(directory, fsync_interval=0, snapshot_interval=0)
+        reopened.open()
+        assert sorted(reopened.history_rows("history-kv")) == [(MONTH, utc(2024, 1, 1), 2), (MONTH, utc(2024, 2, 1), 1)]
+        reopened.close()
+    finally:
+        shutil.rmtree(directory)
+    print("(checkmark) Key-value history replayed with its rollup")
+
+def test_history_endpoint():
+    """Test /api/stats/{tag}/history"""
+    print("Testing history endpoint...")
+    from src.main import app
+
+    with TestClient(app, follow_redirects=False) as client:
+        client.get("/badge?tag=history-api")
+        response = client.get("/api/stats/history-api/history?resolution=hour")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["resolution"] == "hour" and len(body["buckets"]) >= 48
+        assert sum(bucket["visits"] for bucket in body["buckets"]) == 1
+        assert client.get("/api/stats/history-api/history?resolution=year").status_code == 400
+        assert client.get("/api/stats/history-api/history?resolution=hour&start=0").status_code == 400
+        assert client.get("/api/stats/history-api/history?start=10&end=5").status_code == 400
+    print("(checkmark) History served per resolution")
+
+def main():
+    """Run all tests"""
+    print("Starting history tests...\n")
+
+    try:
+        test_bucket_boundaries()
+        test_sqlite_history_and_rollup()
+        test_buffered_visits_reach_history()
+        test_kv_history_survives_restart()
+        test_history_endpoint()
+
+        print("\nAll history tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,116 @@
+import os
+import sys
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from fastapi.testclient import TestClient
+from src.http_cache import CachePolicy, CountClock, count_etag, tag_surrogate_key, badge_cache_policy, stats_cache_policy
+
+def test_cache_policy_headers():
+    """Test Cache-Control for disabled, private and shared policies"""
+    print("Testing cache policies...")
+    assert "no-store" in CachePolicy(0).headers()["Cache-Control"]
+    policy = CachePolicy(60, 300, public=True)
+    assert policy.headers()["Cache-Control"] == "public, max-age=60, stale-while-revalidate=300"
+    assert policy.headers(sets_cookie=True)["Cache-Control"].startswith("private"), "Set-Cookie is never shared"
+    assert CachePolicy(60, public=False).headers()["Cache-Control"] == "private, max-age=60"
+    print("(checkmark) Cache-Control built from the policy")
+
+def test_validators():
+    """Test that ETags and Last-Modified follow the count"""
+    print("Testing validators...")
+    assert count_etag("a", 1) != count_etag("a", 2)
+    assert count_etag("a", 1, "flat") != count_etag("a", 1, "plastic")
+    assert count_etag("a", 1, weak=True).startswith('W/"')
+    assert tag_surrogate_key("a") == tag_surrogate_key("a") != tag_surrogate_key("b")
+
+    clock = CountClock(max_size=2)
+    first = clock.last_modified("a", 1)
+    assert clock.last_modified("a", 1) == first
+    clock.last_modified("b", 1)
+    clock.last_modified("c", 1)
+    assert len(clock._seen) == 2, "Clock stays bounded"
+    print("(checkmark) Validators derived from the visit count")
+
+def test_badge_and_stats_caching():
+    """Test cacheable responses, surrogate keys and 304s from the app"""
+    print("Testing badge and stats caching...")
+    from src.main import app
+
+    badge_cache_policy.max_age, badge_cache_policy.stale_while_revalidate = 30, 600
+    stats_cache_policy.max_age = 10
+    try:
+        with TestClient(app, follow_redirects=False) as client:
+            first = client.get("/badge?tag=http-cache-test")
+            assert first.status_code in (200, 302)
+            assert first.headers["cache-control"].startswith("private, max-age=30"), "New visitors get a private copy"
+            assert "visitor_id" in first.cookies and "surrogate-key" not in first.headers
+
+            again = client.get("/badge?tag=http-cache-test", headers={"If-None-Match": first.headers["etag"]})
+            assert again.status_code == 304 and again.content == b"", "Deduplicated visit keeps the ETag"
+
+            badge_cache_policy.public = True
+            shared = TestClient(app, follow_redirects=False).get("/badge?tag=http-cache-test")
+            assert shared.headers["cache-control"] == "public, max-age=30, stale-while-revalidate=600"
+            assert "set-cookie" not in shared.headers, "Shared responses never set a cookie"
+            assert shared.headers["surrogate-key"] == f"badges {tag_surrogate_key('http-cache-test')}"
+
+            stats = client.get("/api/stats/http-cache-test")
+            assert stats.status_code == 200 and stats.json()["visit_count"] == 2
+            assert stats.headers["cache-control"] == "public, max-age=10"
+            assert stats.headers["etag"].startswith('W/"')
+            not_modified = client.get("/api/stats/http-cache-test", headers={"If-None-Match": stats.headers["etag"]})
+            assert not_modified.status_code == 304
+            since = client.get("/api/stats/http-cache-test", headers={"If-Modified-Since": stats.headers["last-modified"]})
+            assert since.status_code == 304
+    finally:
+        badge_cache_policy.max_age, badge_cache_policy.stale_while_revalidate, badge_cache_policy.public = 0, 0, False
+        stats_cache_policy.max_age = 0
+    print("(checkmark) Badges and stats revalidate against the count")
+
+def test_shared_badges_issue_no_visitor_ids():
+    """Test that shared-cache badges count origin hits without creating visitor ids or dedup rows"""
+    print("Testing shared-cache counting...")
+    from src.main import app
+    from src.models import Badge, Cookie
+
+    badge_cache_policy.max_age, badge_cache_policy.public = 30, True
+    try:
+        with TestClient(app, follow_redirects=False) as client:
+            for _ in range(3):
+                response = client.get("/badge?tag=http-cache-shared")
+                assert "set-cookie" not in response.headers
+            assert client.get("/api/stats/http-cache-shared").json()["visit_count"] == 3
+            badge = Badge.get(Badge.tag == "http-cache-shared")
+            assert Cookie.select().where(Cookie.badge == badge).count() == 0
+    finally:
+        badge_cache_policy.max_age, badge_cache_policy.public = 0, False
+    print("(checkmark) Three origin hits counted, no dedup rows written")
+
+def main():
+    """Run all tests"""
+    print("Starting HTTP caching tests...\n")
+
+    try:
+        test_cache_policy_headers()
+        test_validators()
+        test_badge_and_stats_caching()
+        test_shared_badges_issue_no_visitor_ids()
+
+        print("\nAll HTTP caching tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src.models import initialize_database, close_database, Badge, Cookie, VisitorKey, db
+from src import maintenance
+from src.maintenance import compact_cookies, last_compaction
+from src.services import update_visit_count
+
+def test_expired_cookies_are_deleted_in_batches():
+    """Test that only rows older than the window are removed, in several batches"""
+    print("Testing cookie compaction...")
+    initialize_database()
+    Cookie.delete().execute()
+    now = int(time.time())
+    badge = Badge.create(tag="compaction-test", visits=10, created=now - 10 * 86400)
+    for i in range(7):
+        Cookie.create(cookie_id=f"old-{i}", badge=badge, last_visit=now - 3 * 86400)
+    for i in range(3):
+        Cookie.create(cookie_id=f"recent-{i}", badge=badge, last_visit=now - 3600)
+
+    result = compact_cookies(window_seconds=2 * 86400, batch_size=3, pause_seconds=0, now=now)
+    assert result["rows_deleted"] == 7
+    assert result["batches"] == 3
+    assert last_compaction["rows_deleted"] == 7
+    remaining = {c.cookie_id for c in Cookie.select()}
+    assert remaining == {f"recent-{i}" for i in range(3)}
+    assert Badge.get(Badge.tag == "compaction-test").visits == 10, "Compaction must not touch counts"
+    print(f"(checkmark) Removed {result['rows_deleted']} expired rows in {result['batches']} batches")
+
+def test_visitor_counted_again_after_window():
+    """Test that an expired visitor is counted again on their next visit"""
+    print("Testing recount after the window...")
+    initialize_database()
+    count, _, cookie_id = update_visit_count(None, "window-test")
+    assert count == 1
+    compact_cookies(window_seconds=60, batch_size=100, pause_seconds=0, now=int(time.time()) + 120)
+    count, incremented, _ = update_visit_count(cookie_id, "window-test")
+    assert (count, incremented) == (2, True)
+    print("(checkmark) Visitor counted again after the window")
+
+def test_hashed_keys_are_compacted():
+    """Test that compaction expires the hashed dedup table when it is in use"""
+    print("Testing hashed key compaction...")
+    initialize_database()
+    VisitorKey.delete().execute()
+    now = int(time.time())
+    VisitorKey.insert_many([{"key": i, "last_visit": now - (3 * 86400 if i % 2 else 60)} for i in range(10)]).execute()
+    maintenance.DEDUP_MODEL = VisitorKey
+    try:
+        result = compact_cookies(window_seconds=86400, batch_size=2, pause_seconds=0, now=now)
+    finally:
+        maintenance.DEDUP_MODEL = Cookie
+    assert result["rows_deleted"] == 5
+    assert sorted(key for (key,) in VisitorKey.select(VisitorKey.key).tuples()) == [0, 2, 4, 6, 8]
+    print("(checkmark) Expired hashed keys removed")
+
+def test_cancelled_loop_waits_for_running_pass():
+    """Test that cancelling the compaction task waits for the pass already running in a thread"""
+    print("Testing compaction shutdown...")
+    started = threading.Event()
+    finished = []
+
+    def slow_compact():
+        started.set()
+        time.sleep(0.2)
+        finished.append(True)
+        return {}
+
+    async def scenario():
+        task = asyncio.create_task(maintenance.run_compaction_loop(slow_compact, interval_seconds=3600))
+        await asyncio.to_thread(started.wait)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return list(finished)
+
+    assert asyncio.run(scenario()) == [True]
+    print("(checkmark) Task ended only after the running pass finished")
+
+def cleanup_database():
+    """Clean up test database"""
+    try:
+        db.drop_tables([Badge, Cookie])
+        close_database()
+    except Exception as e:
+        print(f"Warning during cleanup: {e}")
+
+def main():
+    """Run all tests"""
+    print("Starting maintenance tests...\n")
+
+    try:
+        test_expired_cookies_are_deleted_in_batches()
+        test_visitor_counted_again_after_window()
+        test_hashed_keys_are_compacted()
+        test_cancelled_loop_waits_for_running_pass()
+
+        print("\nAll maintenance tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+    finally:
+        cleanup_database()
+
+if __name__ == "__main__":
+    exit(main())
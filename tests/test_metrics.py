@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from fastapi.testclient import TestClient
+from src.metrics import MetricsRegistry
+
+def test_counters_merge_across_threads():
+    """Test that per-thread shards add up on scrape"""
+    print("Testing sharded counters...")
+    registry = MetricsRegistry()
+    hits = registry.counter("test_hits_total", "Hits", ("route",))
+
+    def worker():
+        for _ in range(1000):
+            hits.inc("/badge")
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    hits.inc("/api/stats", amount=2)
+
+    counters, _ = registry.collect()
+    assert counters[("test_hits_total", ("/badge",))] == 4000
+    assert counters[("test_hits_total", ("/api/stats",))] == 2
+    print("(checkmark) 4 threads x 1000 increments merged to 4000")
+
+def test_histogram_exposition():
+    """Test cumulative buckets, sum and count in the text format"""
+    print("Testing histogram exposition...")
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        latency.observe(value, "/badge")
+
+    text = registry.render()
+    assert "# TYPE test_seconds histogram" in text
+    assert 'test_seconds_bucket{route="/badge",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{route="/badge",le="1.0"} 3' in text
+    assert 'test_seconds_bucket{route="/badge",le="+Inf"} 4' in text
+    assert 'test_seconds_sum{route="/badge"} 6.05' in text
+    assert 'test_seconds_count{route="/badge"} 4' in text
+    print("(checkmark) Histogram rendered in Prometheus format")
+
+def _sample(text, name):
+    """Value of one sample line in Prometheus text, 0 if absent"""
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0
+
+def test_metrics_endpoint():
+    """Test that requests are labelled by route template and visits by outcome"""
+    print("Testing /metrics endpoint...")
+    from src.main import app
+
+    requests_sample = 'badgetrack_http_requests_total{route="/api/stats/{tag}",method="GET",status="200"}'
+    duration_sample = 'badgetrack_http_request_duration_seconds_count{route="/badge"}'
+    with TestClient(app, follow_redirects=False) as client:
+        # Other test modules may already have counted requests in this process
+        before = client.get("/metrics").text
+        client.get("/badge?tag=metrics-test")
+        client.get("/badge?tag=metrics-test")
+        client.get("/api/stats/metrics-test")
+        client.get("/api/stats/other-tag")
+        response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert _sample(text, requests_sample) - _sample(before, requests_sample) == 2
+    assert _sample(text, duration_sample) - _sample(before, duration_sample) == 2
+    assert 'badgetrack_visits_total{result="counted"}' in text
+    assert 'badgetrack_visits_total{result="deduplicated"}' in text
+    assert 'badgetrack_db_transaction_seconds_count{operation="visit"}' in text
+    assert "badgetrack_db_pool_queue_depth 0" in text
+    print("(checkmark) /metrics exposes per-route and visit metrics")
+
+def main():
+    """Run all tests"""
+    print("Starting metrics tests...\n")
+
+    try:
+        test_counters_merge_across_threads()
+        test_histogram_exposition()
+        test_metrics_endpoint()
+
+        print("\nAll metrics tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,85 @@
+import os
+import sys
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from fastapi.testclient import TestClient
+from src.rate_limit import TokenBucketLimiter, ip_limiter, tag_limiter
+
+def test_burst_then_refill():
+    """Test that a bucket allows its burst, then refills at the configured rate"""
+    print("Testing token bucket...")
+    limiter = TokenBucketLimiter(rate=2, burst=3)
+    assert [limiter.acquire("client", now=100.0) for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire("client", now=100.0) == 0.5, "Next token in 1 / rate seconds"
+    assert limiter.acquire("other", now=100.0) == 0, "Keys are independent"
+    assert limiter.acquire("client", now=100.5) == 0
+    assert limiter.acquire("client", now=100.5) > 0
+    assert limiter.acquire("client", now=200.0) == 0, "Refill is capped at the burst"
+    assert limiter.stats()["limited"] == 2
+    assert TokenBucketLimiter(rate=0, burst=1).acquire("client") == 0, "Rate 0 disables the limiter"
+    print("(checkmark) Burst and refill respected")
+
+def test_memory_is_bounded():
+    """Test LRU eviction keeps the number of buckets bounded"""
+    print("Testing bucket eviction...")
+    limiter = TokenBucketLimiter(rate=1, burst=1, max_keys=64, shards=4)
+    for i in range(10000):
+        limiter.acquire(f"client-{i}", now=0.0)
+    assert limiter.size() <= 64
+    assert limiter.stats()["evictions"] >= 10000 - 64
+    print("(checkmark) Idle buckets evicted")
+
+def test_badge_returns_429():
+    """Test that /badge rejects over-limit clients and tags before counting"""
+    print("Testing /badge limits...")
+    from src.main import app
+
+    ip_limiter.rate, ip_limiter.burst = 0.001, 2
+    try:
+        with TestClient(app, follow_redirects=False) as client:
+            assert client.get("/badge?tag=limit-a").status_code in (200, 302)
+            assert client.get("/badge?tag=limit-b").status_code in (200, 302)
+            limited = client.get("/badge?tag=limit-c")
+            assert limited.status_code == 429 and int(limited.headers["retry-after"]) > 0
+            assert client.get("/api/stats/limit-c").json()["visit_count"] == 0, "Nothing was counted"
+    finally:
+        ip_limiter.rate = 0
+
+    tag_limiter.rate, tag_limiter.burst = 0.001, 1
+    try:
+        with TestClient(app, follow_redirects=False) as client:
+            assert client.get("/badge?tag=limit-hot").status_code in (200, 302)
+            assert client.get("/badge?tag=limit-hot").status_code == 429
+            assert client.get("/badge?tag=limit-cold").status_code in (200, 302)
+            assert 'badgetrack_rate_limited_total{scope="tag"}' in client.get("/metrics").text
+    finally:
+        tag_limiter.rate = 0
+    print("(checkmark) Over-limit requests get 429 with Retry-After")
+
+def main():
+    """Run all tests"""
+    print("Starting rate limit tests...\n")
+
+    try:
+        test_burst_then_refill()
+        test_memory_is_bounded()
+        test_badge_returns_429()
+
+        print("\nAll rate limit tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,103 @@
+import os
+import sys
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from fastapi.testclient import TestClient
+from src.models import initialize_database
+from src.seen import SeenIndex, seen_visitors
+from src.storage import storage
+from src.services import update_visit_count, get_seen_visit_count
+
+def test_seen_index_expiry():
+    """Test that entries go with the dedup records they stand for and stay bounded"""
+    print("Testing seen index...")
+    index = SeenIndex(max_size=2)
+    index.add("cookie", "tag", 1000)
+    index.add("cookie", "other-tag", None)
+    assert index.contains("cookie", "tag") and not index.contains("other-cookie", "tag")
+    assert index.expire(500) == 1, "Visitors counted at an unknown time go with any expiry"
+    assert index.contains("cookie", "tag")
+    assert index.expire(1001) == 1 and not index.contains("cookie", "tag")
+
+    for tag in ("a", "b", "c"):
+        index.add("cookie", tag, 2000)
+    assert index.size() == 2 and not index.contains("cookie", "a")
+    print("(checkmark) Entries expire with compaction and are evicted LRU")
+
+def test_returning_visitor_skips_storage():
+    """Test that a counted visitor is answered without a storage write"""
+    print("Testing write-free returning visits...")
+    initialize_database()
+    writes = []
+    record_visits = storage.record_visits
+    storage.record_visits = lambda tag_str, visits: writes.append(len(visits)) or record_visits(tag_str, visits)
+    try:
+        count, incremented, cookie = update_visit_count(None, "seen-test")
+        assert (count, incremented) == (1, True) and writes == [1]
+        assert update_visit_count(cookie, "seen-test") == (1, False, None)
+        assert get_seen_visit_count(cookie, "seen-test") == 1
+        assert writes == [1], "Known visitor never reaches storage"
+
+        assert get_seen_visit_count("forged", "seen-test") is None
+        assert update_visit_count(cookie, "seen-other")[:2] == (1, True), "Seen per tag"
+    finally:
+        storage.record_visits = record_visits
+    print("(checkmark) Returning visitor answered from memory")
+
+def test_failed_writes_are_not_remembered():
+    """Test that a visit whose write failed is tried again next time"""
+    print("Testing failed writes...")
+    record_visits = storage.record_visits
+    def failing(tag_str, visits):
+        raise RuntimeError("database is locked")
+    storage.record_visits = failing
+    try:
+        count, incremented, cookie = update_visit_count(None, "seen-failure")
+    finally:
+        storage.record_visits = record_visits
+    assert not incremented and cookie
+    assert update_visit_count(cookie, "seen-failure")[:2] == (1, True)
+    print("(checkmark) Failed visit counted on the next request")
+
+def test_badge_not_modified_for_returning_visitor():
+    """Test the 304 answer to a returning visitor revalidating an unchanged badge"""
+    print("Testing 304 for returning visitors...")
+    from src.main import app
+
+    with TestClient(app, follow_redirects=False) as client:
+        first = client.get("/badge?tag=seen-http")
+        hits = seen_visitors.hits
+        again = client.get("/badge?tag=seen-http", headers={"If-None-Match": first.headers["etag"]})
+        assert again.status_code == 304 and again.headers["etag"] == first.headers["etag"]
+        assert "set-cookie" not in again.headers
+        assert seen_visitors.hits == hits + 1
+    print("(checkmark) Unchanged badge answered with 304")
+
+def main():
+    """Run all tests"""
+    print("Starting seen index tests...\n")
+
+    try:
+        test_seen_index_expiry()
+        test_returning_visitor_skips_storage()
+        test_failed_writes_are_not_remembered()
+        test_badge_not_modified_for_returning_visitor()
+
+        print("\nAll seen index tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
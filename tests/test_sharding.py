@@ -0,0 +1,165 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src.models import (
+    initialize_database, close_database, configure_shards, shard_for_tag, use_shard, each_shard,
+    Badge, Cookie, db, ALL_MODELS,
+)
+from src.services import update_visit_count, get_tag_visit_count, get_system_statistics
+from src.aggregates import system_aggregates
+from src.storage import storage
+from src.cache import tag_cache
+from src.dedup import BloomDedupStore
+from src.write_buffer import VisitBuffer
+from src.maintenance import compact_cookies
+
+SHARDS = 4
+TAGS = [f"shard-tag-{i}" for i in range(40)]
+
+def setup_shards():
+    configure_shards(SHARDS)
+    assert initialize_database()
+    system_aggregates.reset()
+    tag_cache.clear()
+
+def test_tags_are_partitioned():
+    """Test that each badge is stored only on the shard its tag hashes to"""
+    print("Testing tag partitioning...")
+    setup_shards()
+    assert {shard_for_tag(tag) for tag in TAGS} == set(range(SHARDS)), "40 tags should hit every shard"
+    assert shard_for_tag("stable") == shard_for_tag("stable")
+
+    for tag in TAGS:
+        count, incremented, cookie_id = update_visit_count(None, tag)
+        assert (count, incremented) == (1, True)
+        assert update_visit_count(cookie_id, tag)[:2] == (1, False)
+
+    for shard in each_shard():
+        stored = {badge.tag for badge in Badge.select()}
+        assert stored == {tag for tag in TAGS if shard_for_tag(tag) == shard}
+        assert Cookie.select().count() == len(stored)
+    assert all(get_tag_visit_count(tag) == 1 for tag in TAGS)
+    assert storage.get_counts(TAGS + ["shard-missing"]) == {**dict.fromkeys(TAGS, 1), "shard-missing": 0}
+    print(f"(checkmark) {len(TAGS)} tags spread over {SHARDS} shards")
+
+def test_statistics_fan_out():
+    """Test that the stats scan and the aggregates merge every shard"""
+    print("Testing statistics fan-out...")
+    stats = get_system_statistics()
+    assert stats["total_tracked_tags"] == len(TAGS)
+    assert stats["total_visits"] == len(TAGS)
+    system_aggregates.load()
+    assert system_aggregates.snapshot() == stats
+    system_aggregates.reset()
+    print("(checkmark) Stats merged across shards")
+
+def test_bloom_filters_keyed_by_shard():
+    """Test that equal badge ids on different shards get separate filters"""
+    print("Testing Bloom filters per shard...")
+    store = BloomDedupStore(error_rate=0.001, initial_capacity=16, cache_size=8)
+    now = int(time.time())
+    for shard in (0, 1):
+        with use_shard(shard):
+            badge, _ = Badge.get_or_create(tag=f"bloom-shard-{shard}", defaults={'created': now})
+            badge_id = badge.id
+    with use_shard(0):
+        assert store.check_and_add(badge_id, "bloom-shard-0", "visitor", now)
+    with use_shard(1):
+        assert not store.contains(badge_id, "bloom-shard-1", "visitor")
+    print("(checkmark) Filters do not leak between shards")
+
+def test_buffer_and_compaction_span_shards():
+    """Test that a buffered flush and the compaction job reach every shard"""
+    print("Testing buffer flush and compaction across shards...")
+    buffer = VisitBuffer(flush_interval=60, max_events=10000)
+    now = int(time.time())
+    for tag in TAGS:
+        with use_shard(shard_for_tag(tag)):
+            buffer.record(f"buffered-{tag}", tag, True, now)
+    assert buffer.flush() == len(TAGS)
+    for tag in TAGS:
+        with use_shard(shard_for_tag(tag)):
+            assert Badge.get(Badge.tag == tag).visits == 2
+
+    result = compact_cookies(window_seconds=60, batch_size=5, pause_seconds=0, now=now + 120)
+    assert result["rows_deleted"] == 2 * len(TAGS)
+    for _ in each_shard():
+        assert Cookie.select().count() == 0
+    print(f"(checkmark) Flushed and compacted {result['rows_deleted']} rows on {SHARDS} shards")
+
+def test_flushed_shard_is_read_back_during_flush():
+    """Test that tags of a shard already flushed read their stored state while later shards flush"""
+    print("Testing reads between shard flushes...")
+    buffer = VisitBuffer(flush_interval=60, max_events=10000)
+    now = int(time.time())
+    first, second = "mid-flush-a", next(tag for tag in TAGS if shard_for_tag(tag) != shard_for_tag("mid-flush-a"))
+    for tag in (first, second):
+        with use_shard(shard_for_tag(tag)):
+            buffer.record(f"early-{tag}", tag, True, now)
+    flush_shard = buffer._flush_shard
+    seen = []
+
+    def checked_flush_shard(*args):
+        if seen:
+            # The first shard is committed; the second has not started
+            flushed = seen[0]
+            with use_shard(shard_for_tag(flushed)):
+                stored = Badge.get(Badge.tag == flushed).visits
+                assert buffer.get_count(flushed) == stored
+                assert buffer.record(f"late-{flushed}", flushed, True, now) == (stored + 1, True, False)
+        seen.append(next(iter(args[0])))
+        return flush_shard(*args)
+
+    buffer._flush_shard = checked_flush_shard
+    assert buffer.flush() == 2
+    assert len(seen) == 2
+    print("(checkmark) No stale base count or second badge creation mid-flush")
+
+def cleanup_database():
+    """Clean up test database"""
+    try:
+        for _ in each_shard():
+            db.drop_tables(ALL_MODELS)
+        close_database()
+        configure_shards(1)
+        tag_cache.clear()
+    except Exception as e:
+        print(f"Warning during cleanup: {e}")
+
+def teardown_module():
+    """Restore a single shard when run under pytest"""
+    cleanup_database()
+
+def main():
+    """Run all tests"""
+    print("Starting sharding tests...\n")
+
+    try:
+        test_tags_are_partitioned()
+        test_statistics_fan_out()
+        test_bloom_filters_keyed_by_shard()
+        test_buffer_and_compaction_span_shards()
+        test_flushed_shard_is_read_back_during_flush()
+
+        print("\nAll sharding tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+    finally:
+        cleanup_database()
+
+if __name__ == "__main__":
+    exit(main())
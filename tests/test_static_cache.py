@@ -0,0 +1,122 @@
+import os
+import sys
+import gzip
+import tempfile
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from fastapi.testclient import TestClient
+from src.static_cache import AssetStore, StaticAsset, etag_matches
+
+def test_precompressed_variants():
+    """Test that compressible assets get a smaller gzip body and binary ones do not"""
+    print("Testing precompression...")
+    css = StaticAsset(b"body { color: red; }\n" * 100, "text/css")
+    encoding, body = css.select("gzip, deflate")
+    assert encoding == "gzip" and gzip.decompress(body) == css.body
+    assert css.select("identity") == (None, css.body)
+    assert css.select("gzip;q=0, deflate") == (None, css.body)
+    assert css.select("gzip; q=0.5")[0] == "gzip"
+    assert css.select("*;q=0") == (None, css.body)
+    png = StaticAsset(os.urandom(4096), "image/png")
+    assert png.variants == []
+    print("(checkmark) Text compressed once, binary served as-is")
+
+def test_etag_matching():
+    """Test If-None-Match parsing"""
+    print("Testing ETag matching...")
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abcd"', '"abc"')
+    print("(checkmark) If-None-Match handled")
+
+def test_reload_picks_up_changes():
+    """Test that reload mode rebuilds an asset when its file changes"""
+    print("Testing reload...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "page.html")
+        with open(path, "w") as f:
+            f.write("<p>one</p>")
+        store = AssetStore(reload=True)
+        store.register_directory("static", tmp_dir)
+        store.preload()
+        first = store.get("static/page.html")
+        assert first.body == b"<p>one</p>"
+        assert store.get("static/page.html") is first, "Unchanged files are not rebuilt"
+
+        with open(path, "w") as f:
+            f.write("<p>two</p>")
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1_000_000_000))
+        second = store.get("static/page.html")
+        assert second.body == b"<p>two</p>" and second.etag != first.etag
+
+        with open(os.path.join(tmp_dir, "new.js"), "w") as f:
+            f.write("console.log(1);")
+        assert store.get("static/new.js") is not None, "New files are discovered"
+        assert store.get("static/../page.html") is None
+    print("(checkmark) Changed and new files reloaded")
+
+def test_assets_load_without_preload():
+    """Test that a registered asset is built on first use when preload() never ran"""
+    print("Testing lazy load...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "page.html")
+        with open(path, "w") as f:
+            f.write("<html>lazy</html>")
+        store = AssetStore(reload=False)
+        store.register("page.html", path, "text/html")
+        assert store.get("page.html").body == b"<html>lazy</html>"
+        assert store.get("missing.html") is None
+    print("(checkmark) Asset built on first get()")
+
+def test_pages_revalidate():
+    """Test 304 responses and compressed bodies from the app"""
+    print("Testing page revalidation...")
+    from src.main import app
+
+    with TestClient(app) as client:
+        response = client.get("/", headers={"Accept-Encoding": "gzip"})
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert "<html" in response.text.lower()
+        etag = response.headers["etag"]
+
+        cached = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert cached.status_code == 304 and cached.content == b""
+
+        style = client.get("/static/style.css")
+        assert style.status_code == 200 and "max-age" in style.headers["cache-control"]
+        assert client.get("/static/missing.css").status_code == 404
+        assert "version" in client.get("/api/app-info").json()
+    print("(checkmark) Pages served with ETags and 304s")
+
+def main():
+    """Run all tests"""
+    print("Starting static cache tests...\n")
+
+    try:
+        test_precompressed_variants()
+        test_etag_matching()
+        test_reload_picks_up_changes()
+        test_assets_load_without_preload()
+        test_pages_revalidate()
+
+        print("\nAll static cache tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+
+if __name__ == "__main__":
+    exit(main())
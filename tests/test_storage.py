@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src.models import initialize_database, close_database, Badge, Cookie, db
+from src.kvstore import KeyValueStore
+from src.storage import StorageBackend, SqliteBackend, KeyValueBackend
+from src.aggregates import SystemAggregates
+
+def check_backend_contract(backend, prefix):
+    """The behaviour every storage backend must share"""
+    now = int(time.time()) - 100
+    tag = f"{prefix}-contract"
+    assert backend.get_count(tag) == 0
+    assert backend.record_visit("visitor-a", tag, True, now) == (1, True, True)
+    assert backend.record_visit("visitor-a", tag, False, now) == (1, False, False)
+    assert backend.record_visit("visitor-b", tag, True, now) == (2, True, False)
+    assert backend.record_visit("visitor-a", f"{prefix}-other", False, now) == (1, True, True)
+    assert backend.get_count(tag) == 2
+    assert backend.knows_visitor(tag, "visitor-a") and not backend.knows_visitor(tag, "visitor-c")
+    assert not backend.knows_visitor(f"{prefix}-missing", "visitor-a")
+    assert backend.get_count(tag) == 2, "Lookups record nothing"
+    missing = f"{prefix}-missing"
+    assert backend.get_counts([tag, f"{prefix}-other", missing]) == {tag: 2, f"{prefix}-other": 1, missing: 0}
+
+    tags_before, visits_before = backend.totals()
+    assert tags_before >= 2 and visits_before >= 3
+    assert sum(backend.created_buckets(now - 1, 300).values()) >= 2
+    assert sum(backend.created_buckets(now + 10**6, 300).values()) == 0
+
+    aggregates = SystemAggregates()
+    aggregates.load(now + 1, backend=backend)
+    assert aggregates.snapshot(now + 1)["total_visits"] == visits_before
+
+    # With the default window of 0 every visitor recorded before now expires
+    assert backend.expire_visitors()["rows_deleted"] >= 3
+    assert backend.record_visit("visitor-a", tag, False, now + 100) == (3, True, False)
+
+    # Anonymous visits (shared badge caching) are always counted and leave no dedup entry
+    anonymous = f"{prefix}-anonymous"
+    assert backend.record_visit(None, anonymous, False, now) == (1, True, True)
+    assert backend.record_visit(None, anonymous, False, now) == (2, True, False)
+    assert backend.get_count(anonymous) == 2
+
+def test_sqlite_backend():
+    """Test the SQLite backend against the shared contract"""
+    print("Testing SQLite backend...")
+    initialize_database()
+    check_backend_contract(SqliteBackend(), "sqlite")
+    anonymous = Badge.get(Badge.tag == "sqlite-anonymous")
+    assert Cookie.select().where(Cookie.badge == anonymous).count() == 0
+    print("(checkmark) SQLite backend passes the storage contract")
+
+def test_kv_backend():
+    """Test the key-value backend against the shared contract"""
+    print("Testing key-value backend...")
+    directory = tempfile.mkdtemp()
+    try:
+        backend = KeyValueBackend(KeyValueStore(directory, fsync_interval=0, snapshot_interval=0))
+        backend.start()
+        check_backend_contract(backend, "kv")
+        backend.stop()
+    finally:
+        shutil.rmtree(directory)
+    print("(checkmark) Key-value backend passes the storage contract")
+
+def test_kv_recovers_from_snapshot_and_log():
+    """Test that a restart restores state from the snapshot plus the log written after it"""
+    print("Testing key-value recovery...")
+    directory = tempfile.mkdtemp()
+    try:
+        store = KeyValueStore(directory, fsync_interval=0, snapshot_interval=0)
+        store.open()
+        for i in range(5):
+            store.record_visit(f"visitor-{i}", "recover", 1000)
+        store.snapshot()
+        store.record_visit("visitor-5", "recover", 1001)
+        # Simulate a crash: no close(), so the last visit only exists in the log
+        store._log.close()
+
+        with open(store.log_path, "a", encoding="utf-8") as f:
+            f.write('{"t":"recover","v":"torn')
+
+        reopened = KeyValueStore(directory, fsync_interval=0, snapshot_interval=0)
+        reopened.open()
+        assert reopened.get_count("recover") == 6
+        assert reopened.record_visit("visitor-5", "recover", 1002) == (6, False, False)
+        assert reopened.record_visit("visitor-6", "recover", 1002) == (7, True, False)
+        reopened._log.close()
+
+        # The torn tail was cut off, so the visit appended after it is readable
+        third = KeyValueStore(directory, fsync_interval=0, snapshot_interval=0)
+        third.open()
+        assert third.get_count("recover") == 7
+        third.close()
+    finally:
+        shutil.rmtree(directory)
+    print("(checkmark) Snapshot and log replayed, torn record ignored")
+
+def test_kv_interrupted_snapshot_does_not_double_count():
+    """Test that a crash after the snapshot is written but before the old log is removed is safe"""
+    print("Testing interrupted snapshot...")
+    directory = tempfile.mkdtemp()
+    try:
+        store = KeyValueStore(directory, fsync_interval=0, snapshot_interval=0)
+        store.open()
+        for i in range(3):
+            store.record_visit(f"visitor-{i}", "interrupted", 1000)
+        store._log.close()
+        # State as if the snapshot was committed but the crash hit before os.remove(old log)
+        shutil.copy(store.log_path, store.old_log_path)
+        with open(store.snapshot_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "seq": store._seq,
+                "counts": dict(store._counts),
+                "created": dict(store._created),
+                "visitors": [[key.hex(), ts] for key, ts in store._visitors.items()],
+            }, f)
+
+        reopened = KeyValueStore(directory, fsync_interval=0, snapshot_interval=0)
+        reopened.open()
+        assert reopened.get_count("interrupted") == 3
+        assert not os.path.exists(reopened.old_log_path)
+        reopened.close()
+    finally:
+        shutil.rmtree(directory)
+    print("(checkmark) Records already in the snapshot are skipped")
+
+def test_incomplete_backend_fails_at_creation():
+    """Test that a backend missing an abstract method cannot be instantiated"""
+    print("Testing backend interface...")
+
+    class CountOnlyBackend(StorageBackend):
+        def get_count(self, tag_str):
+            return 0
+
+    try:
+        CountOnlyBackend()
+        assert False, "expected TypeError"
+    except TypeError as e:
+        assert "record_visit" in str(e)
+    print("(checkmark) Incomplete backend rejected at creation")
+
+def cleanup_database():
+    """Clean up test database"""
+    try:
+        db.drop_tables([Badge, Cookie])
+        close_database()
+    except Exception as e:
+        print(f"Warning during cleanup: {e}")
+
+def main():
+    """Run all tests"""
+    print("Starting storage backend tests...\n")
+
+    try:
+        test_sqlite_backend()
+        test_kv_backend()
+        test_kv_recovers_from_snapshot_and_log()
+        test_kv_interrupted_snapshot_does_not_double_count()
+        test_incomplete_backend_fails_at_creation()
+
+        print("\nAll storage backend tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+    finally:
+        cleanup_database()
+
+if __name__ == "__main__":
+    exit(main())
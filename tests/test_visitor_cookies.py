@@ -0,0 +1,104 @@
+import os
+import sys
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src import utils
+from src.models import initialize_database, close_database, Badge, Cookie, db
+from src.services import update_visit_count
+from src.utils import new_visitor_id, sign_visitor_id, verify_visitor_cookie
+
+def test_signed_cookies_verify():
+    """Test that only cookies signed with SECRET_KEY are accepted"""
+    print("Testing cookie signatures...")
+    visitor_id = new_visitor_id()
+    cookie = sign_visitor_id(visitor_id)
+    assert len(cookie) == 55
+    assert verify_visitor_cookie(cookie) == (visitor_id, False)
+
+    other_id = new_visitor_id()
+    forged = other_id + cookie[32:]
+    assert verify_visitor_cookie(forged) == (None, False), "Signature bound to the id"
+    assert verify_visitor_cookie(cookie[:-1] + ("A" if cookie[-1] != "A" else "B")) == (None, False)
+    for garbage in ("", "x" * 4096, "' OR 1=1 --", visitor_id.upper() + cookie[32:]):
+        assert verify_visitor_cookie(garbage) == (None, False)
+    print("(checkmark) Forged and malformed cookies rejected")
+
+def test_unsigned_ids_during_migration():
+    """Test that bare ids are accepted and re-signed by default, and rejected in strict mode"""
+    print("Testing unsigned id migration...")
+    legacy_id = new_visitor_id()
+    assert utils.ACCEPT_UNSIGNED_VISITOR_IDS, "Old cookies are accepted after an upgrade"
+    assert verify_visitor_cookie(legacy_id) == (legacy_id, True)
+    utils.ACCEPT_UNSIGNED_VISITOR_IDS = False
+    try:
+        assert verify_visitor_cookie(legacy_id) == (None, False)
+    finally:
+        utils.ACCEPT_UNSIGNED_VISITOR_IDS = True
+    print("(checkmark) Unsigned ids re-signed unless strict mode is on")
+
+def test_forged_cookies_never_reach_storage():
+    """Test that update_visit_count issues a signed cookie instead of storing a forged value"""
+    print("Testing visits with forged cookies...")
+    initialize_database()
+    count, incremented, cookie = update_visit_count("not-a-real-cookie", "signed-test")
+    assert (count, incremented) == (1, True) and verify_visitor_cookie(cookie)[0]
+    assert not Cookie.select().where(Cookie.cookie_id == "not-a-real-cookie").exists()
+    stored = Cookie.select().join(Badge).where(Badge.tag == "signed-test").get()
+    assert stored.cookie_id == cookie.split(".")[0], "Only the id part is stored"
+
+    assert update_visit_count(cookie, "signed-test") == (1, False, None)
+
+    count, incremented, resigned = update_visit_count(stored.cookie_id, "signed-test")
+    assert (count, incremented, resigned) == (1, False, cookie), "Legacy visitor keeps their id"
+    print("(checkmark) Forged cookies replaced, signed cookies deduplicated")
+
+def test_unknown_bare_ids_are_not_trusted():
+    """Test that a bare id without a dedup row gets a new signed cookie instead of being stored"""
+    print("Testing made-up bare ids...")
+    initialize_database()
+    made_up = [new_visitor_id() for _ in range(5)]
+    for i, bare_id in enumerate(made_up, 1):
+        count, incremented, cookie = update_visit_count(bare_id, "bare-test")
+        assert (count, incremented) == (i, True)
+        assert cookie.split(".")[0] != bare_id and verify_visitor_cookie(cookie)[0]
+    assert not Cookie.select().where(Cookie.cookie_id.in_(made_up)).exists()
+    print("(checkmark) Made-up bare ids replaced by new visitor ids")
+
+def cleanup_database():
+    """Clean up test database"""
+    try:
+        db.drop_tables([Badge, Cookie])
+        close_database()
+    except Exception as e:
+        print(f"Warning during cleanup: {e}")
+
+def main():
+    """Run all tests"""
+    print("Starting visitor cookie tests...\n")
+
+    try:
+        test_signed_cookies_verify()
+        test_unsigned_ids_during_migration()
+        test_forged_cookies_never_reach_storage()
+        test_unknown_bare_ids_are_not_trusted()
+
+        print("\nAll visitor cookie tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+    finally:
+        cleanup_database()
+
+if __name__ == "__main__":
+    exit(main())
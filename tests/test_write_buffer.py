@@ -0,0 +1,117 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add the parent directory to Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Set testing environment
+os.environ["TESTING"] = "true"
+
+from src.models import initialize_database, close_database, Badge, Cookie, db
+from src.write_buffer import VisitBuffer
+
+def test_buffered_visits_are_flushed():
+    """Test that buffered increments reach the database in one flush"""
+    print("Testing buffered visit flush...")
+    initialize_database()
+    buffer = VisitBuffer(flush_interval=60, max_events=1000)
+    now = int(time.time())
+
+    count1, incremented1, created1 = buffer.record("visitor-a", "buffer-test", True, now)
+    count2, incremented2, created2 = buffer.record("visitor-b", "buffer-test", True, now)
+    count3, incremented3, _ = buffer.record("visitor-a", "buffer-test", False, now)
+    assert (count1, incremented1, created1) == (1, True, True)
+    assert (count2, incremented2, created2) == (2, True, False)
+    assert (count3, incremented3) == (2, False), "Pending visitor should be deduplicated"
+    assert Badge.get_or_none(Badge.tag == "buffer-test") is None, "Nothing should be written before flush"
+    assert buffer.get_count("buffer-test") == 2
+    assert buffer.get_counts(["buffer-test", "buffer-none"], lambda tags: {}) == {"buffer-test": 2, "buffer-none": 0}
+
+    assert buffer.flush() == 2
+    badge = Badge.get(Badge.tag == "buffer-test")
+    assert badge.visits == 2
+    assert Cookie.select().where(Cookie.badge == badge).count() == 2
+    assert buffer.pending_events() == 0
+    print("(checkmark) Buffered visits flushed")
+
+def test_flushed_visitor_is_deduplicated():
+    """Test that a visitor counted in an earlier flush is not counted again"""
+    print("Testing dedup against flushed visits...")
+    initialize_database()
+    buffer = VisitBuffer(flush_interval=60, max_events=1000)
+    now = int(time.time())
+
+    buffer.record("visitor-c", "buffer-dedup", True, now)
+    buffer.flush()
+    count, incremented, _ = buffer.record("visitor-c", "buffer-dedup", False, now)
+    assert (count, incremented) == (1, False)
+
+    # The same visitor on a different badge is a new visit
+    count, incremented, _ = buffer.record("visitor-c", "buffer-dedup-other", False, now)
+    assert (count, incremented) == (1, True)
+    buffer.flush()
+    assert Badge.get(Badge.tag == "buffer-dedup-other").visits == 1
+    print("(checkmark) Flushed visitors deduplicated")
+
+def test_max_events_triggers_flush():
+    """Test that reaching max_events flushes without the background thread"""
+    print("Testing size-triggered flush...")
+    initialize_database()
+    buffer = VisitBuffer(flush_interval=60, max_events=3)
+    now = int(time.time())
+
+    for i in range(3):
+        buffer.record(f"visitor-{i}", "buffer-threshold", True, now)
+    assert buffer.pending_events() == 0
+    assert Badge.get(Badge.tag == "buffer-threshold").visits == 3
+    print("(checkmark) Size threshold flushed the buffer")
+
+def test_anonymous_visits_are_flushed_without_dedup_rows():
+    """Test that anonymous visits are each counted and flushed without Cookie rows"""
+    print("Testing anonymous buffered visits...")
+    initialize_database()
+    buffer = VisitBuffer(flush_interval=60, max_events=1000)
+    now = int(time.time())
+
+    assert buffer.record(None, "buffer-anonymous", False, now) == (1, True, True)
+    assert buffer.record(None, "buffer-anonymous", False, now) == (2, True, False)
+    assert buffer.flush() == 2
+    badge = Badge.get(Badge.tag == "buffer-anonymous")
+    assert badge.visits == 2
+    assert Cookie.select().where(Cookie.badge == badge).count() == 0
+    print("(checkmark) Anonymous visits counted, no dedup rows")
+
+def cleanup_database():
+    """Clean up test database"""
+    try:
+        db.drop_tables([Badge, Cookie])
+        close_database()
+    except Exception as e:
+        print(f"Warning during cleanup: {e}")
+
+def main():
+    """Run all tests"""
+    print("Starting write buffer tests...\n")
+
+    try:
+        test_buffered_visits_are_flushed()
+        test_flushed_visitor_is_deduplicated()
+        test_max_events_triggers_flush()
+        test_anonymous_visits_are_flushed_without_dedup_rows()
+
+        print("\nAll write buffer tests passed!")
+        return 0
+
+    except AssertionError as e:
+        print(f"\nTest failed: {e}")
+        return 1
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return 1
+    finally:
+        cleanup_database()
+
+if __name__ == "__main__":
+    exit(main())